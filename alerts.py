@@ -0,0 +1,204 @@
+# Подписки пользователей на пороговые уведомления.
+# Условия: дисбаланс пары или рынка выше/ниже порога, пересечение порога
+# в любую сторону и z-score дисбаланса относительно статистики за 24 часа
+# (rolling_stats.py).
+# Бот записывает подписки в таблицу alert_subscriptions и увеличивает счетчик
+# alerts_version в registry_meta, сборщик держит подписки в памяти (AlertRegistry)
+# сгруппированными по паре и перечитывает их, только когда счетчик изменился.
+# Каждый цикл проверяются только пары, на которые есть подписки, а уведомление
+# отправляется лишь при пересечении порога: последнее состояние условия
+# хранится в той же таблице и переживает перезапуск сборщика.
+from latest_snapshot import MARKET_SYMBOL
+
+ALERTS_VERSION_KEY = "alerts_version"
+
+_BUMP_VERSION_SQL = f"""
+    INSERT INTO registry_meta (key, value) VALUES ('{ALERTS_VERSION_KEY}', '1')
+    ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+"""
+
+# Виды условий
+ABOVE = "above"
+BELOW = "below"
+CROSS = "cross"
+ZSCORE = "zscore"
+
+
+class Subscription:
+    __slots__ = ("id", "chat_id", "symbol", "kind", "threshold", "state")
+
+    def __init__(self, id, chat_id, symbol, kind, threshold, state):
+        self.id = id
+        self.chat_id = chat_id
+        self.symbol = symbol
+        self.kind = kind
+        self.threshold = threshold
+        self.state = state
+
+
+# Функция для разбора условия из аргументов команды бота:
+#   > 30, < -30, cross 0 (или просто cross), z > 3.
+# Возвращает (вид, порог) или None, если условие не распознано.
+def parse_condition(tokens):
+    text = " ".join(tokens).lower().replace(",", ".")
+    parts = text.replace(">", " > ").replace("<", " < ").split()
+    try:
+        if parts[:1] == ["cross"] and len(parts) <= 2:
+            return CROSS, float(parts[1]) if len(parts) == 2 else 0.0
+        if parts[:2] == ["z", ">"] and len(parts) == 3:
+            threshold = float(parts[2])
+            return (ZSCORE, threshold) if threshold > 0 else None
+        if len(parts) == 2 and parts[0] in (">", "<"):
+            return (ABOVE if parts[0] == ">" else BELOW), float(parts[1])
+    except ValueError:
+        pass
+    return None
+
+
+# Функция для текстового описания подписки
+def describe(symbol, kind, threshold):
+    name = "рынок" if symbol == MARKET_SYMBOL else symbol
+    if kind == ABOVE:
+        return f"{name}: дисбаланс > {threshold:g}%"
+    if kind == BELOW:
+        return f"{name}: дисбаланс < {threshold:g}%"
+    if kind == CROSS:
+        return f"{name}: дисбаланс пересекает {threshold:g}%"
+    return f"{name}: z-score дисбаланса > {threshold:g}"
+
+
+# Функции для изменения подписок (вызываются ботом на соединении для записи).
+# Каждое изменение увеличивает alerts_version в той же транзакции.
+def add_subscription(conn, chat_id, symbol, kind, threshold, created_at):
+    with conn:
+        cursor = conn.execute("""
+            INSERT INTO alert_subscriptions (chat_id, symbol, kind, threshold, state, created_at)
+            VALUES (?, ?, ?, ?, NULL, ?)
+        """, (chat_id, symbol, kind, threshold, created_at))
+        conn.execute(_BUMP_VERSION_SQL)
+    return cursor.lastrowid
+
+
+# Удаление подписки по номеру (или всех подписок чата, если sub_id = None).
+# Возвращает число удаленных подписок.
+def remove_subscriptions(conn, chat_id, sub_id=None):
+    with conn:
+        if sub_id is None:
+            cursor = conn.execute("DELETE FROM alert_subscriptions WHERE chat_id = ?", (chat_id,))
+        else:
+            cursor = conn.execute(
+                "DELETE FROM alert_subscriptions WHERE chat_id = ? AND id = ?", (chat_id, sub_id)
+            )
+        if cursor.rowcount:
+            conn.execute(_BUMP_VERSION_SQL)
+    return cursor.rowcount
+
+
+# Функция для получения подписок чата: список (id, symbol, kind, threshold)
+def chat_subscriptions(conn, chat_id):
+    return conn.execute(
+        "SELECT id, symbol, kind, threshold FROM alert_subscriptions WHERE chat_id = ? ORDER BY id",
+        (chat_id,),
+    ).fetchall()
+
+
+# Функция для получения числа подписок чата
+def count_subscriptions(conn, chat_id):
+    return conn.execute("SELECT COUNT(*) FROM alert_subscriptions WHERE chat_id = ?", (chat_id,)).fetchone()[0]
+
+
+# Функция для текста уведомления о срабатывании условия
+def alert_text(subscription, value, zscore=None):
+    name = "Рынок" if subscription.symbol == MARKET_SYMBOL else subscription.symbol
+    threshold = subscription.threshold
+    if subscription.kind == ABOVE:
+        return f"🔔 {name}: дисбаланс {value:.2f}% выше {threshold:g}%"
+    if subscription.kind == BELOW:
+        return f"🔔 {name}: дисбаланс {value:.2f}% ниже {threshold:g}%"
+    if subscription.kind == CROSS:
+        direction = "вверх" if value > threshold else "вниз"
+        return f"🔔 {name}: дисбаланс пересек {threshold:g}% {direction} ({value:.2f}%)"
+    return f"🔔 {name}: z-score {zscore:.2f} выше {threshold:g} (дисбаланс {value:.2f}%)"
+
+
+# Подписки в памяти сборщика
+class AlertRegistry:
+    def __init__(self):
+        self.by_symbol = {}
+        self.chat_ids = set()
+        self.version = None
+        self.loaded = False
+
+    @staticmethod
+    def _read_version(conn):
+        row = conn.execute(
+            "SELECT value FROM registry_meta WHERE key = ?", (ALERTS_VERSION_KEY,)
+        ).fetchone()
+        return row[0] if row else None
+
+    # Загрузка всех подписок с группировкой по паре
+    def load(self, conn):
+        self.version = self._read_version(conn)
+        self.by_symbol = {}
+        self.chat_ids = set()
+        for row in conn.execute("SELECT id, chat_id, symbol, kind, threshold, state FROM alert_subscriptions"):
+            subscription = Subscription(*row)
+            self.by_symbol.setdefault(subscription.symbol, []).append(subscription)
+            self.chat_ids.add(subscription.chat_id)
+        self.loaded = True
+
+    # Перечитывание подписок, если их изменил бот. Возвращает True, если перечитаны.
+    def refresh(self, conn):
+        if self.loaded and self._read_version(conn) == self.version:
+            return False
+        self.load(conn)
+        return True
+
+    # Удаление всех подписок чатов (например, заблокировавших бота)
+    def remove_chats(self, conn, chat_ids):
+        with conn:
+            conn.executemany("DELETE FROM alert_subscriptions WHERE chat_id = ?", [(chat_id,) for chat_id in chat_ids])
+            conn.execute(_BUMP_VERSION_SQL)
+        self.load(conn)
+
+    # Проверка подписок по значениям цикла values (symbol -> дисбаланс,
+    # рынок под ключом MARKET_SYMBOL) и их z-score zscores (symbol -> z, пары
+    # без достаточной истории отсутствуют). Просматриваются только пары с подписками.
+    # Возвращает уведомления {chat_id: [текст, ...]} и подписки с изменившимся состоянием.
+    def evaluate(self, values, zscores):
+        alerts = {}
+        changed = []
+        for symbol, subscriptions in self.by_symbol.items():
+            value = values.get(symbol)
+            if value is None:
+                continue
+            zscore = zscores.get(symbol)
+            for subscription in subscriptions:
+                kind, threshold = subscription.kind, subscription.threshold
+                if kind == ABOVE or kind == CROSS:
+                    state = int(value > threshold)
+                elif kind == BELOW:
+                    state = int(value < threshold)
+                elif zscore is None:
+                    continue
+                else:
+                    state = int(zscore > threshold)
+                if state == subscription.state:
+                    continue
+                # Первая проверка новой подписки только запоминает состояние
+                notify = subscription.state is not None and (kind == CROSS or state)
+                subscription.state = state
+                changed.append(subscription)
+                if notify:
+                    alerts.setdefault(subscription.chat_id, []).append(alert_text(subscription, value, zscore))
+        return alerts, changed
+
+    # Сохранение состояний условий без изменения alerts_version:
+    # бот состояния не использует, и перечитывать подписки ему не нужно
+    @staticmethod
+    def save_states(conn, subscriptions):
+        with conn:
+            conn.executemany(
+                "UPDATE alert_subscriptions SET state = ? WHERE id = ?",
+                [(subscription.state, subscription.id) for subscription in subscriptions],
+            )
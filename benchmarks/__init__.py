@@ -0,0 +1 @@
+# Инструменты для локальной проверки и замеров производительности
@@ -0,0 +1,124 @@
+# Замер пороговых уведомлений (alerts.py): база заполняется синтетическими
+# циклами, users пользователей получают по per-user подписок на случайные пары
+# и рынок, затем сборщик записывает еще cycles циклов (save_cycle_data
+# обновляет скользящую статистику для z-score), и каждый цикл проверяется
+# AlertRegistry.evaluate, как его проверял бы сборщик.
+# Печатаются число исходящих сообщений по сравнению со сводкой каждому
+# пользователю каждый цикл и время проверки одного цикла по индексу
+# «пара -> подписки» и перебором «пользователи × пары».
+# Синтетические дисбалансы независимы от цикла к циклу, поэтому пересечений
+# порогов больше, чем на реальных данных: это оценка сверху.
+# Запуск: python -m benchmarks.bench_alerts --symbols 300 --users 1000 --per-user 3
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.generate_data import fill_db, make_cycle
+
+
+# Функция для случайного условия: редкие пороги дисбаланса, пересечение нуля, z-score
+def random_condition(rnd, market):
+    from alerts import ABOVE, BELOW, CROSS, ZSCORE
+
+    kind = rnd.choice((CROSS, ZSCORE) if market else (ABOVE, BELOW, ZSCORE))
+    if kind == ABOVE:
+        return kind, rnd.choice((50, 60, 70, 80))
+    if kind == BELOW:
+        return kind, -rnd.choice((50, 60, 70, 80))
+    if kind == CROSS:
+        return kind, 0.0
+    return kind, rnd.choice((2.5, 3.0))
+
+
+# Перебор без индекса: каждый пользователь сверяет свои подписки со всеми парами цикла
+def evaluate_naive(user_subscriptions, values):
+    matched = 0
+    for subscriptions in user_subscriptions.values():
+        for symbol, value in values.items():
+            for subscription in subscriptions:
+                if subscription.symbol == symbol:
+                    matched += 1
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка подписок на пороговые уведомления")
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--per-user", type=int, default=3, help="Подписок у пользователя")
+    parser.add_argument("--cycles", type=int, default=96, help="Проверяемых новых циклов")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "bench.db")
+    os.environ["DATABASE_NAME"] = path
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ.setdefault("PIN_CODE_HASH", "")
+
+    import collecting_data
+    from alerts import AlertRegistry, add_subscription
+    from latest_snapshot import MARKET_SYMBOL
+    from rollups import CYCLE_MS, DAY_MS
+
+    names = fill_db(path, args.symbols, args.days)
+    rnd = random.Random(1)
+    conn = sqlite3.connect(path)
+    for chat_id in range(args.users):
+        for _ in range(args.per_user):
+            market = rnd.random() < 0.1
+            symbol = MARKET_SYMBOL if market else rnd.choice(names)
+            add_subscription(conn, chat_id, symbol, *random_condition(rnd, market), 0)
+
+    cycle_time = conn.execute("SELECT MAX(time) FROM market_summary").fetchone()[0]
+    cycles = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(args.cycles + 1):
+            cycle_time += CYCLE_MS
+            pair_rows, summary = make_cycle(rnd, names)
+            collecting_data.save_cycle_data(conn, cycle_time, pair_rows, summary)
+            values = {row[0]: row[3] for row in pair_rows}
+            values[MARKET_SYMBOL] = summary[2]
+            cycles.append((values, collecting_data.rolling_stats.zscores[DAY_MS]))
+
+    registry = AlertRegistry()
+    registry.load(conn)
+    user_subscriptions = {}
+    for subscriptions in registry.by_symbol.values():
+        for subscription in subscriptions:
+            user_subscriptions.setdefault(subscription.chat_id, []).append(subscription)
+
+    # Первый цикл только запоминает состояния условий
+    registry.evaluate(*cycles[0])
+    indexed, naive = [], []
+    messages = alerts_total = 0
+    for values, zscores in cycles[1:]:
+        started = time.perf_counter()
+        alerts, changed = registry.evaluate(values, zscores)
+        indexed.append((time.perf_counter() - started) * 1000)
+        messages += len(alerts)
+        alerts_total += sum(len(texts) for texts in alerts.values())
+        started = time.perf_counter()
+        evaluate_naive(user_subscriptions, values)
+        naive.append((time.perf_counter() - started) * 1000)
+    conn.close()
+
+    evaluated = len(cycles) - 1
+    summary_messages = args.users * evaluated
+    subscriptions = args.users * args.per_user
+    print(f"{args.symbols} пар, {args.users} пользователей, {subscriptions} подписок, {evaluated} циклов")
+    print(f"Сводка каждому пользователю:     {summary_messages} сообщений")
+    print(f"Пороговые уведомления:           {messages} сообщений ({alerts_total} сработавших условий), "
+          f"×{summary_messages / max(messages, 1):.1f} меньше")
+    print(f"Проверка цикла по индексу:       медиана {statistics.median(indexed):8.3f} мс")
+    print(f"Перебор пользователи × пары:     медиана {statistics.median(naive):8.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Замер задержки обработчиков бота при одновременных пользователях:
+# прежний доступ к базе (новое соединение sqlite3 на каждый запрос прямо
+# в цикле событий) против db_access.Database. Запросы приходят с заданной
+# частотой независимо от того, успевает ли бот, задержка считается от момента
+# прихода запроса до ответа, поэтому учитывает и ожидание в очереди.
+# Запуск: python -m benchmarks.bench_bot_db --rate 400 --seconds 5
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_handler_load import percentile
+from benchmarks.generate_data import fill_db
+
+
+# Заглушки сообщений aiogram
+class FakeChat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class FakeMessage:
+    def __init__(self, chat_id, text=""):
+        self.chat = FakeChat(chat_id)
+        self.text = text
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+
+class FakeCallback:
+    def __init__(self, chat_id):
+        self.message = FakeMessage(chat_id)
+
+
+# Прежние обработчики: соединение открывается на каждый запрос
+def legacy_handlers(path):
+    def query(sql, params=()):
+        with sqlite3.connect(path) as conn:
+            return conn.execute(sql, params).fetchone()
+
+    async def authorized(chat_id, symbol):
+        query("SELECT chat_id FROM users WHERE chat_id = ?", (chat_id,))
+
+    async def coin(chat_id, symbol):
+        query("SELECT time, bid_volume, ask_volume, dizbalance FROM market_pressure "
+              "WHERE symbol = ? ORDER BY time DESC LIMIT 1", (symbol,))
+
+    async def summary(chat_id, symbol):
+        query("SELECT time, total_bid_volume, total_ask_volume, total_dizbalance FROM market_summary "
+              "ORDER BY time DESC LIMIT 1")
+
+    return {"авторизация": authorized, "монета": coin, "рынок": summary}
+
+
+# Обработчики бота на реестре пользователей и последних данных в памяти
+def pool_handlers(path):
+    import disbalancebot
+
+    with sqlite3.connect(path) as conn:
+        disbalancebot.latest_snapshot.load(conn)
+
+    async def authorized(chat_id, symbol):
+        disbalancebot.is_user_authorized(chat_id)
+
+    async def coin(chat_id, symbol):
+        await disbalancebot.coin_data_handler(FakeMessage(chat_id, symbol))
+
+    async def summary(chat_id, symbol):
+        await disbalancebot.market_summary_handler(FakeCallback(chat_id))
+
+    return {"авторизация": authorized, "монета": coin, "рынок": summary}
+
+
+# Функция для подачи запросов с постоянной частотой rate в течение seconds
+async def run(handlers, symbols, rate, seconds):
+    rnd = random.Random(1)
+    latencies = {name: [] for name in handlers}
+    tasks = []
+
+    async def call(name, arrival):
+        await handlers[name](rnd.randint(1, 1000), rnd.choice(symbols))
+        latencies[name].append((time.perf_counter() - arrival) * 1000)
+
+    started = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        arrival = started + i / rate
+        await asyncio.sleep(max(0, arrival - time.perf_counter()))
+        tasks.append(asyncio.create_task(call(rnd.choice(list(handlers)), arrival)))
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка обработчиков бота под нагрузкой")
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--rate", type=float, default=400, help="Запросов в секунду")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_NAME"] = path
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ.setdefault("PIN_CODE_HASH", "")
+    symbols = fill_db(path, args.symbols, args.days)
+
+    for mode, handlers in (("прежний", legacy_handlers(path)), ("db_access", pool_handlers(path))):
+        latencies = asyncio.run(run(handlers, symbols, args.rate, args.seconds))
+        for name, values in latencies.items():
+            print(f"{mode:<10} {name:<12} p50 {statistics.median(values):8.2f} мс  "
+                  f"p99 {percentile(values, 99):8.2f} мс  ({len(values)} запросов)")
+
+
+if __name__ == "__main__":
+    main()
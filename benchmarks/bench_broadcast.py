@@ -0,0 +1,71 @@
+# Замер рассылки на локальной заглушке Telegram Bot API (benchmarks/fake_telegram.py):
+# прежняя последовательная отправка против Broadcaster.
+# Запуск: python -m benchmarks.bench_broadcast --chats 300 --latency 0.05 --rate 30
+import argparse
+import asyncio
+import os
+import time
+
+from aiohttp import web
+
+from benchmarks.fake_telegram import create_app
+
+HOST = "127.0.0.1"
+
+
+# Прежняя рассылка: отправка по одному чату с выводом ошибок
+async def legacy_broadcast(api_url, chat_ids, text):
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+    errors = 0
+    for chat_id in chat_ids:
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+        except Exception:
+            errors += 1
+    await bot.session.close()
+    return f"ошибок {errors}"
+
+
+# Рассылка через Broadcaster
+async def broadcaster_broadcast(api_url, chat_ids, text):
+    from broadcaster import Broadcaster
+
+    broadcaster = Broadcaster(api_url=api_url)
+    result = await broadcaster.broadcast(chat_ids, text)
+    await broadcaster.close()
+    return str(result)
+
+
+async def run(args):
+    results = {}
+    for name, method in (("последовательно", legacy_broadcast), ("Broadcaster", broadcaster_broadcast)):
+        app = create_app(args.latency, args.rate, blocked=range(0, args.chats, 50))
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, HOST, args.port)
+        await site.start()
+        started = time.perf_counter()
+        summary = await method(f"http://{HOST}:{args.port}", list(range(args.chats)), "Тестовое уведомление")
+        elapsed = time.perf_counter() - started
+        results[name] = (elapsed, app["stats"], summary)
+        await runner.cleanup()
+    for name, (elapsed, stats, summary) in results.items():
+        print(f"{name:<16} {elapsed:6.2f} с  заглушка: {stats}")
+        print(f"{'':<16} {summary}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер рассылки уведомлений")
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate", type=int, default=30, help="Лимит заглушки, сообщений в секунду")
+    parser.add_argument("--port", type=int, default=8083)
+    args = parser.parse_args()
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ.setdefault("PIN_CODE_HASH", "")
+    os.environ.setdefault("DATABASE_NAME", "bench.db")
+    asyncio.run(run(args))
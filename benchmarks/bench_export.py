@@ -0,0 +1,85 @@
+# Замер пикового расхода памяти при выгрузке истории монеты:
+# прежний способ (весь SELECT в DataFrame pandas, затем to_excel)
+# против потоковой выгрузки exports.py в Excel, CSV и Parquet.
+# Память считается через tracemalloc, база создается заново для каждого размера.
+# Запуск: python -m benchmarks.bench_export --rows 20000 100000
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from db_schema import migrate
+from exports import EXPORT_EXTENSIONS, export_series
+from rollups import CYCLE_MS
+from time_utils import DISPLAY_TIMEZONE
+
+SYMBOL = "BTCUSDT"
+
+
+# Функция для заполнения базы рядом одной монеты из rows циклов
+def fill_db(path, rows):
+    rnd = random.Random(1)
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    with conn:
+        conn.executemany(
+            "INSERT INTO market_pressure (time, symbol, bid_volume, ask_volume, dizbalance) VALUES (?, ?, ?, ?, ?)",
+            ((i * CYCLE_MS, SYMBOL, rnd.uniform(1, 1000), rnd.uniform(1, 1000), rnd.uniform(-100, 100))
+             for i in range(rows)),
+        )
+    return conn
+
+
+# Прежний Excel отчет: вся история в памяти
+def legacy_excel(conn, path):
+    data = conn.execute(
+        "SELECT time, bid_volume, ask_volume, dizbalance FROM market_pressure WHERE symbol = ? ORDER BY time",
+        (SYMBOL,),
+    ).fetchall()
+    df = pd.DataFrame(data, columns=["Time", "Bid", "Ask", "Dizbalance"])
+    df["Time"] = pd.to_datetime(df["Time"], unit="ms", utc=True).dt.tz_convert(DISPLAY_TIMEZONE).dt.strftime("%Y.%m.%d %H:%M")
+    df.to_excel(path, index=False)
+
+
+# Функция для замера пиковой памяти (МБ) и времени (с) одной выгрузки
+def measure(func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2**20, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер памяти выгрузок")
+    parser.add_argument("--rows", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--skip-legacy", action="store_true", help="Не замерять прежний способ")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    for rows in args.rows:
+        conn = fill_db(os.path.join(directory, f"bench_{rows}.db"), rows)
+        methods = {} if args.skip_legacy else {"прежний Excel": ("xlsx", lambda path: legacy_excel(conn, path))}
+        for export_format, extension in EXPORT_EXTENSIONS.items():
+            methods[f"потоковый {export_format}"] = (
+                extension,
+                lambda path, export_format=export_format: export_series(conn, path, export_format, SYMBOL),
+            )
+        for name, (extension, method) in methods.items():
+            path = os.path.join(directory, f"out.{extension}")
+            peak, elapsed = measure(lambda: method(path))
+            size = os.path.getsize(path) / 2**20
+            os.remove(path)
+            print(f"{rows:>8} строк  {name:<20} пик памяти {peak:8.1f} МБ  {elapsed:6.1f} с  файл {size:6.1f} МБ")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Нагрузочный тест обработчика отчетов бота: одновременно запрашиваются
+# отчеты по разным монетам, параллельно каждые 10 мс выполняется «легкий»
+# запрос. Сравнивается построение отчетов прямо в цикле событий (как раньше)
+# и в пуле процессов (report_handler). Печатаются p50/p99 задержки легкого
+# запроса и время получения отчета.
+# Запуск: python -m benchmarks.bench_handler_load --requests 12 --symbols 20 --days 30
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.generate_data import fill_db
+
+PROBE_INTERVAL = 0.01
+
+
+# Заглушки сообщения и нажатия кнопки aiogram
+class FakeMessage:
+    async def answer(self, *args, **kwargs):
+        pass
+
+    answer_document = answer_photo = answer
+
+
+class FakeCallback:
+    def __init__(self, data):
+        self.data = data
+        self.message = FakeMessage()
+
+
+# Функция для замера задержки легкого запроса (опоздания таймера цикла событий)
+async def probe(delays, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(PROBE_INTERVAL)
+        delays.append((loop.time() - started - PROBE_INTERVAL) * 1000)
+
+
+# Функция для запуска серии запросов отчетов в одном из режимов
+async def run(mode, symbols, requests):
+    import disbalancebot
+    from report_cache import ReportCache
+    from reports import render_report
+
+    # Старое поведение: отчет строится прямо в обработчике
+    async def inline_handler(callback):
+        action, *params = callback.data.split("_")
+        render_report(action, params[1] if len(params) > 1 else None)
+
+    handler = disbalancebot.report_handler if mode == "pool" else inline_handler
+    disbalancebot.report_cache = ReportCache()
+    delays, report_times = [], []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(delays, stop))
+
+    async def request(i):
+        await asyncio.sleep(i * 0.05)
+        started = time.perf_counter()
+        action = ("png", "pdf", "excel")[i % 3]
+        await handler(FakeCallback(f"{action}_report_{symbols[i % len(symbols)]}"))
+        report_times.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(requests)))
+    total = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    return delays, report_times, total
+
+
+# Функция для перцентиля по отсортированной выборке
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест отчетов бота")
+    parser.add_argument("--requests", type=int, default=12)
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_NAME"] = path
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ.setdefault("PIN_CODE_HASH", "")
+    symbols = fill_db(path, args.symbols, args.days)
+
+    import disbalancebot
+    with sqlite3.connect(path) as conn:
+        disbalancebot.latest_snapshot.load(conn)
+    # Пул прогревается заранее: запуск процессов spawn не входит в замер
+    asyncio.run(run("pool", symbols, 2))
+    for mode in ("inline", "pool"):
+        delays, report_times, total = asyncio.run(run(mode, symbols, args.requests))
+        print(
+            f"{mode:>6}: легкий запрос p50 {statistics.median(delays):7.1f} мс, "
+            f"p99 {percentile(delays, 99):7.1f} мс, макс {max(delays):7.1f} мс; "
+            f"отчет p50 {statistics.median(report_times):7.0f} мс; всего {total:5.1f} с"
+        )
+    disbalancebot.report_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
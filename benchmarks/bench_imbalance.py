@@ -0,0 +1,71 @@
+# Замер расчета дисбаланса по телам ответов /fapi/v1/depth за один цикл:
+# прежний json.loads + построчный analyze_order_book против
+# imbalance.parse_depth_response + векторизованного analyze_order_books.
+# Запуск: python -m benchmarks.bench_imbalance --symbols 300 --levels 500
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.stub_binance import make_order_book, make_symbols
+from imbalance import ANALYSIS_DEPTH, analyze_order_books, parse_depth_response
+
+
+# Прежняя реализация из collecting_data.py: списки float() по каждому уровню
+def analyze_order_book(order_book):
+    bids = order_book['bids']
+    asks = order_book['asks']
+    total_bid_volume = sum([float(bid[1]) for bid in bids])
+    total_ask_volume = sum([float(ask[1]) for ask in asks])
+    if total_bid_volume + total_ask_volume == 0:
+        return total_bid_volume, total_ask_volume, 0
+    dizbalance = (total_bid_volume - total_ask_volume) / (total_bid_volume + total_ask_volume) * 100
+    return total_bid_volume, total_ask_volume, dizbalance
+
+
+# Функция для лучшего из нескольких замеров
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер расчета дисбаланса")
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--levels", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    books = [make_order_book(symbol, args.levels, i) for i, symbol in enumerate(make_symbols(args.symbols))]
+    bodies = {book_symbol: json.dumps(book) for book_symbol, book in zip(make_symbols(args.symbols), books)}
+    # Прежний расчет получал 100 уровней, поэтому для него тела ответов короче
+    shallow_bodies = {
+        symbol: json.dumps({"bids": book["bids"][:ANALYSIS_DEPTH], "asks": book["asks"][:ANALYSIS_DEPTH]})
+        for symbol, book in zip(bodies, books)
+    }
+
+    # Как и в цикле сбора, разобранные стаканы всех пар живут в памяти одновременно
+    def run_legacy(payloads):
+        order_books = {symbol: json.loads(body) for symbol, body in payloads.items()}
+        return {symbol: analyze_order_book(book) for symbol, book in order_books.items()}
+
+    def run_vectorized(payloads):
+        return analyze_order_books({symbol: parse_depth_response(body) for symbol, body in payloads.items()})
+
+    legacy = best_of(lambda: run_legacy(shallow_bodies), args.repeat)
+    legacy_deep = best_of(lambda: run_legacy(bodies), args.repeat)
+    vectorized = best_of(lambda: run_vectorized(bodies), args.repeat)
+
+    # Проверка совпадения основного dizbalance с прежней реализацией
+    symbols, columns = run_vectorized(bodies)
+    expected = run_legacy(shallow_bodies)
+    assert np.allclose(columns["dizbalance"], [expected[symbol][2] for symbol in symbols])
+
+    print(f"Прежний расчет, {ANALYSIS_DEPTH} уровней, 1 колонка:      {legacy * 1000:8.2f} мс")
+    print(f"Прежний расчет, {args.levels} уровней, 1 колонка:      {legacy_deep * 1000:8.2f} мс")
+    print(f"NumPy, {args.levels} уровней, {len(columns)} колонок (все диапазоны): {vectorized * 1000:8.2f} мс")
@@ -0,0 +1,58 @@
+# Замер запроса последних данных по монете и по рынку при разном объеме истории:
+# прежний ORDER BY time DESC LIMIT 1 по таблицам истории, чтение latest_pressure
+# по первичному ключу и копия LatestSnapshot в памяти бота.
+# Запуск: python -m benchmarks.bench_latest --symbols 100 --days 1 7 30
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.generate_data import fill_db
+
+REPEAT = 2000
+
+
+# Функция для среднего времени вызова в микросекундах
+def measure(func):
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - started) / REPEAT * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер запроса последних данных")
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 7, 30])
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_NAME", "bench.db")
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ.setdefault("PIN_CODE_HASH", "")
+    from latest_snapshot import LatestSnapshot, fetch_latest
+
+    for days in args.days:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        symbol = fill_db(path, args.symbols, days)[0]
+        conn = sqlite3.connect(path)
+        snapshot = LatestSnapshot()
+        snapshot.load(conn)
+        rows = conn.execute("SELECT COUNT(*) FROM market_pressure").fetchone()[0]
+        methods = {
+            "история, монета": lambda: conn.execute(
+                "SELECT time, bid_volume, ask_volume, dizbalance FROM market_pressure "
+                "WHERE symbol = ? ORDER BY time DESC LIMIT 1", (symbol,)).fetchone(),
+            "история, рынок": lambda: conn.execute(
+                "SELECT time, total_bid_volume, total_ask_volume, total_dizbalance FROM market_summary "
+                "ORDER BY time DESC LIMIT 1").fetchone(),
+            "latest_pressure": lambda: fetch_latest(conn, symbol),
+            "в памяти": lambda: snapshot.get(symbol),
+        }
+        for name, method in methods.items():
+            print(f"{rows:>9} строк  {name:<18} {measure(method):8.2f} мкс")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
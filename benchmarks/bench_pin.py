@@ -0,0 +1,53 @@
+# Замер влияния перебора пин-кода на остальных пользователей бота:
+# одновременно приходят burst проверок пин-кода, параллельно каждые 10 мс
+# выполняется легкий запрос. Сравнивается bcrypt.checkpw в цикле событий
+# (как раньше) и проверка в пуле потоков (disbalancebot.check_pin).
+# Запуск: python -m benchmarks.bench_pin --burst 20 --rounds 12
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+
+import bcrypt
+
+from benchmarks.bench_handler_load import percentile, probe
+
+
+async def run(check, burst):
+    delays = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(delays, stop))
+    await asyncio.sleep(0.05)
+    await asyncio.gather(*(check(f"{i:04d}") for i in range(burst)))
+    stop.set()
+    await probe_task
+    return delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка бота при переборе пин-кода")
+    parser.add_argument("--burst", type=int, default=20, help="Одновременных проверок пин-кода")
+    parser.add_argument("--rounds", type=int, default=12, help="Сложность хеша bcrypt")
+    args = parser.parse_args()
+
+    pin_hash = bcrypt.hashpw(b"9999", bcrypt.gensalt(args.rounds)).decode()
+    os.environ["PIN_CODE_HASH"] = pin_hash
+    os.environ.setdefault("DATABASE_NAME", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    import disbalancebot
+
+    # Прежняя проверка прямо в обработчике
+    async def legacy_check(pin):
+        return bcrypt.checkpw(pin.encode(), pin_hash.encode())
+
+    for name, check in (("в цикле событий", legacy_check), ("в пуле потоков", disbalancebot.check_pin)):
+        delays = asyncio.run(run(check, args.burst))
+        print(f"{name:<16} легкий запрос p50 {statistics.median(delays):7.1f} мс, "
+              f"p99 {percentile(delays, 99):7.1f} мс, макс {max(delays):7.1f} мс")
+    disbalancebot.pin_executor.shutdown()
+    disbalancebot.report_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Замер задержки запросов бота до и после миграции схемы на большой базе.
+# База создается в старой схеме бота (market_pressure без ключа и индексов),
+# затем к ней применяются миграции db_schema.
+# Запуск: python -m benchmarks.bench_queries --symbols 300 --cycles 7000
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from db_schema import migrate
+
+# Запросы из disbalancebot.py
+QUERIES = {
+    "Последние данные по монете": (
+        "SELECT time, bid_volume, ask_volume, dizbalance FROM market_pressure "
+        "WHERE symbol = ? ORDER BY time DESC LIMIT 1",
+        True,
+    ),
+    "PNG/PDF отчет по монете": (
+        "SELECT time, dizbalance FROM market_pressure WHERE symbol = ? ORDER BY time DESC LIMIT 3000",
+        True,
+    ),
+    "Excel отчет по монете": (
+        "SELECT time, bid_volume, ask_volume, dizbalance FROM market_pressure "
+        "WHERE symbol = ? ORDER BY time DESC",
+        True,
+    ),
+    "Последний агрегат по рынку": (
+        "SELECT time, total_bid_volume, total_ask_volume, total_dizbalance FROM market_summary "
+        "ORDER BY time DESC LIMIT 1",
+        False,
+    ),
+    "PNG/PDF отчет по рынку": (
+        "SELECT time, total_dizbalance FROM market_summary ORDER BY time DESC LIMIT 3000",
+        False,
+    ),
+}
+
+
+# Функция для заполнения базы в старой схеме бота
+def fill_legacy_db(conn, symbols, cycles):
+    conn.execute("CREATE TABLE users (chat_id INTEGER PRIMARY KEY)")
+    conn.execute("CREATE TABLE market_summary (time TEXT, total_bid_volume REAL, "
+                 "total_ask_volume REAL, total_dizbalance REAL)")
+    conn.execute("CREATE TABLE market_pressure (symbol TEXT, time TEXT, bid_volume REAL, "
+                 "ask_volume REAL, dizbalance REAL)")
+    start = datetime(2024, 1, 1)
+    names = [f"SYM{i:03d}USDT" for i in range(symbols)]
+    for cycle in range(cycles):
+        cycle_time = (start + timedelta(minutes=15 * cycle)).isoformat() + "+03:00"
+        conn.executemany(
+            "INSERT INTO market_pressure VALUES (?, ?, ?, ?, ?)",
+            [(name, cycle_time, random.random(), random.random(), random.uniform(-100, 100)) for name in names],
+        )
+        conn.execute("INSERT INTO market_summary VALUES (?, 1, 1, 0)", (cycle_time,))
+    conn.commit()
+    return names
+
+
+# Функция для замера средней задержки каждого запроса
+def measure(conn, names, repeat):
+    results = {}
+    for title, (query, per_symbol) in QUERIES.items():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(query, (random.choice(names),) if per_symbol else ()).fetchall()
+        results[title] = (time.perf_counter() - started) / repeat * 1000
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Задержка запросов бота до и после миграции")
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--cycles", type=int, default=7000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(os.path.join(directory, "bench.db"))
+        started = time.perf_counter()
+        names = fill_legacy_db(conn, args.symbols, args.cycles)
+        print(f"Строк market_pressure: {args.symbols * args.cycles:,} "
+              f"(заполнение {time.perf_counter() - started:.1f} с)")
+
+        before = measure(conn, names, args.repeat)
+        started = time.perf_counter()
+        migrate(conn)
+        print(f"Миграция: {time.perf_counter() - started:.1f} с")
+        after = measure(conn, names, args.repeat)
+        conn.close()
+
+    print(f"{'Запрос':32} {'до, мс':>10} {'после, мс':>10}")
+    for title in QUERIES:
+        print(f"{title:32} {before[title]:10.2f} {after[title]:10.2f}")
@@ -0,0 +1,100 @@
+# Замер построения отчетов-графиков: PNG и PDF отдельными построениями
+# (данные и график на каждый формат) против одного построения с сохранением
+# одной фигуры в оба формата.
+# Отдельно сравнивается отрисовка одного графика (построение фигуры и рендеринг
+# в Agg без кодирования файла) прежним способом — новая фигура, отдельный
+# прямоугольник на каждый столбец и tight_layout — и на заготовке ChartTemplate,
+# для ряда отчета и для плотного ряда из --dense точек.
+# Запуск: python -m benchmarks.bench_render --days 30 --repeat 5
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+# Функция для медианного времени вызова в миллисекундах
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+# Прежнее построение графика: новая фигура 20×8, ax.bar и tight_layout на каждый вызов
+def generate_chart_bars(data, title, color, resolution=0):
+    import pandas as pd
+    from matplotlib.dates import DateFormatter, HourLocator
+    from matplotlib.figure import Figure
+
+    from reports import CHART_WINDOW_DAYS
+    from rollups import DAY_MS
+    from time_utils import DISPLAY_TIMEZONE
+
+    fig = Figure(figsize=(20, 8))
+    ax = fig.add_subplot()
+    times = pd.to_datetime([row[0] for row in data], unit="ms", utc=True).tz_convert(DISPLAY_TIMEZONE).tz_localize(None)
+    ax.bar(times, [row[1] for row in data], color=color, width=0.8 * (resolution or 15 * 60 * 1000) / DAY_MS,
+           edgecolor="black", linewidth=0.2)
+    ax.xaxis.set_major_formatter(DateFormatter("%d.%m"))
+    ax.xaxis.set_major_locator(HourLocator(interval=24))
+    ax.set_title(f"Дисбаланс {title.strip()} за {CHART_WINDOW_DAYS} дней", fontsize=14, pad=20)
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment("right")
+    fig.tight_layout()
+    return fig
+
+
+# Функция для отрисовки фигуры в Agg (без кодирования PNG)
+def draw(fig):
+    FigureCanvasAgg(fig).draw()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер построения графиков отчетов")
+    parser.add_argument("--symbols", type=int, default=5)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--dense", type=int, default=3000, help="Точек в плотном ряду")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_NAME"] = path
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ.setdefault("PIN_CODE_HASH", "")
+    from benchmarks.generate_data import fill_db
+    symbol = fill_db(path, args.symbols, args.days)[0]
+
+    import reports
+    results = {
+        "PNG": lambda: reports.create_chart_reports(symbol, ("png",)),
+        "PDF": lambda: reports.create_chart_reports(symbol, ("pdf",)),
+        "PNG + PDF отдельно": lambda: (
+            reports.create_chart_reports(symbol, ("png",)),
+            reports.create_chart_reports(symbol, ("pdf",)),
+        ),
+        "PNG + PDF из одной фигуры": lambda: reports.create_chart_reports(symbol),
+    }
+    data, resolution = reports.load_chart_data(symbol)
+    rnd = random.Random(1)
+    dense_resolution = 15 * 60 * 1000
+    dense = [(data[-1][0] - i * dense_resolution, rnd.uniform(-100, 100)) for i in range(args.dense)][::-1]
+    for series, series_resolution in ((data, resolution), (dense, dense_resolution)):
+        name = f"{len(series)} точек"
+        results[f"График {name}, прежний"] = lambda series=series, series_resolution=series_resolution: draw(
+            generate_chart_bars(series, symbol, "#4ECDC4", series_resolution))
+        results[f"График {name}, заготовка"] = lambda series=series, series_resolution=series_resolution: draw(
+            reports.generate_chart(series, symbol, "#4ECDC4", series_resolution))
+    measure(results["PNG"], 1)
+    for name, func in results.items():
+        print(f"{name:<32} {measure(func, args.repeat):8.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Проверка срока хранения: база заполняется синтетическими циклами за days дней,
+# затем retention.apply_retention переносит устаревшие месяцы в Parquet.
+# Печатаются размер базы до и после, размер архива, время архивирования
+# и время выгрузки CSV за период, целиком лежащий в архиве, и за период в базе.
+# Выгрузки сверяются со снятыми до архивирования.
+# Запуск: python -m benchmarks.bench_retention --symbols 50 --days 150 --retention 30
+import argparse
+import filecmp
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.generate_data import fill_db
+
+
+# Функция для суммарного размера файлов каталога в МБ
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2 ** 20
+
+
+# Функция для размера базы с WAL в МБ
+def db_size(path):
+    return sum(os.path.getsize(name) for name in (path, f"{path}-wal") if os.path.exists(name)) / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Срок хранения и архивы Parquet")
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--days", type=int, default=150)
+    parser.add_argument("--retention", type=int, default=30, help="Срок хранения сырых данных, дней")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "bench.db")
+    archive_dir = os.path.join(workdir, "archive")
+    os.environ["DATABASE_NAME"] = path
+    os.environ["ARCHIVE_DIR"] = archive_dir
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ.setdefault("PIN_CODE_HASH", "")
+    symbols = fill_db(path, args.symbols, args.days)
+
+    from exports import export_series
+    from retention import apply_retention, archive_boundary
+    from time_utils import format_time, now_ms
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    old_range = (now_ms() - args.days * 86_400_000, now_ms() - (args.retention + 40) * 86_400_000)
+    hot_range = (now_ms() - 7 * 86_400_000, None)
+    before = {}
+    for name, (since, until) in (("архив", old_range), ("база", hot_range)):
+        before[name] = os.path.join(workdir, f"before_{name}.csv")
+        export_series(conn, before[name], "csv", symbols[0], since, until)
+
+    size_before = db_size(path)
+    result = apply_retention(conn, args.retention)
+    size_after = db_size(path)
+    print(f"Срок хранения: {result}")
+    print(f"Граница архива: {format_time(archive_boundary(conn))}")
+    print(f"База: {size_before:.1f} МБ -> {size_after:.1f} МБ, архив {dir_size(archive_dir):.1f} МБ")
+
+    for name, (since, until) in (("архив", old_range), ("база", hot_range)):
+        out = os.path.join(workdir, f"after_{name}.csv")
+        started = time.perf_counter()
+        export_series(conn, out, "csv", symbols[0], since, until)
+        elapsed = (time.perf_counter() - started) * 1000
+        same = filecmp.cmp(before[name], out, shallow=False)
+        print(f"Выгрузка CSV ({name}): {elapsed:7.1f} мс, совпадает с исходной: {same}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
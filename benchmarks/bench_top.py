@@ -0,0 +1,93 @@
+# Замер рейтингов /top (rolling_stats.py): база заполняется синтетическими
+# циклами за days дней, затем сравниваются ответ по готовому рейтингу
+# в памяти бота (TopMovers) и расчет того же рейтинга z-score запросом
+# по market_pressure за 24 часа и 7 дней, который понадобился бы без
+# скользящей статистики. Отдельно замеряется, сколько добавляет
+# обновление статистики и рейтингов к записи цикла.
+# Запуск: python -m benchmarks.bench_top --symbols 300 --days 10
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.generate_data import fill_db, make_cycle
+from benchmarks.suite import measure
+
+# Рейтинг z-score последнего цикла запросом по истории окна
+ZSCORE_TOP_SQL = """
+    WITH window AS (
+        SELECT symbol, AVG(dizbalance) AS mean,
+               AVG(dizbalance * dizbalance) - AVG(dizbalance) * AVG(dizbalance) AS variance
+        FROM market_pressure
+        WHERE time > ? AND time < ?
+        GROUP BY symbol
+    )
+    SELECT p.symbol, (p.dizbalance - w.mean) / SQRT(w.variance) AS z
+    FROM market_pressure p JOIN window w USING (symbol)
+    WHERE p.time = ? AND w.variance > 0
+    ORDER BY ABS(z) DESC
+    LIMIT ?
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Рейтинги /top")
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--cycles", type=int, default=20, help="Записываемых циклов для замера записи")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "bench.db")
+    os.environ["DATABASE_NAME"] = path
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ.setdefault("PIN_CODE_HASH", "")
+
+    import collecting_data
+    from rolling_stats import TopMovers
+    from rollups import CYCLE_MS, DAY_MS
+
+    names = fill_db(path, args.symbols, args.days)
+    conn = sqlite3.connect(path)
+    rnd = random.Random(2)
+    cycle_time = conn.execute("SELECT MAX(time) FROM market_summary").fetchone()[0]
+
+    # Запись цикла со статистикой и без нее (RollingStats.update заменяется пустым)
+    update = collecting_data.rolling_stats.update
+    write = {}
+    for mode in ("без статистики", "со статистикой"):
+        collecting_data.rolling_stats.update = update if mode == "со статистикой" else lambda *args: None
+        times = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(args.cycles):
+                cycle_time += CYCLE_MS
+                pair_rows, summary = make_cycle(rnd, names)
+                started = time.perf_counter()
+                collecting_data.save_cycle_data(conn, cycle_time, pair_rows, summary)
+                times.append((time.perf_counter() - started) * 1000)
+        write[mode] = statistics.median(times)
+    collecting_data.rolling_stats.update = update
+
+    top_movers = TopMovers()
+    load = measure(lambda: top_movers.load(conn), 20)
+    answer = measure(lambda: top_movers.get("z24h", args.top), 1000)
+    print(f"{args.symbols} пар × {args.days} дней")
+    print(f"Запись цикла без статистики:    медиана {write['без статистики']:9.3f} мс")
+    print(f"Запись цикла со статистикой:    медиана {write['со статистикой']:9.3f} мс")
+    print(f"Загрузка рейтингов в бот:       медиана {load['median']:9.3f} мс (раз за цикл)")
+    print(f"Ответ /top из памяти:           медиана {answer['median']:9.3f} мс")
+    for name, window_ms in (("24h", DAY_MS), ("7d", 7 * DAY_MS)):
+        result = measure(lambda: conn.execute(
+            ZSCORE_TOP_SQL, (cycle_time - window_ms, cycle_time, cycle_time, args.top)).fetchall(), 5)
+        print(f"{f'Рейтинг z{name} по истории:':<31} медиана {result['median']:9.3f} мс")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Замер получения стаканов при лимите веса запросов: заглушка Binance
+# (stub_binance.py) считает вес за окно, отвечает 429 при превышении
+# и блокирует IP (418), если запросы продолжаются. Сравниваются запросы
+# без учета веса (как раньше), с WeightGovernor и с WeightGovernor
+# и равномерным распределением запросов по окну. Каждый режим — два цикла
+# подряд на новой заглушке: блокировка после первого цикла срывает второй.
+# Окно лимита сокращено до --window секунд, чтобы замер шел недолго.
+# Запуск: python -m benchmarks.bench_weight --symbols 300 --limit 100 --weight-limit 600 --window 5
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+from aiohttp import web
+
+from benchmarks.stub_binance import create_app
+from benchmarks.suite import free_port
+
+HOST = "127.0.0.1"
+
+
+# Прежнее поведение: вес не учитывается, 429 и 418 не приостанавливают запросы
+class NoGovernor:
+    async def acquire(self, weight):
+        pass
+
+    def update(self, status, headers):
+        return False
+
+
+async def run(mode, args):
+    import collecting_data
+    from weight_governor import WeightGovernor
+
+    port = free_port()
+    app = create_app(args.symbols, args.latency, weight_limit=args.weight_limit, window=args.window,
+                     ban=args.window * 4)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, port).start()
+    collecting_data.BINANCE_API_URL = f"http://{HOST}:{port}"
+    collecting_data.weight_governor = (
+        NoGovernor() if mode == "без учета веса" else WeightGovernor(args.weight_limit, args.share, args.window)
+    )
+    stagger = args.window if mode == "governor + stagger" else 0
+    symbols = [f"SYM{i:03d}USDT" for i in range(args.symbols)]
+    cycles = []
+    for _ in range(2):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            books = await collecting_data.fetch_order_books(symbols, args.limit, stagger=stagger)
+        cycles.append((time.perf_counter() - started, sum(1 for book in books.values() if book)))
+    await runner.cleanup()
+    return cycles, app["stats"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Получение стаканов при лимите веса")
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=100, help="Глубина стакана (вес 5)")
+    parser.add_argument("--weight-limit", type=int, default=600, help="Лимит веса заглушки за окно")
+    parser.add_argument("--window", type=float, default=5, help="Окно лимита, сек")
+    parser.add_argument("--share", type=float, default=0.8, help="Доля лимита для governor")
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ.setdefault("PIN_CODE_HASH", "")
+    os.environ.setdefault("DATABASE_NAME", "bench.db")
+
+    for mode in ("без учета веса", "governor", "governor + stagger"):
+        cycles, stats = asyncio.run(run(mode, args))
+        summary = "; ".join(f"цикл {i + 1}: {books}/{args.symbols} за {elapsed:5.1f} с"
+                            for i, (elapsed, books) in enumerate(cycles))
+        print(f"{mode:<20} {summary}; 429: {stats['429']}, 418: {stats['418']}, "
+              f"макс. вес в окне {stats['max_used_weight']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Замер скорости записи цикла: построчные коммиты против одной транзакции.
+# Запуск: python -m benchmarks.bench_write --symbols 300 --cycles 20
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.generate_data import make_cycle
+from collecting_data import create_tables_if_not_exist, save_cycle_data
+from imbalance import PRESSURE_COLUMNS
+from rollups import CYCLE_MS
+
+INSERT_PRESSURE_SQL = (
+    f"INSERT INTO market_pressure (time, symbol, {', '.join(PRESSURE_COLUMNS)}) "
+    f"VALUES (?, ?, {', '.join('?' * len(PRESSURE_COLUMNS))})"
+)
+
+
+# Функция для подготовки пустой базы во временном каталоге
+def make_db(directory, name, wal):
+    conn = sqlite3.connect(os.path.join(directory, name))
+    if wal:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    create_tables_if_not_exist(conn)
+    return conn
+
+
+# Прежний путь записи: commit на каждую пару и отдельный commit агрегата
+def write_per_row(conn, cycle_time, rows, summary):
+    for row in rows:
+        cursor = conn.cursor()
+        cursor.execute(
+            INSERT_PRESSURE_SQL,
+            (cycle_time, *row),
+        )
+        conn.commit()
+        cursor.close()
+    conn.execute(
+        "INSERT INTO market_summary (time, total_bid_volume, total_ask_volume, total_dizbalance) VALUES (?, ?, ?, ?)",
+        (cycle_time, *summary),
+    )
+    conn.commit()
+
+
+# Новый путь записи: весь цикл одной транзакцией
+def write_cycle(conn, cycle_time, rows, summary):
+    if not save_cycle_data(conn, cycle_time, rows, summary):
+        raise RuntimeError("Цикл не записан")
+
+
+# Функция для замера одного способа записи, возвращает строк в секунду
+def measure(write, conn, symbols, cycles):
+    rnd = random.Random(1)
+    names = [f"SYM{i:03d}USDT" for i in range(symbols)]
+    start_ms = 1735678800000  # 2025-01-01 00:00 МСК
+    elapsed = 0.0
+    for cycle in range(cycles):
+        rows, summary = make_cycle(rnd, names)
+        cycle_time = start_ms + cycle * CYCLE_MS
+        started = time.perf_counter()
+        write(conn, cycle_time, rows, summary)
+        elapsed += time.perf_counter() - started
+    return symbols * cycles / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер скорости записи цикла в SQLite")
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--cycles", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        old_conn = make_db(directory, "old.db", wal=False)
+        old_rate = measure(write_per_row, old_conn, args.symbols, args.cycles)
+        old_conn.close()
+
+        new_conn = make_db(directory, "new.db", wal=True)
+        new_rate = measure(write_cycle, new_conn, args.symbols, args.cycles)
+        new_conn.close()
+
+    print(f"Построчные коммиты:   {old_rate:12.0f} строк/с")
+    print(f"Одна транзакция, WAL: {new_rate:12.0f} строк/с")
+    print(f"Ускорение: x{new_rate / old_rate:.1f}")
@@ -0,0 +1,8 @@
+# Общие настройки проверок в каталоге benchmarks: configs.py читает
+# обязательные параметры из окружения при импорте модулей проекта.
+import os
+import tempfile
+
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("PIN_CODE_HASH", "")
+os.environ.setdefault("DATABASE_NAME", os.path.join(tempfile.mkdtemp(), "test.db"))
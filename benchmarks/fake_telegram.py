@@ -0,0 +1,82 @@
+# Локальная заглушка Telegram Bot API для проверки рассылки.
+# Отвечает на sendMessage с заданной задержкой, возвращает 429 с retry_after
+# при превышении лимита сообщений в секунду, 403 для «заблокировавших» чатов
+# и 500 для чатов, на которых сервер Telegram «падает».
+# Запуск:
+#   python -m benchmarks.fake_telegram --port 8083 --rate 30 --blocked 5,7
+#   TELEGRAM_API_URL=http://127.0.0.1:8083 python collecting_data.py --once
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+
+# Функция для создания приложения заглушки.
+# rate — лимит сообщений в секунду на бота (скользящее окно в 1 с),
+# blocked — chat_id, для которых sendMessage отвечает 403, failing — 500.
+def create_app(latency=0.05, rate=30, retry_after=1, blocked=(), failing=()):
+    app = web.Application()
+    app["stats"] = {"sent": 0, "rate_limited": 0, "forbidden": 0, "server_errors": 0, "max_per_second": 0}
+    app["sent_at"] = []
+    app["messages"] = []
+    blocked = set(blocked)
+    failing = set(failing)
+
+    async def send_message(request):
+        data = dict(await request.post()) or await request.json()
+        stats = app["stats"]
+        await asyncio.sleep(latency)
+        chat_id = int(data["chat_id"])
+        if chat_id in blocked:
+            stats["forbidden"] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"},
+                status=403,
+            )
+        if chat_id in failing:
+            stats["server_errors"] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 500, "description": "Internal Server Error"}, status=500,
+            )
+        now = time.monotonic()
+        window = [moment for moment in app["sent_at"] if now - moment < 1]
+        if len(window) >= rate:
+            stats["rate_limited"] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {retry_after}",
+                 "parameters": {"retry_after": retry_after}},
+                status=429,
+            )
+        window.append(now)
+        app["sent_at"] = window
+        stats["sent"] += 1
+        stats["max_per_second"] = max(stats["max_per_second"], len(window))
+        app["messages"].append((chat_id, data.get("text")))
+        return web.json_response({"ok": True, "result": {
+            "message_id": stats["sent"], "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "text": data.get("text"),
+        }})
+
+    async def stats(request):
+        return web.json_response(app["stats"])
+
+    app.router.add_post("/bot{token}/sendMessage", send_message)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8083)
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа, сек")
+    parser.add_argument("--rate", type=int, default=30, help="Сообщений в секунду до ответа 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--blocked", default="", help="chat_id через запятую, отвечающие 403")
+    parser.add_argument("--failing", default="", help="chat_id через запятую, отвечающие 500")
+    args = parser.parse_args()
+    blocked = [int(chat_id) for chat_id in args.blocked.split(",") if chat_id]
+    failing = [int(chat_id) for chat_id in args.failing.split(",") if chat_id]
+    web.run_app(create_app(args.latency, args.rate, args.retry_after, blocked, failing),
+                host=args.host, port=args.port)
@@ -0,0 +1,68 @@
+# Генератор синтетической истории для замеров: symbols пар × days дней циклов
+# по 15 минут в market_pressure и market_summary. Данные детерминированы seed,
+# агрегаты и скользящая статистика считаются по всей истории сразу
+# (rollups.backfill_rollups, rolling_stats.backfill_rolling_stats),
+# последние значения — по последнему циклу, как их записал бы сборщик.
+# Запуск: python -m benchmarks.generate_data --out bench.db --symbols 300 --days 30
+import argparse
+import random
+import sqlite3
+import time
+
+
+# Функция для генерации строк одного цикла: (symbol, *PRESSURE_COLUMNS) и агрегат по рынку
+def make_cycle(rnd, names):
+    rows = []
+    for name in names:
+        bid, ask = rnd.uniform(1, 1000), rnd.uniform(1, 1000)
+        diz = (bid - ask) / (bid + ask) * 100
+        rows.append((name, bid, ask, diz, diz, diz, diz, bid * 10, ask * 10))
+    total_bid = sum(row[1] for row in rows)
+    total_ask = sum(row[2] for row in rows)
+    return rows, (total_bid, total_ask, (total_bid - total_ask) / (total_bid + total_ask) * 100)
+
+
+# Функция для заполнения базы (схема создается миграциями db_schema).
+# Возвращает список имен пар.
+def fill_db(path, symbols, days, seed=1):
+    from db_schema import enable_wal, migrate
+    from imbalance import PRESSURE_COLUMNS
+    from latest_snapshot import update_latest
+    from rolling_stats import backfill_rolling_stats
+    from rollups import CYCLE_MS, backfill_rollups, display_offset_ms
+    from time_utils import now_ms
+
+    rnd = random.Random(seed)
+    names = [f"SYM{i:03d}USDT" for i in range(symbols)]
+    conn = sqlite3.connect(path)
+    enable_wal(conn)
+    migrate(conn)
+    end = now_ms() // CYCLE_MS * CYCLE_MS
+    with conn:
+        for cycle_time in range(end - days * 24 * 60 * 60 * 1000, end + 1, CYCLE_MS):
+            rows, summary = make_cycle(rnd, names)
+            conn.executemany(f"""
+                INSERT INTO market_pressure (time, symbol, {", ".join(PRESSURE_COLUMNS)})
+                VALUES (?, ?, {", ".join("?" * len(PRESSURE_COLUMNS))})
+            """, [(cycle_time, *row) for row in rows])
+            conn.execute("""
+                INSERT INTO market_summary (time, total_bid_volume, total_ask_volume, total_dizbalance)
+                VALUES (?, ?, ?, ?)
+            """, (cycle_time, *summary))
+        backfill_rollups(conn, display_offset_ms(end))
+        backfill_rolling_stats(conn)
+        update_latest(conn, cycle_time, rows, summary)
+    conn.close()
+    return names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генератор синтетической истории дисбаланса")
+    parser.add_argument("--out", required=True, help="Путь к файлу базы")
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    fill_db(args.out, args.symbols, args.days, args.seed)
+    print(f"База {args.out}: {args.symbols} пар × {args.days} дней за {time.perf_counter() - started:.1f} с")
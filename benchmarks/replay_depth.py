@@ -0,0 +1,203 @@
+# Локальный сервер воспроизведения diff-depth потоков Binance Futures.
+# Запись хранится в JSONL: строки {"type": "snapshot", "symbol": ..., "data": {...}}
+# с начальными стаканами и строки {"type": "event", "data": {...}} с событиями depthUpdate.
+#
+# Генерация синтетической записи:
+#   python -m benchmarks.replay_depth generate --out depth.jsonl --symbols 50 --events 20000
+# Запись реального потока Binance:
+#   python -m benchmarks.replay_depth record --out depth.jsonl --symbols BTCUSDT,ETHUSDT --seconds 60
+# Воспроизведение (WebSocket /stream, REST /fapi/v1/depth и /fapi/v1/exchangeInfo на одном порту):
+#   python -m benchmarks.replay_depth serve --recording depth.jsonl --port 8082
+#   BINANCE_API_URL=http://127.0.0.1:8082 BINANCE_STREAM_URL=ws://127.0.0.1:8082 python stream_collector.py
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import aiohttp
+from aiohttp import web
+
+from stream_collector import LocalOrderBook
+
+
+# Функция для чтения записи из файла
+def load_recording(path):
+    snapshots, events = {}, []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["type"] == "snapshot":
+                snapshots[record["symbol"]] = record["data"]
+            else:
+                events.append(record["data"])
+    return snapshots, events
+
+
+# Функция для генерации синтетической записи с согласованными updateId
+def generate(path, symbols, events, levels=200, seed=1):
+    rnd = random.Random(seed)
+    names = [f"SYM{i:03d}USDT" for i in range(symbols)]
+    update_ids = {}
+    with open(path, "w", encoding="utf-8") as f:
+        for symbol in names:
+            mid = rnd.uniform(0.1, 50000)
+            tick = mid * 0.0001
+            update_ids[symbol] = (mid, tick, rnd.randint(1, 10**6))
+            snapshot = {
+                "lastUpdateId": update_ids[symbol][2],
+                "bids": [[f"{mid - tick * (i + 1):.8f}", f"{rnd.uniform(0.1, 100):.3f}"] for i in range(levels)],
+                "asks": [[f"{mid + tick * (i + 1):.8f}", f"{rnd.uniform(0.1, 100):.3f}"] for i in range(levels)],
+            }
+            f.write(json.dumps({"type": "snapshot", "symbol": symbol, "data": snapshot}) + "\n")
+        for _ in range(events):
+            symbol = rnd.choice(names)
+            mid, tick, last_id = update_ids[symbol]
+            first_id = last_id + 1
+            new_id = first_id + rnd.randint(0, 5)
+            update_ids[symbol] = (mid, tick, new_id)
+
+            def side(sign):
+                return [
+                    [f"{mid + sign * tick * rnd.randint(1, levels):.8f}",
+                     "0" if rnd.random() < 0.2 else f"{rnd.uniform(0.1, 100):.3f}"]
+                    for _ in range(rnd.randint(1, 5))
+                ]
+
+            event = {
+                "e": "depthUpdate", "E": 0, "T": 0, "s": symbol,
+                "U": first_id, "u": new_id, "pu": last_id,
+                "b": side(-1), "a": side(1),
+            }
+            f.write(json.dumps({"type": "event", "data": event}) + "\n")
+
+
+# Функция для записи реального потока: снимок, затем события, согласованные с ним
+async def record(path, symbols, seconds, api_url, stream_url):
+    books = {symbol: LocalOrderBook(symbol) for symbol in symbols}
+    written = set()
+    streams = "/".join(f"{symbol.lower()}@depth@100ms" for symbol in symbols)
+    deadline = time.monotonic() + seconds
+    with open(path, "w", encoding="utf-8") as f:
+        async with aiohttp.ClientSession() as session:
+            async def load_snapshot(book):
+                params = {"symbol": book.symbol, "limit": 1000}
+                async with session.get(f"{api_url}/fapi/v1/depth", params=params) as response:
+                    snapshot = await response.json()
+                buffered = list(book.buffer)
+                if book.apply_snapshot(snapshot):
+                    f.write(json.dumps({"type": "snapshot", "symbol": book.symbol, "data": snapshot}) + "\n")
+                    for event in buffered:
+                        if event["u"] >= snapshot["lastUpdateId"]:
+                            f.write(json.dumps({"type": "event", "data": event}) + "\n")
+                    written.add(book.symbol)
+
+            async with session.ws_connect(f"{stream_url}/stream?streams={streams}") as ws:
+                while time.monotonic() < deadline:
+                    try:
+                        message = await ws.receive(timeout=deadline - time.monotonic())
+                    except asyncio.TimeoutError:
+                        break
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    event = json.loads(message.data)["data"]
+                    book = books[event["s"]]
+                    synced = book.synced
+                    if book.on_event(event):
+                        await load_snapshot(book)
+                    elif synced and book.synced and event["s"] in written:
+                        f.write(json.dumps({"type": "event", "data": event}) + "\n")
+
+
+# Функция для создания приложения воспроизведения.
+# Сервер применяет выдаваемые события к своей копии стакана,
+# поэтому REST-снимок всегда согласован с уже отправленными событиями.
+def create_app(recording, interval=0.001):
+    snapshots, events = load_recording(recording)
+    books = {}
+
+    # Функция для возврата стакана пары к начальному снимку записи
+    def restart_book(symbol):
+        book = LocalOrderBook(symbol)
+        book.apply_snapshot(snapshots[symbol])
+        books[symbol] = book
+
+    for symbol in snapshots:
+        restart_book(symbol)
+
+    app = web.Application()
+
+    async def depth(request):
+        book = books.get(request.query.get("symbol", ""))
+        if book is None:
+            return web.json_response({"code": -1121, "msg": "Invalid symbol."}, status=400)
+        limit = int(request.query.get("limit", 100))
+        return web.json_response({
+            "lastUpdateId": book.last_update_id,
+            "bids": [[str(p), str(q)] for p, q in sorted(book.bids.items(), reverse=True)[:limit]],
+            "asks": [[str(p), str(q)] for p, q in sorted(book.asks.items())[:limit]],
+        })
+
+    # Список пар записи в формате exchangeInfo, чтобы сборщик получил его из реестра пар
+    async def exchange_info(request):
+        return web.json_response({
+            "symbols": [
+                {"symbol": symbol, "status": "TRADING", "contractType": "PERPETUAL", "quoteAsset": "USDT"}
+                for symbol in sorted(snapshots)
+            ]
+        })
+
+    async def stream(request):
+        requested = {
+            name.split("@")[0].upper()
+            for name in request.query.get("streams", "").split("/") if name
+        }
+        # Каждое подключение воспроизводит запись с начала для своих пар
+        for symbol in requested & snapshots.keys():
+            restart_book(symbol)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        for event in events:
+            if event["s"] not in requested or event["s"] not in books:
+                continue
+            books[event["s"]].on_event(event)
+            await ws.send_str(json.dumps({"stream": f"{event['s'].lower()}@depth@100ms", "data": event}))
+            await asyncio.sleep(interval)
+        await ws.close()
+        return ws
+
+    app.router.add_get("/fapi/v1/exchangeInfo", exchange_info)
+    app.router.add_get("/fapi/v1/depth", depth)
+    app.router.add_get("/stream", stream)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Запись и воспроизведение diff-depth потоков")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="Сгенерировать синтетическую запись")
+    gen.add_argument("--out", required=True)
+    gen.add_argument("--symbols", type=int, default=50)
+    gen.add_argument("--events", type=int, default=20000)
+
+    rec = commands.add_parser("record", help="Записать реальный поток Binance")
+    rec.add_argument("--out", required=True)
+    rec.add_argument("--symbols", required=True, help="Пары через запятую")
+    rec.add_argument("--seconds", type=float, default=60)
+    rec.add_argument("--api-url", default="https://fapi.binance.com")
+    rec.add_argument("--stream-url", default="wss://fstream.binance.com")
+
+    srv = commands.add_parser("serve", help="Воспроизвести запись")
+    srv.add_argument("--recording", required=True)
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8082)
+    srv.add_argument("--interval", type=float, default=0.001, help="Пауза между событиями, сек")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate(args.out, args.symbols, args.events)
+    elif args.command == "record":
+        asyncio.run(record(args.out, args.symbols.upper().split(","), args.seconds, args.api_url, args.stream_url))
+    else:
+        web.run_app(create_app(args.recording, args.interval), host=args.host, port=args.port)
@@ -0,0 +1,129 @@
+# Локальная заглушка Binance Futures REST API (exchangeInfo и depth).
+# Запуск: python -m benchmarks.stub_binance --port 8081 --symbols 300 --latency 0.05
+# Сборщик переключается на заглушку переменной окружения
+# BINANCE_API_URL=http://127.0.0.1:8081
+import argparse
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+
+# Функция для генерации списка тестовых пар
+def make_symbols(count):
+    return [f"SYM{i:03d}USDT" for i in range(count)]
+
+
+# Функция для генерации стакана ордеров вокруг случайной цены
+def make_order_book(symbol, limit, update_id):
+    rnd = random.Random(f"{symbol}:{update_id}")
+    mid = rnd.uniform(0.1, 50000)
+    tick = mid * 0.0001
+    bids = [[f"{mid - tick * (i + 1):.8f}", f"{rnd.uniform(0.1, 100):.3f}"] for i in range(limit)]
+    asks = [[f"{mid + tick * (i + 1):.8f}", f"{rnd.uniform(0.1, 100):.3f}"] for i in range(limit)]
+    return {"lastUpdateId": update_id, "E": 0, "T": 0, "bids": bids, "asks": asks}
+
+
+# Функция для получения веса запроса стакана по таблице Binance
+def depth_weight(limit):
+    return 2 if limit <= 50 else 5 if limit <= 100 else 10 if limit <= 500 else 20
+
+
+# Функция для создания приложения-заглушки.
+# weight_limit > 0 включает лимит веса за окно window секунд, как у Binance:
+# заголовок X-MBX-USED-WEIGHT-1M в каждом ответе, 429 с Retry-After при превышении
+# и 418 (блокировка IP на ban секунд), если запросы продолжаются после 429.
+def create_app(symbols=300, latency=0.0, error_rate=0.0, weight_limit=0, window=60, ban=120):
+    app = web.Application()
+    app["symbols"] = make_symbols(symbols)
+    app["update_id"] = 0
+    app["stats"] = {"ok": 0, "429": 0, "418": 0, "max_used_weight": 0}
+    limits = {"window": None, "used": 0, "limited": False, "banned_until": 0.0}
+
+    # Учет веса запроса. Возвращает ответ с ошибкой или None и заголовки ответа.
+    def charge(weight):
+        now = time.time()
+        if now < limits["banned_until"]:
+            app["stats"]["418"] += 1
+            retry_after = int(limits["banned_until"] - now) + 1
+            return web.json_response({"code": -1003, "msg": "IP banned"}, status=418,
+                                     headers={"Retry-After": str(retry_after)}), {}
+        current = int(now // window)
+        if current != limits["window"]:
+            limits.update(window=current, used=0, limited=False)
+        limits["used"] += weight
+        headers = {"X-MBX-USED-WEIGHT-1M": str(limits["used"])}
+        if limits["used"] > weight_limit:
+            if limits["limited"]:
+                limits["banned_until"] = now + ban
+                app["stats"]["418"] += 1
+                return web.json_response({"code": -1003, "msg": "IP banned"}, status=418,
+                                         headers={**headers, "Retry-After": str(ban)}), {}
+            limits["limited"] = True
+            app["stats"]["429"] += 1
+            retry_after = int((current + 1) * window - now) + 1
+            return web.json_response({"code": -1003, "msg": "Too many requests"}, status=429,
+                                     headers={**headers, "Retry-After": str(retry_after)}), {}
+        app["stats"]["max_used_weight"] = max(app["stats"]["max_used_weight"], limits["used"])
+        return None, headers
+
+    async def exchange_info(request):
+        await asyncio.sleep(latency)
+        return web.json_response({
+            "symbols": [
+                {
+                    "symbol": symbol,
+                    "status": "TRADING",
+                    "contractType": "PERPETUAL",
+                    "quoteAsset": "USDT",
+                }
+                for symbol in request.app["symbols"]
+            ] + [
+                # Контракты, которые сборщик должен отфильтровать
+                {"symbol": "SYM000USDT_260327", "status": "TRADING",
+                 "contractType": "CURRENT_QUARTER", "quoteAsset": "USDT"},
+                {"symbol": "DELISTEDUSDT", "status": "SETTLING",
+                 "contractType": "PERPETUAL", "quoteAsset": "USDT"},
+            ]
+        })
+
+    async def depth(request):
+        await asyncio.sleep(latency)
+        if error_rate and random.random() < error_rate:
+            return web.json_response({"code": -1003, "msg": "stub error"}, status=503)
+        symbol = request.query.get("symbol", "")
+        limit = int(request.query.get("limit", 100))
+        headers = {}
+        if weight_limit:
+            error, headers = charge(depth_weight(limit))
+            if error is not None:
+                return error
+        request.app["update_id"] += 1
+        app["stats"]["ok"] += 1
+        return web.json_response(make_order_book(symbol, limit, request.app["update_id"]), headers=headers)
+
+    async def stats(request):
+        return web.json_response(app["stats"])
+
+    app.router.add_get("/fapi/v1/exchangeInfo", exchange_info)
+    app.router.add_get("/fapi/v1/depth", depth)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушка Binance Futures REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--symbols", type=int, default=300, help="Количество пар в exchangeInfo")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой")
+    parser.add_argument("--weight-limit", type=int, default=0, help="Лимит веса за окно (0 — без лимита)")
+    parser.add_argument("--window", type=float, default=60, help="Окно лимита веса, сек")
+    args = parser.parse_args()
+    web.run_app(
+        create_app(args.symbols, args.latency, args.error_rate, args.weight_limit, args.window),
+        host=args.host,
+        port=args.port,
+    )
@@ -0,0 +1,277 @@
+# Набор повторяемых замеров с сохранением результатов в JSON для сравнения
+# между версиями. Все внешние сервисы локальные: база заполняется генератором
+# (generate_data.py), Binance и Telegram заменены заглушками stub_binance.py
+# и fake_telegram.py, которые работают в отдельных потоках со своими циклами
+# событий (сборщик получает список пар синхронным requests).
+#
+# Замеры:
+#   cycle              — полный цикл collecting_data.analyze_and_save_data;
+#   report_*           — построение отчетов PNG, PDF, PNG + PDF и Excel;
+#   export_csv         — выгрузка CSV за 7 дней;
+#   latest_coin/market — обработчики последних данных бота;
+#   broadcast          — рассылка Broadcaster по chats чатам.
+#
+# Запуск:
+#   python -m benchmarks.suite --out baseline.json
+#   python -m benchmarks.suite --out current.json --baseline baseline.json
+# При сравнении медиана, выросшая больше чем на --threshold, считается регрессией,
+# и скрипт завершается с кодом 1.
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from benchmarks.bench_bot_db import FakeCallback, FakeMessage
+from benchmarks.bench_handler_load import percentile
+from benchmarks.generate_data import fill_db
+
+HOST = "127.0.0.1"
+# Повторов для быстрых замеров (обработчики последних данных)
+FAST_REPEAT = 1000
+
+
+# Функция для получения свободного TCP-порта
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+# Функция для запуска приложения aiohttp в отдельном потоке со своим циклом событий.
+# Возвращает адрес сервера.
+def start_server(app):
+    port = free_port()
+    ready = threading.Event()
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, HOST, port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    return f"http://{HOST}:{port}"
+
+
+# Функция для сводки по выборке времен в миллисекундах
+def summarize(times):
+    return {
+        "unit": "ms",
+        "runs": len(times),
+        "median": statistics.median(times),
+        "p95": percentile(times, 95),
+        "min": min(times),
+        "max": max(times),
+    }
+
+
+# Функция для замера синхронного вызова
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return summarize(times)
+
+
+# Функция для замера корутины
+async def measure_async(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        times.append((time.perf_counter() - started) * 1000)
+    return summarize(times)
+
+
+# Функция для получения текущего коммита (пустая строка вне git)
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+# Функция для замеров сборщика: полный цикл на заглушках
+async def bench_cycle(path, repeat):
+    import collecting_data
+    from rollups import CYCLE_MS
+
+    conn = collecting_data.connect_to_db()
+    # Циклы пишутся после последнего сгенерированного, по одному слоту на повтор
+    cycle_time = conn.execute("SELECT MAX(time) FROM market_summary").fetchone()[0]
+
+    async def cycle():
+        nonlocal cycle_time
+        cycle_time += CYCLE_MS
+        await collecting_data.analyze_and_save_data(conn, cycle_time)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Первый цикл загружает список пар и прогревает соединения
+            await cycle()
+            return {"cycle": await measure_async(cycle, repeat)}
+    finally:
+        await collecting_data.broadcaster.close()
+        conn.close()
+
+
+# Функция для замеров отчетов и выгрузки в текущем процессе
+def bench_reports(symbol, repeat):
+    import reports
+    from time_utils import now_ms
+
+    def export_csv():
+        os.remove(reports.create_export("csv", symbol, now_ms() - 7 * 24 * 60 * 60 * 1000))
+
+    benches = {
+        "report_png": lambda: reports.create_chart_reports(symbol, ("png",)),
+        "report_pdf": lambda: reports.create_chart_reports(symbol, ("pdf",)),
+        "report_chart": lambda: reports.create_chart_reports(symbol),
+        "report_excel": lambda: reports.create_excel_report(symbol),
+        "export_csv": export_csv,
+    }
+    # Прогрев: импорт шрифтов matplotlib не входит в замер
+    reports.create_chart_reports(symbol, ("png",))
+    return {name: measure(func, repeat) for name, func in benches.items()}
+
+
+# Функция для замеров обработчиков последних данных бота
+async def bench_latest(path, symbol):
+    import disbalancebot
+
+    with sqlite3.connect(path) as conn:
+        disbalancebot.latest_snapshot.load(conn)
+    return {
+        "latest_coin": await measure_async(
+            lambda: disbalancebot.coin_data_handler(FakeMessage(1, symbol)), FAST_REPEAT),
+        "latest_market": await measure_async(
+            lambda: disbalancebot.market_summary_handler(FakeCallback(1)), FAST_REPEAT),
+    }
+
+
+# Функция для замера рассылки на заглушке Telegram
+async def bench_broadcast(api_url, chats, repeat):
+    from broadcaster import Broadcaster
+
+    broadcaster = Broadcaster(api_url=api_url)
+    try:
+        return {"broadcast": await measure_async(
+            lambda: broadcaster.broadcast(list(range(chats)), "Тестовое уведомление"), repeat)}
+    finally:
+        await broadcaster.close()
+
+
+# Функция для сравнения с сохраненными результатами.
+# Возвращает список замеров, медиана которых выросла больше чем на threshold.
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            print(f"{name:<14} {current['median']:10.3f} мс  (нет в базовых результатах)")
+            continue
+        ratio = current["median"] / previous["median"]
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  РЕГРЕССИЯ"
+            regressions.append(name)
+        print(f"{name:<14} {previous['median']:10.3f} -> {current['median']:10.3f} мс  ×{ratio:5.2f}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Набор замеров с результатами в JSON")
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов медленных замеров")
+    parser.add_argument("--chats", type=int, default=100, help="Чатов в замере рассылки")
+    parser.add_argument("--cycle-chats", type=int, default=10, help="Получателей уведомления в цикле сбора")
+    parser.add_argument("--latency", type=float, default=0.02, help="Задержка ответа заглушек, сек")
+    parser.add_argument("--only", nargs="*", choices=["cycle", "reports", "latest", "broadcast"])
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="JSON предыдущего запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимый рост медианы")
+    args = parser.parse_args()
+    groups = args.only or ["cycle", "reports", "latest", "broadcast"]
+
+    from benchmarks.fake_telegram import create_app as create_telegram
+    from benchmarks.stub_binance import create_app as create_binance
+
+    # Адреса заглушек и база задаются до импорта модулей проекта (configs читает окружение)
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "bench.db")
+    os.environ["DATABASE_NAME"] = path
+    os.environ["ARCHIVE_DIR"] = os.path.join(workdir, "archive")
+    os.environ["BINANCE_API_URL"] = start_server(create_binance(args.symbols, args.latency))
+    # Заглушка не ограничивает вес, а повторы цикла идут чаще раза в 15 минут:
+    # бюджет WeightGovernor не должен добавлять к замеру ожидание следующей минуты
+    os.environ["BINANCE_WEIGHT_LIMIT"] = str(10 ** 9)
+    # Лимит заглушки Telegram выше BROADCAST_RATE: замеряется рассылка, а не ответы 429
+    telegram_url = start_server(create_telegram(args.latency, rate=1000))
+    os.environ["TELEGRAM_API_URL"] = telegram_url
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ.setdefault("PIN_CODE_HASH", "")
+
+    started = time.perf_counter()
+    symbols = fill_db(path, args.symbols, args.days)
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO users (chat_id) VALUES (?)", [(i,) for i in range(args.cycle_chats)])
+    print(f"База: {args.symbols} пар × {args.days} дней за {time.perf_counter() - started:.1f} с")
+
+    results = {}
+    if "cycle" in groups:
+        results.update(asyncio.run(bench_cycle(path, args.repeat)))
+    if "reports" in groups:
+        results.update(bench_reports(symbols[0], args.repeat))
+    if "latest" in groups:
+        results.update(asyncio.run(bench_latest(path, symbols[0])))
+    if "broadcast" in groups:
+        results.update(asyncio.run(bench_broadcast(telegram_url, args.chats, args.repeat)))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {name: value for name, value in vars(args).items() if name not in ("out", "baseline")},
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+    else:
+        for name, result in results.items():
+            print(f"{name:<14} медиана {result['median']:10.3f} мс  p95 {result['p95']:10.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
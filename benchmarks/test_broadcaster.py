@@ -0,0 +1,31 @@
+# Проверка рассылки на заглушке Telegram (fake_telegram.py): ошибка API
+# на одном чате не прерывает остальные отправки, а заблокировавшие
+# бота чаты возвращаются для удаления.
+# Запуск: python -m pytest benchmarks/test_broadcaster.py
+import asyncio
+
+from aiohttp import web
+
+from benchmarks.fake_telegram import create_app
+from broadcaster import Broadcaster
+
+
+async def run_broadcast(chat_ids, blocked, failing):
+    runner = web.AppRunner(create_app(latency=0.01, rate=1000, blocked=blocked, failing=failing))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    broadcaster = Broadcaster(api_url=f"http://127.0.0.1:{port}", rate=1000, retries=1)
+    try:
+        return await broadcaster.broadcast(chat_ids, "test"), runner.app["stats"]
+    finally:
+        await broadcaster.close()
+        await runner.cleanup()
+
+
+def test_server_error_does_not_abort_broadcast():
+    result, stats = asyncio.run(run_broadcast(list(range(10)), blocked=[3, 7], failing=[1, 5]))
+    assert result.sent == 6 == stats["sent"]
+    assert result.failed == 2
+    assert sorted(result.blocked) == [3, 7]
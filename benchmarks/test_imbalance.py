@@ -0,0 +1,45 @@
+# Проверка расчета диапазонов дисбаланса (imbalance.analyze_order_books):
+# диапазон, до границы которого загруженный стакан не доходит, остается пустым
+# и записывается как NULL, а не повторяет дисбаланс по верхним уровням.
+# Запуск: python -m pytest benchmarks/test_imbalance.py
+import math
+
+from imbalance import BANDS, analyze_order_books, pressure_rows
+
+
+# Стакан из levels уровней с шагом step (доля от середины 100) и объемами bid_qty/ask_qty
+def make_book(levels, step, bid_qty, ask_qty):
+    return {
+        "bids": [[100 * (1 - step * (i + 1)), bid_qty] for i in range(levels)],
+        "asks": [[100 * (1 + step * (i + 1)), ask_qty] for i in range(levels)],
+    }
+
+
+def test_bands_beyond_loaded_depth_are_empty():
+    books = {
+        # 100 уровней по 0,01%: стакан доходит до 1%, но не до 5%
+        "SHALLOWUSDT": make_book(100, 0.0001, 3.0, 1.0),
+        # 500 уровней по 0,01%: доходит до 5%
+        "DEEPUSDT": make_book(500, 0.0001, 3.0, 1.0),
+    }
+    symbols, columns = analyze_order_books(books)
+    shallow, deep = symbols.index("SHALLOWUSDT"), symbols.index("DEEPUSDT")
+    assert columns["dizbalance_1"][shallow] == 50.0
+    assert math.isnan(columns["dizbalance_5"][shallow])
+    for name in BANDS:
+        assert columns[name][deep] == 50.0
+
+    pair_rows, _ = pressure_rows(symbols, columns)
+    band_index = 1 + list(columns).index("dizbalance_5")
+    assert pair_rows[shallow][band_index] is None
+    assert pair_rows[deep][band_index] == 50.0
+
+
+def test_one_short_side_empties_the_band():
+    book = make_book(500, 0.0001, 2.0, 2.0)
+    # Продажи загружены только до 0,6% от середины
+    book["asks"] = book["asks"][:60]
+    symbols, columns = analyze_order_books({"BTCUSDT": book})
+    assert columns["dizbalance_0_5"][0] == 0.0
+    assert math.isnan(columns["dizbalance_1"][0])
+    assert math.isnan(columns["dizbalance_5"][0])
@@ -0,0 +1,43 @@
+# Проверка сервера метрик (metrics.py): тип содержимого экспозиции Prometheus
+# и управление профилировщиком только POST-запросами.
+# Запуск: python -m pytest benchmarks/test_metrics.py
+import asyncio
+import socket
+
+import aiohttp
+
+from metrics import METRICS_CONTENT_TYPE, start_metrics_server
+
+
+# Функция для поиска свободного локального порта
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def query_server():
+    port = free_port()
+    runner = await start_metrics_server(port)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{url}/metrics") as response:
+                content_type = response.headers["Content-Type"]
+            async with session.get(f"{url}/profile/start") as response:
+                get_status = response.status
+            async with session.post(f"{url}/profile/start?interval=0.01") as response:
+                start_status = response.status
+            async with session.post(f"{url}/profile/stop") as response:
+                stop_status = response.status
+        return content_type, get_status, start_status, stop_status
+    finally:
+        await runner.cleanup()
+
+
+def test_metrics_content_type_and_profiler_methods():
+    content_type, get_status, start_status, stop_status = asyncio.run(query_server())
+    assert content_type == METRICS_CONTENT_TYPE == "text/plain; version=0.0.4; charset=utf-8"
+    assert get_status == 405
+    assert start_status == 200
+    assert stop_status == 200
@@ -0,0 +1,79 @@
+# Проверка синхронизации локального стакана (stream_collector.LocalOrderBook)
+# по процедуре Binance «снимок + updateId»: буферизация до снимка, отбрасывание
+# устаревших событий, обнаружение разрыва по pu и повторная инициализация.
+# Запуск: python -m pytest benchmarks/test_order_book.py
+from stream_collector import LocalOrderBook
+
+
+def snapshot(last_update_id, bids=(("100", "1"),), asks=(("101", "1"),)):
+    return {"lastUpdateId": last_update_id, "bids": [list(level) for level in bids],
+            "asks": [list(level) for level in asks]}
+
+
+def event(first_id, last_id, previous_id, bids=(), asks=()):
+    return {"e": "depthUpdate", "s": "BTCUSDT", "U": first_id, "u": last_id, "pu": previous_id,
+            "b": [list(level) for level in bids], "a": [list(level) for level in asks]}
+
+
+def test_events_are_buffered_until_snapshot():
+    book = LocalOrderBook("BTCUSDT")
+    # Первое событие запрашивает снимок, следующие только копятся в буфере
+    assert book.on_event(event(5, 7, 4, bids=[("99", "2")])) is True
+    assert book.on_event(event(8, 12, 7, bids=[("99", "3")])) is False
+    assert not book.synced
+    assert book.apply_snapshot(snapshot(10))
+    # Событие 5..7 старше снимка и отброшено, 8..12 перекрывает снимок и применено
+    assert book.last_update_id == 12
+    assert book.bids == {100.0: 1.0, 99.0: 3.0}
+    assert book.buffer == []
+
+
+def test_stale_events_after_sync_are_ignored():
+    book = LocalOrderBook("BTCUSDT")
+    book.on_event(event(1, 2, 0))
+    assert book.apply_snapshot(snapshot(10))
+    assert book.on_event(event(9, 15, 8, asks=[("101", "0"), ("102", "4")])) is False
+    assert book.on_event(event(3, 8, 2, asks=[("101", "9")])) is False
+    assert book.last_update_id == 15
+    assert book.asks == {102.0: 4.0}
+
+
+def test_gap_resets_book_and_requests_snapshot():
+    book = LocalOrderBook("BTCUSDT")
+    book.on_event(event(1, 2, 0))
+    assert book.apply_snapshot(snapshot(10))
+    assert book.on_event(event(11, 15, 10)) is False
+    # pu не совпадает с последним u: событие 16..20 потеряно
+    assert book.on_event(event(21, 25, 20, bids=[("98", "5")])) is True
+    assert not book.synced
+    assert book.bids == {} and book.asks == {}
+    assert [item["u"] for item in book.buffer] == [25]
+    # Пока снимок не получен, новый запрос не отправляется
+    assert book.on_event(event(26, 30, 25)) is False
+
+    # Повторная инициализация: новый снимок и накопленные события после него
+    assert book.apply_snapshot(snapshot(27, bids=[("97", "1")]))
+    assert book.synced
+    assert book.last_update_id == 30
+    assert book.bids == {97.0: 1.0}
+    assert book.on_event(event(31, 33, 30)) is False
+    assert book.last_update_id == 33
+
+
+def test_snapshot_not_matching_buffer_is_rejected():
+    book = LocalOrderBook("BTCUSDT")
+    book.on_event(event(20, 25, 19))
+    # Снимок 10 старше первого буферизованного события: события 11..19 потеряны
+    assert book.apply_snapshot(snapshot(10)) is False
+    assert not book.synced
+    # Следующее событие снова запрашивает снимок
+    assert book.on_event(event(26, 28, 25)) is True
+    assert book.apply_snapshot(snapshot(27))
+    assert book.last_update_id == 28
+
+
+def test_imbalance_uses_best_levels():
+    book = LocalOrderBook("BTCUSDT")
+    book.on_event(event(1, 1, 0))
+    book.apply_snapshot(snapshot(5, bids=[("100", "3"), ("99", "1")], asks=[("101", "1"), ("102", "5")]))
+    assert book.imbalance(depth=1) == (3.0, 1.0, 50.0)
@@ -0,0 +1,24 @@
+# Проверка пула отчетов бота: после аварийного завершения процесса пула
+# (BrokenProcessPool) пул пересоздается, и следующие отчеты строятся.
+# Запуск: python -m pytest benchmarks/test_report_pool.py
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import disbalancebot
+
+
+def test_broken_pool_is_replaced():
+    async def scenario():
+        broken = disbalancebot.report_pool
+        with pytest.raises(BrokenProcessPool):
+            await disbalancebot.run_in_report_pool("crash", os._exit, 1)
+        assert disbalancebot.report_pool is not broken
+        assert await disbalancebot.run_in_report_pool("after", abs, -3) == 3
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        disbalancebot.report_pool.shutdown()
@@ -0,0 +1,45 @@
+# Проверка графиков на заготовке (reports.ChartTemplate): прореживание
+# длинного ряда до CHART_MAX_BARS столбцов с сохранением всплесков
+# и оформление подписей дат при повторных построениях.
+# Запуск: python -m pytest benchmarks/test_reports.py
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import reports
+from rollups import CYCLE_MS, HOUR_MS
+from time_utils import now_ms
+
+
+def test_decimate_keeps_spikes():
+    times = np.arange(10.0)
+    values = np.array([1.0, -9.0, 2.0, 3.0, 0.5, 4.0, -1.0, 8.0, 0.0, -7.0])
+    picked_times, picked = reports.decimate(times, values, 4)
+    # Группы по 3 точки и неполный хвост: из каждой остается наибольшее по модулю
+    assert picked.tolist() == [-9.0, 4.0, 8.0, -7.0]
+    assert picked_times.tolist() == [1.0, 5.0, 7.0, 9.0]
+    assert reports.decimate(times, values, 10)[1] is values
+
+
+def test_long_series_is_decimated():
+    count = 3 * reports.CHART_MAX_BARS + 7
+    end = now_ms()
+    values = np.sin(np.arange(count)) * 10
+    values[1234] = -95.0
+    data = [(end - (count - i) * CYCLE_MS, value) for i, value in enumerate(values)]
+    fig = reports.generate_chart(data, "BTCUSDT", "#4ECDC4", CYCLE_MS)
+    bars = reports.get_chart_template().bars.get_paths()
+    assert len(bars) <= reports.CHART_MAX_BARS
+    heights = [path.vertices[1, 1] for path in bars]
+    assert min(heights) == -95.0
+    assert fig.axes[0].get_ylim()[0] < -95.0
+
+
+def test_tick_labels_stay_rotated():
+    end = now_ms()
+    for count, resolution in ((721, HOUR_MS), (40, 24 * HOUR_MS)):
+        data = [(end - (count - i) * resolution, float(i % 7)) for i in range(count)]
+        fig = reports.generate_chart(data, "рынок", "#FF6B6B", resolution)
+        FigureCanvasAgg(fig).draw()
+        labels = [label for label in fig.axes[0].get_xticklabels() if label.get_text()]
+        assert labels
+        assert {(label.get_rotation(), label.get_horizontalalignment()) for label in labels} == {(45.0, "right")}
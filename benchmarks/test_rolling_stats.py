@@ -0,0 +1,86 @@
+# Проверка скользящей статистики (rolling_stats.py): после записи циклов,
+# при которых замеры выходят из окон 24 часа и 7 дней, и перезапуска сборщика
+# посередине статистика совпадает с полным пересчетом по market_pressure
+# и market_summary. Срок хранения короче окна 7 дней отклоняется при запуске.
+# Запуск: python -m pytest benchmarks/test_rolling_stats.py
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import collecting_data
+from benchmarks.generate_data import fill_db, make_cycle
+from latest_snapshot import MARKET_SYMBOL
+from rolling_stats import WINDOWS, RollingStats
+from rollups import CYCLE_MS
+
+TOLERANCE = 1e-6
+
+
+# Полный пересчет среднего и выборочной дисперсии окна, заканчивающегося end
+def recompute(conn, window_ms, end):
+    rows = conn.execute(
+        "SELECT symbol, dizbalance FROM market_pressure WHERE time > ? AND time <= ?", (end - window_ms, end)
+    ).fetchall()
+    rows += [
+        (MARKET_SYMBOL, value) for (value,) in conn.execute(
+            "SELECT total_dizbalance FROM market_summary WHERE time > ? AND time <= ?", (end - window_ms, end)
+        )
+    ]
+    by_symbol = {}
+    for symbol, value in rows:
+        by_symbol.setdefault(symbol, []).append(value)
+    result = {}
+    for symbol, values in by_symbol.items():
+        mean = sum(values) / len(values)
+        result[symbol] = (len(values), mean, sum((value - mean) ** 2 for value in values))
+    return result
+
+
+def assert_matches(stats, expected):
+    # Пары, все замеры которых вышли из окна, остаются с нулевой статистикой
+    assert {symbol for symbol, values in stats.items() if values[0]} == expected.keys()
+    for symbol, (samples, mean, m2) in expected.items():
+        actual = stats[symbol]
+        assert actual[0] == samples
+        assert actual[1] == pytest.approx(mean, abs=TOLERANCE)
+        assert actual[2] == pytest.approx(m2, rel=TOLERANCE, abs=TOLERANCE)
+
+
+def test_incremental_stats_match_full_recompute(tmp_path, monkeypatch):
+    path = str(tmp_path / "rolling.db")
+    names = fill_db(path, 10, 8)
+    # Сборщик стартует с пустой статистикой в памяти и читает ее из базы
+    rolling_stats = RollingStats(5)
+    monkeypatch.setattr(collecting_data, "rolling_stats", rolling_stats)
+    conn = sqlite3.connect(path)
+    rnd = random.Random(3)
+    cycle_time = conn.execute("SELECT MAX(time) FROM market_summary").fetchone()[0]
+    for cycle in range(200):
+        if cycle == 100:
+            # Перезапуск сборщика: новая статистика в памяти загружается из таблиц
+            rolling_stats = RollingStats(5)
+            monkeypatch.setattr(collecting_data, "rolling_stats", rolling_stats)
+        cycle_time += CYCLE_MS
+        # Часть пар пропускает циклы, как при ошибках запросов стаканов
+        pair_rows, summary = make_cycle(rnd, [name for name in names if rnd.random() > 0.1])
+        assert collecting_data.save_cycle_data(conn, cycle_time, pair_rows, summary)
+
+    stored = RollingStats(5)
+    stored.load(conn)
+    for window_ms in WINDOWS.values():
+        expected = recompute(conn, window_ms, cycle_time)
+        assert_matches(rolling_stats.stats[window_ms], expected)
+        assert_matches(stored.stats[window_ms], expected)
+    conn.close()
+
+
+def test_short_retention_is_rejected():
+    env = dict(os.environ, RETENTION_DAYS="7")
+    result = subprocess.run([sys.executable, "-c", "import configs"], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.returncode != 0
+    assert "RETENTION_DAYS" in result.stderr
@@ -0,0 +1,34 @@
+# Проверка схемы: новая база создается в режиме auto_vacuum=INCREMENTAL,
+# и retention.incremental_vacuum возвращает место после удаления строк.
+# Запуск: python -m pytest benchmarks/test_schema.py
+import sqlite3
+
+import collecting_data
+from db_schema import enable_wal, migrate
+from retention import AUTO_VACUUM_INCREMENTAL, incremental_vacuum
+
+
+def test_new_database_is_incremental(tmp_path, monkeypatch):
+    monkeypatch.setattr(collecting_data, "DB_NAME", str(tmp_path / "collector.db"))
+    conn = collecting_data.connect_to_db()
+    migrate(conn)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+    conn.close()
+
+
+def test_incremental_vacuum_frees_pages(tmp_path):
+    conn = sqlite3.connect(tmp_path / "vacuum.db")
+    enable_wal(conn)
+    migrate(conn)
+    with conn:
+        conn.executemany(
+            "INSERT INTO market_summary (time, total_bid_volume, total_ask_volume, total_dizbalance) "
+            "VALUES (?, 1.0, 1.0, 0.0)",
+            [(time,) for time in range(20_000)],
+        )
+    with conn:
+        conn.execute("DELETE FROM market_summary")
+    assert incremental_vacuum(conn) > 0
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,145 @@
+# Рассылка уведомлений всем пользователям бота.
+# Один экземпляр Bot и его HTTP-сессия живут между циклами сбора.
+# Сообщения отправляются параллельно, но не чаще BROADCAST_RATE в секунду
+# на всего бота. Ответ 429 (retry_after) приостанавливает всю рассылку,
+# а чаты, заблокировавшие бота, возвращаются вызывающему коду для удаления.
+import asyncio
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+
+from configs import (
+    BOT_TOKEN,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_RATE,
+    BROADCAST_RETRIES,
+    TELEGRAM_API_URL,
+)
+
+# Ответы 400, после которых чат удаляется из рассылки
+GONE_CHAT_ERRORS = ("chat not found", "user is deactivated")
+# Пауза перед повтором после сетевой ошибки, сек (растет с номером попытки)
+NETWORK_RETRY_DELAY = 1.0
+
+
+# Ограничитель частоты: выдает разрешения на отправку с интервалом 1 / rate
+# и умеет приостанавливать все отправки, в том числе уже ждущие своей очереди
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        while True:
+            async with self.lock:
+                now = time.monotonic()
+                slot = max(now, self.next_slot, self.paused_until)
+                self.next_slot = slot + self.interval
+            await asyncio.sleep(slot - now)
+            if time.monotonic() >= self.paused_until:
+                return
+
+    # Пауза для всех отправок после ответа 429
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+# Итог одной рассылки
+class BroadcastResult:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.blocked = []
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return (f"отправлено {self.sent}, ошибок {self.failed}, повторов {self.retries}, "
+                f"заблокировали бота {len(self.blocked)}, за {self.elapsed:.2f} с")
+
+
+class Broadcaster:
+    def __init__(self, token=BOT_TOKEN, api_url=TELEGRAM_API_URL, rate=BROADCAST_RATE,
+                 concurrency=BROADCAST_CONCURRENCY, retries=BROADCAST_RETRIES):
+        self.token = token
+        self.api_url = api_url
+        self.rate = rate
+        self.concurrency = concurrency
+        self.retries = retries
+        self.bot = None
+        self.limiter = None
+
+    # Bot и ограничитель создаются в цикле событий, в котором идет рассылка
+    def _ensure_bot(self):
+        if self.bot is None:
+            session = AiohttpSession(api=TelegramAPIServer.from_base(self.api_url))
+            self.bot = Bot(token=self.token, session=session)
+            self.limiter = RateLimiter(self.rate)
+        return self.bot
+
+    # Отправка одного сообщения с повторами после 429 и сетевых ошибок
+    async def _send(self, chat_id, text, semaphore, result):
+        async with semaphore:
+            for attempt in range(self.retries + 1):
+                await self.limiter.acquire()
+                try:
+                    await self.bot.send_message(chat_id=chat_id, text=text)
+                    result.sent += 1
+                    return
+                except TelegramRetryAfter as e:
+                    self.limiter.pause(e.retry_after)
+                    error = e
+                except TelegramNetworkError as e:
+                    error = e
+                    if attempt < self.retries:
+                        await asyncio.sleep(NETWORK_RETRY_DELAY * (attempt + 1))
+                except TelegramForbiddenError:
+                    result.blocked.append(chat_id)
+                    return
+                except TelegramBadRequest as e:
+                    if any(message in e.message.lower() for message in GONE_CHAT_ERRORS):
+                        result.blocked.append(chat_id)
+                    else:
+                        result.failed += 1
+                        print(f"Ошибка при отправке уведомления пользователю с CHAT_ID {chat_id}: {e}")
+                    return
+                except TelegramAPIError as e:
+                    # Остальные ответы API (5xx, 404, 401) — ошибка одного чата,
+                    # остальные отправки рассылки продолжаются
+                    result.failed += 1
+                    print(f"Ошибка при отправке уведомления пользователю с CHAT_ID {chat_id}: {e}")
+                    return
+                if attempt < self.retries:
+                    result.retries += 1
+            result.failed += 1
+            print(f"Уведомление пользователю с CHAT_ID {chat_id} не отправлено после повторов: {error}")
+
+    # Функция для рассылки сообщения по списку чатов
+    async def broadcast(self, chat_ids, text):
+        return await self.send_many([(chat_id, text) for chat_id in chat_ids])
+
+    # Функция для отправки своего сообщения каждому чату: messages — пары (chat_id, text)
+    async def send_many(self, messages):
+        self._ensure_bot()
+        result = BroadcastResult()
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._send(chat_id, text, semaphore, result) for chat_id, text in messages))
+        result.elapsed = time.monotonic() - started
+        return result
+
+    async def close(self):
+        if self.bot is not None:
+            await self.bot.session.close()
+            self.bot = None
@@ -1,196 +1,314 @@
-import requests
 import sqlite3
-from datetime import datetime, timedelta
 import time
-import schedule
-import pytz
+import sys
 import asyncio
-from aiogram import Bot
-from configs import BOT_TOKEN, DATABASE_NAME  # Импортируем настройки из configs.py
+import json
+import aiohttp
+from alerts import AlertRegistry
+from broadcaster import Broadcaster
+from configs import (  # Импортируем настройки из configs.py
+    BAND_DEPTH_EVERY,
+    BAND_DEPTH_LIMIT,
+    DATABASE_NAME,
+    BINANCE_API_URL,
+    DEPTH_CONCURRENCY,
+    DEPTH_LIMIT,
+    DEPTH_RETRIES,
+    DEPTH_STAGGER,
+    DEPTH_TIMEOUT,
+    RETENTION_INTERVAL,
+    COLLECTOR_METRICS_PORT,
+    METRICS_HOST,
+    SUMMARY_RECIPIENTS,
+    TOP_SIZE,
+)
+from db_schema import enable_wal, migrate
+from latest_snapshot import MARKET_SYMBOL, fetch_latest, update_latest
+from metrics import (
+    BINANCE_ERRORS,
+    BINANCE_REQUEST_WEIGHT,
+    BINANCE_REQUESTS,
+    Counter,
+    Histogram,
+    record_binance_response,
+    start_metrics_server,
+)
+from retention import apply_retention
+from rolling_stats import RollingStats
+from rollups import CYCLE_MS, DAY_MS, update_rollups
+from scheduler import run_aligned
+from time_utils import format_time, now_ms
+from symbol_registry import SymbolRegistry
+from user_registry import UserRegistry
+from weight_governor import WeightGovernor
+from imbalance import PRESSURE_COLUMNS, analyze_order_books, parse_depth_response, pressure_rows
 
 # Настройки SQLite
 DB_NAME = DATABASE_NAME
-BOT_TOKEN = BOT_TOKEN
 
-# Функция для подключения к SQLite
+# Реестр пар живет между циклами, exchangeInfo запрашивается раз в SYMBOLS_TTL
+symbol_registry = SymbolRegistry()
+
+# Рассылка живет все время работы сборщика: HTTP-сессия и Bot
+# не пересоздаются каждые 15 минут
+broadcaster = Broadcaster()
+# Получатели рассылки в памяти (общий с ботом реестр, см. user_registry.py)
+user_registry = UserRegistry()
+# Подписки на пороговые уведомления, сгруппированные по паре (см. alerts.py)
+alert_registry = AlertRegistry()
+# Скользящая статистика за 24 часа и 7 дней и рейтинги /top (см. rolling_stats.py)
+rolling_stats = RollingStats(TOP_SIZE)
+# Бюджет веса запросов к Binance, общий для всех запросов стаканов процесса
+weight_governor = WeightGovernor()
+# Время последней проверки срока хранения (time.monotonic)
+last_retention = None
+
+DEPTH_ENDPOINT = "/fapi/v1/depth"
+
+# Метрики сборщика (см. metrics.py)
+CYCLE_SECONDS = Histogram("collector_cycle_seconds", "Длительность цикла сбора")
+PHASE_SECONDS = Histogram("collector_phase_seconds", "Длительность этапов цикла сбора", ("phase",))
+DEPTH_REQUEST_SECONDS = Histogram(
+    "binance_depth_request_seconds", "Время запроса стакана по паре", ("symbol",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+NOTIFICATIONS = Counter("collector_notifications_total", "Уведомления рассылки по виду и результату",
+                        ("kind", "result"))
+ALERTS_TRIGGERED = Counter("collector_alerts_triggered_total", "Сработавшие пороговые уведомления")
+
+# Функция для подключения к SQLite.
+# WAL позволяет боту читать базу, пока сборщик пишет очередной цикл.
 def connect_to_db():
     try:
         conn = sqlite3.connect(DB_NAME)
+        enable_wal(conn)
+        conn.execute("PRAGMA synchronous=NORMAL")
         return conn
     except Exception as e:
         print(f"Ошибка подключения к базе данных: {e}")
         return None
 
-# Функция для создания таблиц (если они не существуют)
+# Функция для создания таблиц и применения миграций схемы
 def create_tables_if_not_exist(conn):
     try:
-        cursor = conn.cursor()
-        # Таблица для данных по каждой паре
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS market_pressure (
-                time TIMESTAMP NOT NULL,
-                symbol TEXT NOT NULL,
-                bid_volume REAL,
-                ask_volume REAL,
-                dizbalance REAL,
-                PRIMARY KEY (time, symbol)
-            );
-        """)
-        # Таблица для агрегированных данных по всему рынку
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS market_summary (
-                time TIMESTAMP NOT NULL PRIMARY KEY,
-                total_bid_volume REAL,
-                total_ask_volume REAL,
-                total_dizbalance REAL
-            );
-        """)
-        # Таблица для пользователей
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                chat_id INTEGER PRIMARY KEY
-            );
-        """)
-        conn.commit()
-        cursor.close()
+        applied = migrate(conn)
+        if applied:
+            print(f"Применены миграции схемы: {applied}")
         print("Таблицы созданы или уже существуют.")
     except Exception as e:
         print(f"Ошибка при создании таблиц: {e}")
 
-# Функция для записи данных по каждой паре
-def save_pair_data(conn, symbol, bid_volume, ask_volume, dizbalance):
+# Функция для записи всего цикла одной транзакцией.
+# pair_rows — список кортежей (symbol, *PRESSURE_COLUMNS),
+# summary — кортеж (total_bid_volume, total_ask_volume, total_dizbalance).
+# Все строки цикла получают одну отметку времени cycle_time (миллисекунды UTC),
+# часовые и дневные агрегаты, скользящая статистика с рейтингами
+# и последние значения обновляются в той же транзакции.
+def save_cycle_data(conn, cycle_time, pair_rows, summary):
     try:
-        cursor = conn.cursor()
-        msk_timezone = pytz.timezone("Europe/Moscow")
-        current_time = datetime.now(msk_timezone).isoformat()
-        cursor.execute("""
-            INSERT INTO market_pressure (time, symbol, bid_volume, ask_volume, dizbalance)
-            VALUES (?, ?, ?, ?, ?)
-        """, (current_time, symbol, bid_volume, ask_volume, dizbalance))
-        conn.commit()
-        cursor.close()
-        print(f"Данные для {symbol} успешно сохранены.")
+        with conn:
+            conn.executemany(f"""
+                INSERT INTO market_pressure (time, symbol, {", ".join(PRESSURE_COLUMNS)})
+                VALUES (?, ?, {", ".join("?" * len(PRESSURE_COLUMNS))})
+            """, [(cycle_time, *row) for row in pair_rows])
+            conn.execute("""
+                INSERT INTO market_summary (time, total_bid_volume, total_ask_volume, total_dizbalance)
+                VALUES (?, ?, ?, ?)
+            """, (cycle_time, *summary))
+            update_rollups(conn, cycle_time, pair_rows, summary)
+            rolling_stats.update(conn, cycle_time, pair_rows, summary)
+            update_latest(conn, cycle_time, pair_rows, summary)
+        print(f"Данные цикла {format_time(cycle_time)} сохранены: {len(pair_rows)} пар и агрегат по рынку.")
+        return True
     except Exception as e:
-        print(f"Ошибка при записи данных для {symbol}: {e}")
+        # Статистика в памяти могла измениться до отката транзакции
+        rolling_stats.reset()
+        print(f"Ошибка при записи данных цикла {format_time(cycle_time)}: {e}")
+        return False
 
-# Функция для записи агрегированных данных
-def save_market_summary(conn, total_bid_volume, total_ask_volume, total_dizbalance):
-    try:
-        cursor = conn.cursor()
-        msk_timezone = pytz.timezone("Europe/Moscow")
-        current_time = datetime.now(msk_timezone).isoformat()
-        cursor.execute("""
-            INSERT INTO market_summary (time, total_bid_volume, total_ask_volume, total_dizbalance)
-            VALUES (?, ?, ?, ?)
-        """, (current_time, total_bid_volume, total_ask_volume, total_dizbalance))
-        conn.commit()
-        cursor.close()
-        print("Агрегированные данные по рынку успешно сохранены.")
-    except Exception as e:
-        print(f"Ошибка при записи агрегированных данных: {e}")
-
-# Функция для получения списка фьючерсных пар
-def get_futures_symbols():
-    url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
-    response = requests.get(url)
-    if response.status_code == 200:
-        symbols = response.json()['symbols']
-        usdt_pairs = [symbol['symbol'] for symbol in symbols if symbol['quoteAsset'] == 'USDT']
-        return usdt_pairs
-    else:
-        print("Ошибка получения списка фьючерсных пар.")
-        return None
+# Функция для получения веса запроса стакана по таблице Binance
+def depth_weight(limit):
+    if limit <= 50:
+        return 2
+    if limit <= 100:
+        return 5
+    if limit <= 500:
+        return 10
+    return 20
 
-# Функция для получения стакана ордеров
-def get_order_book(symbol, limit=100):
-    url = f"https://fapi.binance.com/fapi/v1/depth?symbol={symbol}&limit={limit}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Ошибка получения стакана ордеров для {symbol}.")
-        return None
+# Функция для получения стакана ордеров по одной паре через общую сессию.
+# loads разбирает тело ответа: json.loads или imbalance.parse_depth_response.
+# Вес запроса резервируется в weight_governor, после 429/418 запрос
+# повторяется (не больше DEPTH_RETRIES раз), когда закончится пауза.
+async def fetch_order_book(session, semaphore, symbol, limit=100, loads=json.loads):
+    url = f"{BINANCE_API_URL}{DEPTH_ENDPOINT}"
+    async with semaphore:
+        for attempt in range(DEPTH_RETRIES + 1):
+            await weight_governor.acquire(depth_weight(limit))
+            BINANCE_REQUESTS.inc(endpoint=DEPTH_ENDPOINT)
+            BINANCE_REQUEST_WEIGHT.inc(depth_weight(limit), endpoint=DEPTH_ENDPOINT)
+            try:
+                with DEPTH_REQUEST_SECONDS.time(symbol=symbol):
+                    async with session.get(url, params={"symbol": symbol, "limit": limit}) as response:
+                        record_binance_response(DEPTH_ENDPOINT, response.status, response.headers)
+                        retry = weight_governor.update(response.status, response.headers)
+                        if response.status == 200:
+                            return loads(await response.text())
+                print(f"Ошибка получения стакана ордеров для {symbol}: HTTP {response.status}.")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                BINANCE_ERRORS.inc(endpoint=DEPTH_ENDPOINT, status=type(e).__name__)
+                print(f"Ошибка получения стакана ордеров для {symbol}: {e!r}")
+                return None
+            if not retry:
+                return None
+    return None
 
-# Функция для анализа дисбаланса
-def analyze_order_book(order_book):
-    bids = order_book['bids']
-    asks = order_book['asks']
-    total_bid_volume = sum([float(bid[1]) for bid in bids])
-    total_ask_volume = sum([float(ask[1]) for ask in asks])
-    if total_bid_volume + total_ask_volume == 0:
-        return total_bid_volume, total_ask_volume, 0
-    dizbalance = (total_bid_volume - total_ask_volume) / (total_bid_volume + total_ask_volume) * 100
-    return total_bid_volume, total_ask_volume, dizbalance
-
-# Функция для получения всех CHAT_ID из базы данных
-def get_all_chat_ids():
-    conn = connect_to_db()
-    if not conn:
+# Функция для выбора пар, стакан которых в этом цикле запрашивается на BAND_DEPTH_LIMIT
+# уровней для диапазонов дисбаланса: каждая пара попадает в выборку раз
+# в BAND_DEPTH_EVERY циклов, и вес цикла остается в пределах бюджета
+def band_depth_symbols(symbols, cycle_time):
+    if BAND_DEPTH_EVERY <= 0 or BAND_DEPTH_LIMIT <= DEPTH_LIMIT:
         return []
+    return symbols[cycle_time // CYCLE_MS % BAND_DEPTH_EVERY::BAND_DEPTH_EVERY]
+
+# Функция для одновременного получения стаканов по всем парам.
+# Одна keep-alive сессия и семафор ограничивают число параллельных запросов,
+# поэтому все снимки цикла относятся примерно к одному моменту времени.
+# stagger > 0 равномерно распределяет начало запросов на stagger секунд:
+# снимки теряют одновременность, но вес не расходуется всплеском.
+# limits — глубина для отдельных пар вместо limit (symbol -> число уровней).
+async def fetch_order_books(symbols, limit=DEPTH_LIMIT, concurrency=DEPTH_CONCURRENCY, loads=json.loads,
+                            stagger=DEPTH_STAGGER, limits=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=DEPTH_TIMEOUT)
+
+    async def fetch(i, symbol):
+        if stagger:
+            await asyncio.sleep(i * stagger / len(symbols))
+        return await fetch_order_book(session, semaphore, symbol, (limits or {}).get(symbol, limit), loads)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        order_books = await asyncio.gather(*(fetch(i, symbol) for i, symbol in enumerate(symbols)))
+    return dict(zip(symbols, order_books))
+
+# Функция для учета итога рассылки: метрики и удаление чатов, заблокировавших бота
+def handle_broadcast_result(conn, kind, result):
+    print(f"Рассылка ({kind}): {result}")
+    NOTIFICATIONS.inc(result.sent, kind=kind, result="sent")
+    NOTIFICATIONS.inc(result.failed, kind=kind, result="failed")
+    NOTIFICATIONS.inc(result.retries, kind=kind, result="retried")
+    NOTIFICATIONS.inc(len(result.blocked), kind=kind, result="blocked")
+    if result.blocked:
+        try:
+            user_registry.remove(conn, result.blocked)
+            alert_registry.remove_chats(conn, result.blocked)
+            print(f"Удалены чаты, заблокировавшие бота: {', '.join(map(str, result.blocked))}")
+        except Exception as e:
+            print(f"Ошибка при удалении CHAT_ID: {e}")
+
+# Функция для отправки сводки по рынку.
+# Список берется из реестра в памяти и перечитывается, только если его изменил бот.
+# Получатели зависят от SUMMARY_RECIPIENTS: по умолчанию пользователи
+# с подписками получают только свои пороговые уведомления.
+async def send_notifications_to_all(conn, message):
+    if SUMMARY_RECIPIENTS == "none":
+        return
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT chat_id FROM users
-        """)
-        chat_ids = [row[0] for row in cursor.fetchall()]
-        cursor.close()
-        conn.close()
-        return chat_ids
+        user_registry.refresh(conn)
     except Exception as e:
         print(f"Ошибка при получении CHAT_ID: {e}")
-        return []
+    chat_ids = user_registry.chat_ids
+    if SUMMARY_RECIPIENTS == "unsubscribed":
+        chat_ids = chat_ids - alert_registry.chat_ids
+    if not chat_ids:
+        return
+    try:
+        result = await broadcaster.broadcast(sorted(chat_ids), message)
+    except Exception as e:
+        print(f"Ошибка при рассылке сводки: {e}")
+        return
+    handle_broadcast_result(conn, "summary", result)
 
-# Функция для отправки уведомлений всем пользователям
-async def send_notifications_to_all(bot_token, message):
-    bot = Bot(token=bot_token)
-    chat_ids = get_all_chat_ids()  # Получаем все CHAT_ID
-    for chat_id in chat_ids:
-        try:
-            await bot.send_message(chat_id=chat_id, text=message)
-            print(f"Уведомление отправлено пользователю с CHAT_ID {chat_id}")
-        except Exception as e:
-            print(f"Ошибка при отправке уведомления пользователю с CHAT_ID {chat_id}: {e}")
-    await bot.session.close()
+# Функция для проверки подписок на пороговые уведомления по данным цикла.
+# Проверяются только пары, на которые есть подписки, уведомление уходит
+# при пересечении порога, все сработавшие условия чата — одним сообщением.
+async def send_alerts(conn, pair_rows, summary):
+    try:
+        alert_registry.refresh(conn)
+        user_registry.refresh(conn)
+        if not alert_registry.by_symbol:
+            return
+        values = {symbol: dizbalance for symbol, _, _, dizbalance, *_ in pair_rows}
+        values[MARKET_SYMBOL] = summary[2]
+        alerts, changed = alert_registry.evaluate(values, rolling_stats.zscores.get(DAY_MS, {}))
+        if changed:
+            alert_registry.save_states(conn, changed)
+    except Exception as e:
+        print(f"Ошибка при проверке подписок на уведомления: {e}")
+        return
+    alerts = {chat_id: texts for chat_id, texts in alerts.items() if user_registry.is_authorized(chat_id)}
+    if not alerts:
+        return
+    ALERTS_TRIGGERED.inc(sum(len(texts) for texts in alerts.values()))
+    messages = [(chat_id, "\n".join(texts)) for chat_id, texts in alerts.items()]
+    try:
+        result = await broadcaster.send_many(messages)
+    except Exception as e:
+        print(f"Ошибка при рассылке уведомлений: {e}")
+        return
+    handle_broadcast_result(conn, "alert", result)
 
-# Функция для анализа и сохранения данных
-def analyze_and_save_data():
-    conn = connect_to_db()
-    if not conn:
+# Функция для применения срока хранения сырых данных не чаще раза в RETENTION_INTERVAL.
+# За один раз архивируется не больше месяца, чтобы не затягивать цикл.
+def run_retention(conn):
+    global last_retention
+    if last_retention is not None and time.monotonic() - last_retention < RETENTION_INTERVAL:
         return
-    create_tables_if_not_exist(conn)
-    symbols = get_futures_symbols()
+    last_retention = time.monotonic()
+    try:
+        result = apply_retention(conn, max_months=1)
+        if result.archived or result.deleted:
+            print(f"Срок хранения: {result}")
+    except Exception as e:
+        print(f"Ошибка при архивировании данных: {e}")
+
+# Функция для анализа и сохранения данных одного цикла.
+# cycle_time — начало слота расписания, общее для всех строк цикла.
+# Длительность цикла и его этапов попадает в метрики collector_*_seconds.
+async def analyze_and_save_data(conn, cycle_time):
+    with CYCLE_SECONDS.time():
+        await collect_cycle(conn, cycle_time)
+
+async def collect_cycle(conn, cycle_time):
+    with PHASE_SECONDS.time(phase="symbols"):
+        symbols = await symbol_registry.get_symbols(conn)
     if not symbols:
-        conn.close()
         return
-    total_bid_volume_all = 0
-    total_ask_volume_all = 0
-    for symbol in symbols:
-        order_book = get_order_book(symbol)
-        if order_book:
-            bid_volume, ask_volume, dizbalance = analyze_order_book(order_book)
-            save_pair_data(conn, symbol, bid_volume, ask_volume, dizbalance)
-            total_bid_volume_all += bid_volume
-            total_ask_volume_all += ask_volume
-    # Расчет общего дисбаланса
-    if total_bid_volume_all + total_ask_volume_all == 0:
-        total_dizbalance = 0
-    else:
-        total_dizbalance = (total_bid_volume_all - total_ask_volume_all) / (total_bid_volume_all + total_ask_volume_all) * 100
-    # Сохранение агрегированных данных
-    save_market_summary(conn, total_bid_volume_all, total_ask_volume_all, total_dizbalance)
+    started = time.monotonic()
+    with PHASE_SECONDS.time(phase="depth"):
+        deep = band_depth_symbols(symbols, cycle_time)
+        order_books = await fetch_order_books(
+            symbols, loads=parse_depth_response, limits=dict.fromkeys(deep, BAND_DEPTH_LIMIT)
+        )
+    print(f"Получено стаканов: {sum(1 for ob in order_books.values() if ob)} из {len(symbols)} "
+          f"(глубоких: {len(deep)}) за {time.monotonic() - started:.2f} с.")
+    # Расчет дисбаланса по всем парам и по рынку в целом
+    with PHASE_SECONDS.time(phase="analysis"):
+        pair_rows, summary = pressure_rows(*analyze_order_books(order_books))
+    # Сохранение всех данных цикла одной транзакцией
+    with PHASE_SECONDS.time(phase="db_write"):
+        saved = save_cycle_data(conn, cycle_time, pair_rows, summary)
+    if saved:
+        with PHASE_SECONDS.time(phase="alerts"):
+            await send_alerts(conn, pair_rows, summary)
 
     # Вывод последних агрегированных данных в консоль
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT time, total_bid_volume, total_ask_volume, total_dizbalance
-            FROM market_summary
-            ORDER BY time DESC
-            LIMIT 1
-        """)
-        latest_summary = cursor.fetchone()
+        latest_summary = fetch_latest(conn)
         if latest_summary:
-            time_str, total_bid_volume, total_ask_volume, total_dizbalance = latest_summary
+            cycle_ms, total_bid_volume, total_ask_volume, total_dizbalance = latest_summary
+            time_str = format_time(cycle_ms)
             print("Последние агрегированные данные:")
             print(f"  Время: {time_str}")
             print(f"  Общий объем покупок: {total_bid_volume:.2f}")
@@ -207,22 +325,42 @@ def analyze_and_save_data():
             )
 
             # Отправляем уведомление всем пользователям
-            import asyncio
-            asyncio.run(send_notifications_to_all(BOT_TOKEN, notification_message))
+            with PHASE_SECONDS.time(phase="broadcast"):
+                await send_notifications_to_all(conn, notification_message)
         else:
             print("Агрегированные данные отсутствуют.")
-        cursor.close()
     except Exception as e:
         print(f"Ошибка при получении последних агрегированных данных: {e}")
 
-    conn.close()
+    with PHASE_SECONDS.time(phase="retention"):
+        run_retention(conn)
+
+
+# Основной цикл сборщика: циклы на границах :00/:15/:30/:45 (см. scheduler.py).
+# once — один цикл сразу, удобно для проверки на локальной заглушке.
+async def main(once=False):
+    conn = connect_to_db()
+    if not conn:
+        return
+    create_tables_if_not_exist(conn)
+    metrics_runner = await start_metrics_server(COLLECTOR_METRICS_PORT, METRICS_HOST)
+    if metrics_runner:
+        print(f"Метрики: http://{METRICS_HOST}:{COLLECTOR_METRICS_PORT}/metrics")
+    try:
+        if once:
+            await analyze_and_save_data(conn, now_ms())
+        else:
+            print("Скрипт запущен. Ожидание следующего интервала...")
+            await run_aligned(conn, lambda cycle_time: analyze_and_save_data(conn, cycle_time))
+    finally:
+        await broadcaster.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        conn.close()
 
-# Запуск задачи каждые 15 минут
-schedule.every(15).minutes.do(analyze_and_save_data)
 
-# Основной цикл
 if __name__ == "__main__":
-    print("Скрипт запущен. Ожидание следующего интервала...")
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    try:
+        asyncio.run(main(once="--once" in sys.argv))
+    except KeyboardInterrupt:
+        pass
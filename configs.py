@@ -3,4 +3,83 @@ from decouple import config
 # Замените PIN_CODE на PIN_CODE_HASH
 BOT_TOKEN = config("BOT_TOKEN")
 PIN_CODE_HASH = config("PIN_CODE_HASH")  # Теперь здесь хранится хеш
-DATABASE_NAME = config("DATABASE_NAME")
\ No newline at end of file
+DATABASE_NAME = config("DATABASE_NAME")
+
+# Настройки сбора данных с Binance
+# Для тестового режима укажите адрес локальной заглушки, например http://127.0.0.1:8081
+BINANCE_API_URL = config("BINANCE_API_URL", default="https://fapi.binance.com")
+DEPTH_CONCURRENCY = config("DEPTH_CONCURRENCY", default=20, cast=int)  # Одновременных запросов стакана
+# Глубина стакана для расчета диапазонов дисбаланса. Вес запроса Binance растет с limit:
+# 100 -> 5, 500 -> 10, 1000 -> 20 (лимит IP — 2400 в минуту). При 100 уровнях
+# 300 пар стоят 1500 веса и укладываются в бюджет сборщика (80% лимита) за один цикл,
+# при 500 — 3000 веса, и часть запросов ждет бюджета следующей минуты.
+DEPTH_LIMIT = config("DEPTH_LIMIT", default=100, cast=int)
+# Диапазоны 1% и 5% от середины спреда обычно лежат глубже 100 уровней. Каждый цикл
+# стакан BAND_DEPTH_LIMIT уровней запрашивается для каждой BAND_DEPTH_EVERY-й пары
+# по очереди: при 300 парах и 4 — 75 × 10 + 225 × 5 = 1875 веса, в пределах бюджета.
+# Диапазон, до которого загруженный стакан не дошел, записывается пустым (NULL).
+BAND_DEPTH_LIMIT = config("BAND_DEPTH_LIMIT", default=500, cast=int)
+BAND_DEPTH_EVERY = config("BAND_DEPTH_EVERY", default=4, cast=int)  # 0 — глубокие стаканы не запрашиваются
+DEPTH_TIMEOUT = config("DEPTH_TIMEOUT", default=10, cast=float)  # Таймаут одного запроса, сек
+DEPTH_RETRIES = config("DEPTH_RETRIES", default=2, cast=int)  # Повторов запроса стакана после 429/418
+# Распределение запросов стаканов на указанное число секунд (0 — все пары сразу)
+DEPTH_STAGGER = config("DEPTH_STAGGER", default=0, cast=float)
+BINANCE_WEIGHT_LIMIT = config("BINANCE_WEIGHT_LIMIT", default=2400, cast=int)  # Лимит веса запросов IP в минуту
+BINANCE_WEIGHT_SHARE = config("BINANCE_WEIGHT_SHARE", default=0.8, cast=float)  # Доля лимита, доступная сборщику
+SYMBOLS_TTL = config("SYMBOLS_TTL", default=3600, cast=int)  # Период обновления списка пар, сек
+
+# Настройки потокового режима (stream_collector.py)
+BINANCE_STREAM_URL = config("BINANCE_STREAM_URL", default="wss://fstream.binance.com")
+STREAM_WRITE_INTERVAL = config("STREAM_WRITE_INTERVAL", default=900, cast=int)  # Период записи в базу, сек
+
+# Кэш готовых отчетов в памяти бота
+REPORT_CACHE_MAX_BYTES = config("REPORT_CACHE_MAX_BYTES", default=64 * 1024 * 1024, cast=int)
+REPORT_CACHE_MAX_ITEMS = config("REPORT_CACHE_MAX_ITEMS", default=256, cast=int)
+
+# Пул процессов для построения отчетов
+REPORT_WORKERS = config("REPORT_WORKERS", default=2, cast=int)  # Число процессов
+REPORT_TIMEOUT = config("REPORT_TIMEOUT", default=60, cast=float)  # Ожидание одного отчета, сек
+REPORT_QUEUE_LIMIT = config("REPORT_QUEUE_LIMIT", default=8, cast=int)  # Отчетов в работе одновременно
+
+# Рассылка уведомлений сборщика
+TELEGRAM_API_URL = config("TELEGRAM_API_URL", default="https://api.telegram.org")
+# Лимит Telegram — около 30 сообщений в секунду на бота, оставляем запас
+BROADCAST_RATE = config("BROADCAST_RATE", default=25, cast=float)  # Сообщений в секунду
+BROADCAST_CONCURRENCY = config("BROADCAST_CONCURRENCY", default=10, cast=int)  # Одновременных отправок
+BROADCAST_RETRIES = config("BROADCAST_RETRIES", default=3, cast=int)  # Повторов после 429 и сетевых ошибок
+# Кому отправляется сводка по рынку каждого цикла: all — всем, unsubscribed — только
+# пользователям без подписок на пороговые уведомления (alerts.py), none — никому
+SUMMARY_RECIPIENTS = config("SUMMARY_RECIPIENTS", default="unsubscribed")
+ALERTS_PER_CHAT = config("ALERTS_PER_CHAT", default=20, cast=int)  # Подписок на уведомления у одного чата
+TOP_SIZE = config("TOP_SIZE", default=20, cast=int)  # Пар в каждом рейтинге /top (rolling_stats.py)
+
+# Расписание циклов сбора
+COLLECT_DEADLINE = config("COLLECT_DEADLINE", default=600, cast=float)  # Предельная длительность цикла, сек
+COLLECT_GRACE = config("COLLECT_GRACE", default=60, cast=float)  # Допустимое опоздание начала цикла, сек
+
+# Доступ бота к базе данных
+DB_READERS = config("DB_READERS", default=4, cast=int)  # Соединений для чтения
+DB_BUSY_TIMEOUT = config("DB_BUSY_TIMEOUT", default=5000, cast=int)  # Ожидание блокировки, мс
+USERS_REFRESH_INTERVAL = config("USERS_REFRESH_INTERVAL", default=60, cast=float)  # Сверка списка пользователей, сек
+LATEST_REFRESH_INTERVAL = config("LATEST_REFRESH_INTERVAL", default=10, cast=float)  # Проверка нового цикла, сек
+
+# Ввод пин-кода
+PIN_MAX_ATTEMPTS = config("PIN_MAX_ATTEMPTS", default=3, cast=int)  # Неверных попыток до блокировки
+PIN_LOCKOUT_SECONDS = config("PIN_LOCKOUT_SECONDS", default=300, cast=int)  # Длительность блокировки, сек
+PIN_WORKERS = config("PIN_WORKERS", default=2, cast=int)  # Потоков для проверки bcrypt
+
+# Хранение и архивирование сырых данных (retention.py)
+RETENTION_DAYS = config("RETENTION_DAYS", default=90, cast=int)  # Сколько дней сырые данные хранятся в базе
+# Статистика за 7 дней (rolling_stats.py) вычитает вышедшие из окна замеры,
+# читая их из market_pressure, поэтому сырые данные должны храниться дольше окна
+if RETENTION_DAYS <= 7:
+    raise ValueError(f"RETENTION_DAYS должен быть больше 7 дней (окно /top z7d), указано {RETENTION_DAYS}")
+HOURLY_RETENTION_DAYS = config("HOURLY_RETENTION_DAYS", default=400, cast=int)  # Срок хранения часовых агрегатов, дней
+ARCHIVE_DIR = config("ARCHIVE_DIR", default="archive")  # Каталог месячных архивов Parquet
+RETENTION_INTERVAL = config("RETENTION_INTERVAL", default=3600, cast=float)  # Период проверки срока хранения, сек
+
+# Метрики Prometheus и профилировщик (metrics.py). Порт 0 отключает сервер.
+METRICS_HOST = config("METRICS_HOST", default="127.0.0.1")
+COLLECTOR_METRICS_PORT = config("COLLECTOR_METRICS_PORT", default=9101, cast=int)  # Порт метрик сборщика
+BOT_METRICS_PORT = config("BOT_METRICS_PORT", default=9102, cast=int)  # Порт метрик бота
+STREAM_METRICS_PORT = config("STREAM_METRICS_PORT", default=9103, cast=int)  # Порт метрик потокового сборщика
@@ -0,0 +1,69 @@
+# Асинхронный доступ к SQLite для обработчиков бота.
+# Запросы выполняются в потоках: несколько долгоживущих соединений для чтения
+# и одно соединение для записи, поэтому цикл событий никогда не ждет диск.
+# Соединения не пересоздаются, и sqlite3 переиспользует подготовленные
+# выражения из своего кэша (cached_statements) для одинаковых текстов SQL.
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from configs import DATABASE_NAME, DB_BUSY_TIMEOUT, DB_READERS
+from db_schema import enable_wal
+
+# Размер кэша подготовленных выражений на соединение
+CACHED_STATEMENTS = 64
+
+
+class Database:
+    def __init__(self, path=DATABASE_NAME, readers=DB_READERS):
+        self.path = path
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+        self.read_executor = ThreadPoolExecutor(
+            readers, thread_name_prefix="db-read", initializer=self._open, initargs=(True,)
+        )
+        self.write_executor = ThreadPoolExecutor(
+            1, thread_name_prefix="db-write", initializer=self._open, initargs=(False,)
+        )
+
+    # Открытие соединения потока пула. Соединения для чтения не могут писать.
+    def _open(self, readonly):
+        conn = sqlite3.connect(self.path, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            enable_wal(conn)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        self.local.conn = conn
+        with self.lock:
+            self.connections.append(conn)
+
+    def _fetchone(self, sql, params):
+        return self.local.conn.execute(sql, params).fetchone()
+
+    def _call(self, func, args):
+        return func(self.local.conn, *args)
+
+    async def _run(self, executor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    # Функция для чтения одной строки
+    async def fetchone(self, sql, params=()):
+        return await self._run(self.read_executor, self._fetchone, sql, params)
+
+    # Функция для выполнения func(conn, *args) в потоке пула с его соединением.
+    # Функции, которые пишут в базу, выполняются на соединении для записи.
+    async def run(self, func, *args, write=False):
+        executor = self.write_executor if write else self.read_executor
+        return await self._run(executor, self._call, func, args)
+
+    def close(self):
+        self.read_executor.shutdown()
+        self.write_executor.shutdown()
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
@@ -0,0 +1,358 @@
+# Общая схема базы данных для сборщика и бота.
+# Изменения схемы оформляются миграциями: номер примененной версии хранится
+# в таблице schema_migrations, каждая миграция выполняется в своей транзакции.
+# Новые миграции добавляются в конец списка MIGRATIONS.
+from datetime import datetime, timezone
+
+from latest_snapshot import MARKET_SYMBOL
+from rolling_stats import backfill_rolling_stats
+from rollups import backfill_rollups, display_offset_ms
+from time_utils import iso_to_epoch_ms, now_ms
+
+
+# Функция для перевода соединения в режим WAL.
+# Новая база создается в режиме auto_vacuum=INCREMENTAL (см. retention.py): прагма
+# действует только до первой записи в файл, а переход в WAL уже записывает заголовок,
+# поэтому auto_vacuum задается раньше. Для существующей базы прагма ничего не меняет.
+def enable_wal(conn):
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+
+
+# Функция для получения списка колонок таблицы (пустой, если таблицы нет)
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+# Функция для получения колонок первичного ключа таблицы в порядке ключа
+def primary_key(conn, table):
+    rows = [row for row in conn.execute(f"PRAGMA table_info({table})") if row[5]]
+    return [row[1] for row in sorted(rows, key=lambda row: row[5])]
+
+
+# Функция для пересоздания таблицы по новому определению с переносом данных.
+# Колонки, которых не было в старой таблице, заполняются NULL,
+# повторяющиеся по новому ключу строки отбрасываются.
+# convert — SQL-выражения для колонок, значения которых меняют формат.
+def rebuild_table(conn, table, create_sql, columns, convert=None):
+    convert = convert or {}
+    old_columns = set(table_columns(conn, table))
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    conn.execute(create_sql)
+    select = ", ".join(
+        convert.get(column, column) if column in old_columns else "NULL"
+        for column in columns
+    )
+    conn.execute(f"""
+        INSERT OR IGNORE INTO {table} ({", ".join(columns)})
+        SELECT {select} FROM {table}_old ORDER BY rowid
+    """)
+    conn.execute(f"DROP TABLE {table}_old")
+
+
+# Определения таблиц зафиксированы по версиям схемы: миграция всегда
+# приводит таблицу к форме своей версии, следующие миграции меняют ее дальше.
+MARKET_PRESSURE_COLUMNS = (
+    "time", "symbol", "bid_volume", "ask_volume", "dizbalance",
+    "dizbalance_0_5", "dizbalance_1", "dizbalance_5", "bid_notional", "ask_notional",
+)
+
+MARKET_PRESSURE_V1_SQL = """
+    CREATE TABLE IF NOT EXISTS market_pressure (
+        time TIMESTAMP NOT NULL,
+        symbol TEXT NOT NULL,
+        bid_volume REAL,
+        ask_volume REAL,
+        dizbalance REAL,
+        dizbalance_0_5 REAL,
+        dizbalance_1 REAL,
+        dizbalance_5 REAL,
+        bid_notional REAL,
+        ask_notional REAL,
+        PRIMARY KEY (time, symbol)
+    )
+"""
+
+MARKET_SUMMARY_COLUMNS = ("time", "total_bid_volume", "total_ask_volume", "total_dizbalance")
+
+MARKET_SUMMARY_V1_SQL = """
+    CREATE TABLE IF NOT EXISTS market_summary (
+        time TIMESTAMP NOT NULL PRIMARY KEY,
+        total_bid_volume REAL,
+        total_ask_volume REAL,
+        total_dizbalance REAL
+    )
+"""
+
+
+# Миграция 1: исходные таблицы сборщика, бота и реестра пар
+def create_base_tables(conn):
+    conn.execute(MARKET_PRESSURE_V1_SQL)
+    conn.execute(MARKET_SUMMARY_V1_SQL)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            chat_id INTEGER PRIMARY KEY
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS symbols (
+            symbol TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            contract_type TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS registry_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+
+# Миграция 2: приведение таблиц, созданных ботом без ключей, к общей схеме,
+# и индексы под запросы бота:
+#   market_pressure WHERE symbol = ? ORDER BY time DESC — idx_market_pressure_symbol_time;
+#   market_summary ORDER BY time DESC — первичный ключ по time;
+#   users WHERE chat_id = ? — первичный ключ по chat_id.
+def add_keys_and_indexes(conn):
+    if (primary_key(conn, "market_pressure") != ["time", "symbol"]
+            or not set(MARKET_PRESSURE_COLUMNS) <= set(table_columns(conn, "market_pressure"))):
+        rebuild_table(conn, "market_pressure", MARKET_PRESSURE_V1_SQL, MARKET_PRESSURE_COLUMNS)
+    if primary_key(conn, "market_summary") != ["time"]:
+        rebuild_table(conn, "market_summary", MARKET_SUMMARY_V1_SQL, MARKET_SUMMARY_COLUMNS)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_market_pressure_symbol_time
+        ON market_pressure (symbol, time)
+    """)
+
+
+# Миграция 3: время в market_pressure и market_summary хранится целым числом
+# миллисекунд UTC вместо ISO-строк с часовым поясом
+def convert_time_to_epoch_ms(conn):
+    conn.create_function("iso_to_epoch_ms", 1, iso_to_epoch_ms, deterministic=True)
+    rebuild_table(conn, "market_pressure", """
+        CREATE TABLE market_pressure (
+            time INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            bid_volume REAL,
+            ask_volume REAL,
+            dizbalance REAL,
+            dizbalance_0_5 REAL,
+            dizbalance_1 REAL,
+            dizbalance_5 REAL,
+            bid_notional REAL,
+            ask_notional REAL,
+            PRIMARY KEY (time, symbol)
+        )
+    """, MARKET_PRESSURE_COLUMNS, {"time": "iso_to_epoch_ms(time)"})
+    rebuild_table(conn, "market_summary", """
+        CREATE TABLE market_summary (
+            time INTEGER NOT NULL PRIMARY KEY,
+            total_bid_volume REAL,
+            total_ask_volume REAL,
+            total_dizbalance REAL
+        )
+    """, MARKET_SUMMARY_COLUMNS, {"time": "iso_to_epoch_ms(time)"})
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_market_pressure_symbol_time
+        ON market_pressure (symbol, time)
+    """)
+
+
+# Миграция 4: часовые и дневные агрегаты по монетам и по рынку (см. rollups.py)
+# с заполнением по уже накопленным данным
+def create_rollup_tables(conn):
+    conn.execute("""
+        CREATE TABLE market_pressure_rollup (
+            resolution INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            dizbalance_sum REAL,
+            dizbalance_min REAL,
+            dizbalance_max REAL,
+            dizbalance_last REAL,
+            last_time INTEGER NOT NULL,
+            bid_volume_sum REAL,
+            ask_volume_sum REAL,
+            PRIMARY KEY (resolution, symbol, bucket)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE market_summary_rollup (
+            resolution INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            dizbalance_sum REAL,
+            dizbalance_min REAL,
+            dizbalance_max REAL,
+            dizbalance_last REAL,
+            last_time INTEGER NOT NULL,
+            bid_volume_sum REAL,
+            ask_volume_sum REAL,
+            PRIMARY KEY (resolution, bucket)
+        ) WITHOUT ROWID
+    """)
+    backfill_rollups(conn, display_offset_ms(now_ms()))
+
+
+# Миграция 5: журнал циклов сбора (см. scheduler.py)
+def create_collector_cycles(conn):
+    conn.execute("""
+        CREATE TABLE collector_cycles (
+            slot_time INTEGER PRIMARY KEY,
+            started_at INTEGER,
+            finished_at INTEGER,
+            status TEXT NOT NULL
+        )
+    """)
+
+
+# Миграция 6: неудачные попытки ввода пин-кода и блокировки по времени
+def create_pin_lockouts(conn):
+    conn.execute("""
+        CREATE TABLE pin_lockouts (
+            chat_id INTEGER PRIMARY KEY,
+            failed_attempts INTEGER NOT NULL,
+            locked_until INTEGER
+        )
+    """)
+
+
+# Миграция 7: последние значения по парам и по рынку (см. latest_snapshot.py)
+# с заполнением по уже накопленным данным
+def create_latest_pressure(conn):
+    conn.execute("""
+        CREATE TABLE latest_pressure (
+            symbol TEXT PRIMARY KEY,
+            time INTEGER NOT NULL,
+            bid_volume REAL,
+            ask_volume REAL,
+            dizbalance REAL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO latest_pressure (symbol, time, bid_volume, ask_volume, dizbalance)
+        SELECT symbol, time, bid_volume, ask_volume, dizbalance
+        FROM market_pressure
+        WHERE (symbol, time) IN (SELECT symbol, MAX(time) FROM market_pressure GROUP BY symbol)
+    """)
+    conn.execute("""
+        INSERT INTO latest_pressure (symbol, time, bid_volume, ask_volume, dizbalance)
+        SELECT ?, time, total_bid_volume, total_ask_volume, total_dizbalance
+        FROM market_summary
+        ORDER BY time DESC
+        LIMIT 1
+    """, (MARKET_SYMBOL,))
+
+
+# Миграция 8: учет месячных архивов сырых данных (см. retention.py)
+def create_archive_months(conn):
+    conn.execute("""
+        CREATE TABLE archive_months (
+            month_start INTEGER PRIMARY KEY,
+            month_end INTEGER NOT NULL,
+            pressure_rows INTEGER NOT NULL,
+            summary_rows INTEGER NOT NULL,
+            archived_at INTEGER NOT NULL
+        )
+    """)
+
+
+# Миграция 9: подписки на пороговые уведомления (см. alerts.py)
+def create_alert_subscriptions(conn):
+    conn.execute("""
+        CREATE TABLE alert_subscriptions (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            threshold REAL NOT NULL,
+            state INTEGER,
+            created_at INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_alert_subscriptions_chat ON alert_subscriptions (chat_id)")
+
+
+# Миграция 10: скользящая статистика и рейтинги /top (см. rolling_stats.py)
+# с заполнением по уже накопленным данным
+def create_rolling_stats(conn):
+    conn.execute("""
+        CREATE TABLE rolling_stats (
+            symbol TEXT NOT NULL,
+            window_ms INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL,
+            PRIMARY KEY (symbol, window_ms)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE rolling_windows (
+            window_ms INTEGER PRIMARY KEY,
+            origin INTEGER NOT NULL,
+            last_time INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE top_movers (
+            metric TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            value REAL NOT NULL,
+            dizbalance REAL NOT NULL,
+            time INTEGER NOT NULL,
+            PRIMARY KEY (metric, rank)
+        ) WITHOUT ROWID
+    """)
+    backfill_rolling_stats(conn)
+
+
+MIGRATIONS = [
+    create_base_tables,
+    add_keys_and_indexes,
+    convert_time_to_epoch_ms,
+    create_rollup_tables,
+    create_collector_cycles,
+    create_pin_lockouts,
+    create_latest_pressure,
+    create_archive_months,
+    create_alert_subscriptions,
+    create_rolling_stats,
+]
+
+
+# Функция для получения номера текущей версии схемы
+def schema_version(conn):
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+
+# Функция для применения всех недостающих миграций.
+# BEGIN IMMEDIATE не дает сборщику и боту применить одну миграцию дважды.
+def migrate(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    applied = []
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if version <= schema_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version > schema_version(conn):
+                migration(conn)
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, applied_at) VALUES (?, ?)",
+                    (version, datetime.now(timezone.utc).isoformat()),
+                )
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
@@ -6,17 +6,32 @@ from aiogram.types import (
     CallbackQuery,
     ReplyKeyboardMarkup,
     KeyboardButton,
+    BufferedInputFile,
     FSInputFile,
 )
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from configs import BOT_TOKEN, DATABASE_NAME, PIN_CODE_HASH
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-from matplotlib.dates import DateFormatter, HourLocator
-from datetime import datetime
+from configs import REPORT_QUEUE_LIMIT, REPORT_TIMEOUT, REPORT_WORKERS, USERS_REFRESH_INTERVAL
+from configs import PIN_LOCKOUT_SECONDS, PIN_MAX_ATTEMPTS, PIN_WORKERS, LATEST_REFRESH_INTERVAL
+from configs import BOT_METRICS_PORT, METRICS_HOST, ALERTS_PER_CHAT, TOP_SIZE
+from alerts import add_subscription, chat_subscriptions, count_subscriptions, describe, parse_condition
+from alerts import remove_subscriptions
+from db_access import Database
+from db_schema import enable_wal, migrate
+from latest_snapshot import MARKET_SYMBOL, LatestSnapshot
+from rolling_stats import TOP_METRICS, TopMovers
+from metrics import Counter, Histogram, start_metrics_server
+from user_registry import UserRegistry
+from report_cache import ReportCache
+from rollups import DAY_MS
+from reports import CHART_FORMATS, create_export, render_report
+from exports import EXPORT_EXTENSIONS
+from time_utils import format_time, now_ms, parse_date
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 import bcrypt
 import logging
 import asyncio
@@ -27,25 +42,101 @@ import os
 # Настройка логирования
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-handler = RotatingFileHandler(
-    "bot.log",
-    maxBytes=5 * 1024 * 1024,  # 5 MB
-    backupCount=3,
-    encoding="utf-8",
-)
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+
+# Функция для записи журнала в bot.log. Вызывается только при запуске бота,
+# поэтому импорт модуля (например, из замеров) не создает файл журнала.
+def setup_logging():
+    handler = RotatingFileHandler(
+        "bot.log",
+        maxBytes=5 * 1024 * 1024,  # 5 MB
+        backupCount=3,
+        encoding="utf-8",
+    )
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
 
 # Инициализация бота и диспетчера
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
+# Долгоживущие соединения с базой для обработчиков
+db = Database()
+
+# Отдельный пул для bcrypt: перебор пин-кода занимает не больше PIN_WORKERS
+# потоков и не отнимает потоки у запросов к базе
+pin_executor = ThreadPoolExecutor(PIN_WORKERS, thread_name_prefix="pin")
+
+# Авторизованные пользователи в памяти. Изменения из сборщика
+# (удаление заблокировавших бота) подхватываются раз в USERS_REFRESH_INTERVAL.
+user_registry = UserRegistry()
+
+# Последние данные по парам и по рынку в памяти (копия latest_pressure).
+# Новый цикл сборщика подхватывается раз в LATEST_REFRESH_INTERVAL.
+latest_snapshot = LatestSnapshot()
+# Рейтинги /top в памяти (копия top_movers), перечитываются вместе с последними данными
+top_movers = TopMovers()
+
+# Готовые отчеты хранятся в памяти до появления новых данных
+report_cache = ReportCache()
+
+# Отчеты строятся в отдельных процессах: matplotlib и pandas не блокируют
+# цикл событий, а состояние pyplot не разделяется между задачами.
+# Одинаковые одновременные запросы ждут одну и ту же задачу.
+def create_report_pool():
+    return ProcessPoolExecutor(
+        max_workers=REPORT_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+report_pool = create_report_pool()
+pending_reports = {}
+
+# Метрики бота (см. metrics.py)
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Длительность обработчиков бота", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Исключения в обработчиках бота", ("handler",))
+REPORT_SECONDS = Histogram(
+    "bot_report_seconds", "Ожидание построения отчета в пуле процессов", ("format",),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+REPORT_REQUESTS = Counter("bot_report_requests_total", "Запросы отчетов по результату", ("format", "result"))
+
+# Расширения файлов отчетов
+REPORT_EXTENSIONS = {"excel": "xlsx", "pdf": "pdf", "png": "png"}
+
+REPORT_POOL_BUSY_TEXT = "⏳ Сервер отчетов занят, попробуйте через минуту."
+EXPORT_USAGE_TEXT = (
+    "Формат: /export <монета или market> [excel|csv|parquet] [с ДД.ММ.ГГГГ] [по ДД.ММ.ГГГГ]\n"
+    "Например: /export BTCUSDT csv 01.09.2025 30.09.2025"
+)
+ALERT_USAGE_TEXT = (
+    "Формат: /alert <монета или market> <условие>\n"
+    "Условия: > 30, < -30 — дисбаланс выше или ниже порога в %; "
+    "cross 0 — пересечение порога в любую сторону; z > 3 — z-score дисбаланса выше порога.\n"
+    "Например: /alert BTCUSDT > 30, /alert market cross 0, /alert ETHUSDT z > 3\n"
+    "Уведомление приходит, когда условие начинает выполняться. "
+    "Список подписок — /alerts, удаление — /unalert <номер> или /unalert all."
+)
+TOP_USAGE_TEXT = (
+    "Формат: /top [imbalance|change|z24h|z7d] [число пар]\n"
+    "imbalance — текущий дисбаланс, change — изменение с прошлого цикла, "
+    "z24h и z7d — z-score относительно 24 часов и 7 дней.\n"
+    "Например: /top change 5"
+)
+# Заголовки и формат значений рейтингов /top
+TOP_TITLES = {
+    "imbalance": "текущему дисбалансу",
+    "change": "изменению дисбаланса с прошлого цикла",
+    "z24h": "z-score дисбаланса за 24 часа",
+    "z7d": "z-score дисбаланса за 7 дней",
+}
+TOP_VALUE_FORMATS = {"imbalance": "{:+.2f}%", "change": "{:+.2f} п.п."}
+
 # FSM
 class PinCodeState(StatesGroup):
     entering_pin = State()  # Ввод пин-кода
     incorrect_pin = State()  # Неверный пин-код
-    blocked = State()  # Блокировка
 
 # Функция для создания клавиатуры с пин-кодом и кнопкой "готово"
 def get_pin_keyboard():
@@ -109,225 +200,141 @@ def get_report_keyboard(symbol=None):
 # Функция для подключения к базе данных
 def connect_to_db():
     try:
-        return sqlite3.connect(DATABASE_NAME)
+        conn = sqlite3.connect(DATABASE_NAME)
+        enable_wal(conn)
+        return conn
     except Exception as e:
         logger.error(f"Ошибка подключения к базе данных: {e}")
         return None
 
-# Функция для создания таблиц, если их нет
+# Функция для создания таблиц и применения миграций схемы
 def create_tables_if_not_exist(conn):
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                chat_id INTEGER PRIMARY KEY
-            );
-            """
-        )
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS market_summary (
-                time TEXT,
-                total_bid_volume REAL,
-                total_ask_volume REAL,
-                total_dizbalance REAL
-            );
-            """
-        )
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS market_pressure (
-                symbol TEXT,
-                time TEXT,
-                bid_volume REAL,
-                ask_volume REAL,
-                dizbalance REAL
-            );
-            """
-        )
-        conn.commit()
-        cursor.close()
+        applied = migrate(conn)
+        if applied:
+            logger.info(f"Применены миграции схемы: {applied}")
         logger.info("Таблицы созданы или уже существуют.")
     except Exception as e:
         logger.error(f"Ошибка создания таблиц: {e}")
 
-# Функция для проверки авторизации пользователя
+# Запросы обработчиков. Текст SQL постоянный, поэтому каждое соединение
+# db готовит их один раз и дальше берет из кэша подготовленных выражений.
+LOCKED_UNTIL_SQL = "SELECT locked_until FROM pin_lockouts WHERE chat_id = ? AND locked_until > ?"
+
+
+# Функция для проверки авторизации пользователя (по реестру в памяти)
 def is_user_authorized(chat_id):
-    try:
-        with connect_to_db() as conn:
-            return conn.execute(
-                "SELECT chat_id FROM users WHERE chat_id = ?",
-                (chat_id,)
-            ).fetchone() is not None
-    except Exception as e:
-        logger.error(f"Ошибка проверки авторизации: {e}")
-        return False
+    return user_registry.is_authorized(chat_id)
 
 # Функция для сохранения chat_id пользователя
-def save_chat_id(chat_id):
+async def save_chat_id(chat_id):
     try:
-        with connect_to_db() as conn:
-            conn.execute(
-                "INSERT OR IGNORE INTO users (chat_id) VALUES (?)",
-                (chat_id,)
-            )
-            conn.commit()
-            return True
+        await db.run(user_registry.add, chat_id, write=True)
+        return True
     except Exception as e:
         logger.error(f"Ошибка сохранения chat_id: {e}")
         return False
 
+# Функция для получения времени окончания блокировки ввода пин-кода (None, если ее нет)
+async def get_locked_until(chat_id):
+    row = await db.fetchone(LOCKED_UNTIL_SQL, (chat_id, now_ms()))
+    return row[0] if row else None
+
+# Функция для учета неудачной попытки ввода пин-кода.
+# После PIN_MAX_ATTEMPTS попыток подряд ставит блокировку на PIN_LOCKOUT_SECONDS.
+# Выполняется на соединении для записи; возвращает (осталось попыток, конец блокировки).
+def register_failed_pin(conn, chat_id):
+    with conn:
+        row = conn.execute("SELECT failed_attempts FROM pin_lockouts WHERE chat_id = ?", (chat_id,)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        locked_until = now_ms() + PIN_LOCKOUT_SECONDS * 1000 if attempts >= PIN_MAX_ATTEMPTS else None
+        conn.execute(
+            "INSERT OR REPLACE INTO pin_lockouts (chat_id, failed_attempts, locked_until) VALUES (?, ?, ?)",
+            (chat_id, 0 if locked_until else attempts, locked_until),
+        )
+    return PIN_MAX_ATTEMPTS - attempts, locked_until
+
+# Функция для сброса счетчика попыток после верного пин-кода
+def reset_failed_pin(conn, chat_id):
+    with conn:
+        conn.execute("DELETE FROM pin_lockouts WHERE chat_id = ?", (chat_id,))
+
+# Функция для проверки пин-кода. bcrypt занимает сотни миллисекунд процессора,
+# поэтому проверка идет в отдельном пуле потоков и не задерживает других пользователей.
+async def check_pin(pin):
+    return await asyncio.get_running_loop().run_in_executor(
+        pin_executor, bcrypt.checkpw, pin.encode(), PIN_CODE_HASH.encode()
+    )
+
 # Функция для удаления chat_id пользователя
-def delete_chat_id(chat_id):
+async def delete_chat_id(chat_id):
     try:
-        with connect_to_db() as conn:
-            conn.execute(
-                "DELETE FROM users WHERE chat_id = ?",
-                (chat_id,)
-            )
-            conn.commit()
-            return True
+        await db.run(user_registry.remove, [chat_id], write=True)
+        await db.run(remove_subscriptions, chat_id, write=True)
+        return True
     except Exception as e:
         logger.error(f"Ошибка удаления chat_id: {e}")
         return False
 
 
-def generate_chart(data, title, color):
-    plt.figure(figsize=(20, 8))
-    times = [datetime.strptime(row[0][:19], "%Y-%m-%dT%H:%M:%S") for row in data]
-    values = [row[1] for row in data]
-    plt.bar(
-        times, values,
-        color=color,
-        width=0.8 / 96,
-        edgecolor='black',
-        linewidth=0.2
-    )
-    plt.gca().xaxis.set_major_formatter(DateFormatter("%d.%m"))
-    plt.gca().xaxis.set_major_locator(HourLocator(interval=24))
+# Функция для периодической сверки реестра пользователей с базой
+async def refresh_users_periodically():
+    while True:
+        await asyncio.sleep(USERS_REFRESH_INTERVAL)
+        try:
+            if await db.run(user_registry.refresh, write=True):
+                logger.info(f"Список пользователей перечитан: {len(user_registry.chat_ids)}")
+        except Exception as e:
+            logger.error(f"Ошибка обновления списка пользователей: {e}")
 
-    # Формируем название графика
-    if "USDT" in title:
-        chart_title = f"Дисбаланс {title.strip()} за 30 дней"
-    else:
-        chart_title = "Дисбаланс рынка за 30 дней"
 
-    plt.title(chart_title, fontsize=14, pad=20)
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    return plt
+# Функция для периодической проверки, не записал ли сборщик новый цикл
+async def refresh_latest_periodically():
+    while True:
+        await asyncio.sleep(LATEST_REFRESH_INTERVAL)
+        try:
+            if await db.run(latest_snapshot.refresh):
+                await db.run(top_movers.load)
+                logger.info(f"Последние данные обновлены: {len(latest_snapshot.rows)} строк")
+        except Exception as e:
+            logger.error(f"Ошибка обновления последних данных: {e}")
 
-# Функция для создания PNG отчета
-def create_png_report(symbol=None):
-    try:
-        with connect_to_db() as conn:
-            query = """
-                SELECT time, dizbalance
-                FROM market_pressure
-                WHERE symbol = ?
-                ORDER BY time DESC
-                LIMIT 3000
-            """ if symbol else """
-                SELECT time, total_dizbalance
-                FROM market_summary
-                ORDER BY time DESC
-                LIMIT 3000
-            """
-            data = conn.execute(query, (symbol,) if symbol else ()).fetchall()[::-1]
-        plt = generate_chart(
-            data,
-            f" {symbol if symbol else ''} ",
-            "#4ECDC4" if symbol else "#FF6B6B"
-        )
-        filename = f"{symbol}_report.png" if symbol else "market_report.png"
-        plt.savefig(filename, dpi=100)
-        plt.close()
-        return filename
-    except Exception as e:
-        logger.error(f"Ошибка создания PNG отчета: {e}")
-        return None
 
-def create_pdf_report(symbol=None):
+# Промежуточный слой для замера всех обработчиков сообщений и нажатий кнопок
+async def handler_metrics_middleware(handler, event, data):
+    name = data["handler"].callback.__name__
     try:
-        # Создаем PNG отчет, чтобы использовать те же данные
-        png_file = create_png_report(symbol)
-        if not png_file:
-            return None
-
-        # Получаем данные из базы данных
-        with connect_to_db() as conn:
-            query = """
-                SELECT time, dizbalance
-                FROM market_pressure
-                WHERE symbol = ?
-                ORDER BY time DESC
-                LIMIT 3000
-            """ if symbol else """
-                SELECT time, total_dizbalance
-                FROM market_summary
-                ORDER BY time DESC
-                LIMIT 3000
-            """
-            data = conn.execute(query, (symbol,) if symbol else ()).fetchall()[::-1]
-
-        # Создаем PDF файл с тем же именем, заменяя расширение
-        pdf_file = png_file.replace('.png', '.pdf')
-
-        # Открываем PDF файл для записи
-        with PdfPages(pdf_file) as pdf:
-            # Генерируем график с данными
-            plt = generate_chart(
-                data,
-                f" {symbol if symbol else ''} ",
-                "#4ECDC4" if symbol else "#FF6B6B"
-            )
-            # Сохраняем график в PDF
-            pdf.savefig(plt.gcf())
-            # Закрываем график
-            plt.close()
+        with HANDLER_SECONDS.time(handler=name):
+            return await handler(event, data)
+    except Exception:
+        HANDLER_ERRORS.inc(handler=name)
+        raise
 
-        # Удаляем временный PNG-файл
-        try:
-            os.remove(png_file)
-            logger.info(f"Временный файл {png_file} успешно удален.")
-        except Exception as e:
-            logger.error(f"Ошибка удаления временного файла {png_file}: {e}")
 
-        return pdf_file
-    except Exception as e:
-        logger.error(f"Ошибка создания PDF отчета: {e}")
-        return None
+dp.message.middleware(handler_metrics_middleware)
+dp.callback_query.middleware(handler_metrics_middleware)
+
+
+@dp.startup()
+async def on_startup():
+    dp["metrics_runner"] = await start_metrics_server(BOT_METRICS_PORT, METRICS_HOST)
+    await db.run(user_registry.load, write=True)
+    logger.info(f"Загружено пользователей: {len(user_registry.chat_ids)}")
+    await db.run(latest_snapshot.load)
+    await db.run(top_movers.load)
+    dp["refresh_tasks"] = [
+        asyncio.create_task(refresh_users_periodically()),
+        asyncio.create_task(refresh_latest_periodically()),
+    ]
+
+
+@dp.shutdown()
+async def on_shutdown():
+    for task in dp["refresh_tasks"]:
+        task.cancel()
+    if dp["metrics_runner"]:
+        await dp["metrics_runner"].cleanup()
 
-# Функция для создания Excel отчета
-def create_excel_report(symbol=None):
-    try:
-        with connect_to_db() as conn:
-            query, columns = (
-                """
-                SELECT time, bid_volume, ask_volume, dizbalance
-                FROM market_pressure
-                WHERE symbol = ?
-                ORDER BY time DESC
-                """,
-                ["Time", "Bid", "Ask", "Dizbalance"]
-            ) if symbol else (
-                """
-                SELECT time, total_bid_volume, total_ask_volume, total_dizbalance
-                FROM market_summary
-                ORDER BY time DESC
-                """,
-                ["Time", "Total Bid", "Total Ask", "Total Dizbalance"]
-            )
-            data = conn.execute(query, (symbol,) if symbol else ()).fetchall()
-        df = pd.DataFrame(data, columns=columns)
-        df['Time'] = pd.to_datetime(df['Time']).dt.strftime("%Y.%m.%d %H:%M")
-        filename = f"{symbol}_report.xlsx" if symbol else "market_report.xlsx"
-        df.to_excel(filename, index=False)
-        return filename
-    except Exception as e:
-        logger.error(f"Ошибка создания Excel отчета: {e}")
-        return None
 
 # Обработчик команды /start
 @dp.message(Command("start"))
@@ -337,23 +344,31 @@ async def start_handler(message: Message, state: FSMContext):
             "✅ Вы авторизованы! Выберите действие:",
             reply_markup=get_main_keyboard()
         )
+    elif locked_until := await get_locked_until(message.chat.id):
+        await message.answer(f"⛔ Ввод пин-кода заблокирован до {format_time(locked_until, '%H:%M')}.")
     else:
         await message.answer(
             "⚠️ Вы не авторизованы. Введите пин-код:",
             reply_markup=get_pin_keyboard()
         )
         await state.set_state(PinCodeState.entering_pin)
-        await state.update_data(pin_buffer="", attempts=0)
+        await state.update_data(pin_buffer="")
 
 # Обработчик нажатия кнопки "Готово" для ввода пин-кода
 @dp.callback_query(PinCodeState.entering_pin)
 async def pin_handler(callback: CallbackQuery, state: FSMContext):
+    chat_id = callback.message.chat.id
+    # Блокировка хранится в базе с отметкой времени и проверяется на каждое нажатие
+    if locked_until := await get_locked_until(chat_id):
+        await state.clear()
+        await callback.answer(f"Ввод пин-кода заблокирован до {format_time(locked_until, '%H:%M')}.", show_alert=True)
+        return
     data = await state.get_data()
     pin_buffer = data.get('pin_buffer', '')
-    attempts = data.get('attempts', 0)
     if callback.data == "pin_done":
-        if len(pin_buffer) == 4 and bcrypt.checkpw(pin_buffer.encode(), PIN_CODE_HASH.encode()):
-            if save_chat_id(callback.message.chat.id):
+        if len(pin_buffer) == 4 and await check_pin(pin_buffer):
+            if await save_chat_id(chat_id):
+                await db.run(reset_failed_pin, chat_id, write=True)
                 await callback.message.answer(
                     "✅ Пин-код принят!",
                     reply_markup=get_main_keyboard()
@@ -361,18 +376,18 @@ async def pin_handler(callback: CallbackQuery, state: FSMContext):
                 await state.clear()
             return
         else:
-            attempts += 1
-            if attempts >= 3:
-                await callback.message.answer("Вы заблокированы на 5 минут.")
-                await state.set_state(PinCodeState.blocked)
-                await asyncio.sleep(300)
+            attempts_left, locked_until = await db.run(register_failed_pin, chat_id, write=True)
+            if locked_until:
+                await callback.message.answer(
+                    f"⛔ Вы заблокированы до {format_time(locked_until, '%H:%M')}."
+                )
                 await state.clear()
                 return
             await callback.message.answer(
-                f"❌ Неверный пин-код. Осталось попыток: {3 - attempts}",
+                f"❌ Неверный пин-код. Осталось попыток: {attempts_left}",
                 reply_markup=get_pin_keyboard()
             )
-            await state.update_data(pin_buffer="", attempts=attempts)
+            await state.update_data(pin_buffer="")
     else:
         pin_buffer += callback.data.split("_")[1]
         await state.update_data(pin_buffer=pin_buffer)
@@ -385,23 +400,157 @@ async def pin_handler(callback: CallbackQuery, state: FSMContext):
 # Обработчик команды /delme для удаления пользователя
 @dp.message(Command("delme"))
 async def delete_user_handler(message: Message):
-    if delete_chat_id(message.chat.id):
+    if await delete_chat_id(message.chat.id):
         await message.answer("✅ Вы удалены из системы.", reply_markup=get_start_keyboard())
     else:
         await message.answer("❌ Ошибка удаления.", reply_markup=get_start_keyboard())
 
+# Функция для удаления файла выгрузки, которую бот перестал ждать
+def remove_export_file(future):
+    if not future.cancelled() and future.exception() is None and future.result():
+        os.remove(future.result())
+
+
+# Обработчик команды /export: выгрузка сырых данных за период в файл
+@dp.message(Command("export"))
+async def export_handler(message: Message, command: CommandObject):
+    if not is_user_authorized(message.chat.id):
+        await message.answer("⚠️ Вы не авторизованы.", reply_markup=get_start_keyboard())
+        return
+    args = (command.args or "").split()
+    if not args:
+        await message.answer(EXPORT_USAGE_TEXT)
+        return
+    symbol = None if args[0].lower() == "market" else args[0].upper()
+    export_format = args[1].lower() if len(args) > 1 else "excel"
+    try:
+        since_ms = parse_date(args[2]) if len(args) > 2 else 0
+        # Дата окончания входит в период
+        until_ms = parse_date(args[3]) + DAY_MS if len(args) > 3 else None
+    except ValueError:
+        await message.answer(EXPORT_USAGE_TEXT)
+        return
+    if export_format not in EXPORT_EXTENSIONS:
+        await message.answer(EXPORT_USAGE_TEXT)
+        return
+
+    # У каждой выгрузки свой временный файл, поэтому запросы не объединяются
+    key = ("export", message.chat.id, message.message_id)
+    if report_pool_busy(key):
+        await message.answer(REPORT_POOL_BUSY_TEXT)
+        return
+    try:
+        path = await run_in_report_pool(key, create_export, export_format, symbol, since_ms, until_ms)
+    except asyncio.TimeoutError:
+        logger.error(f"Превышено время выгрузки {export_format.upper()} для {symbol or 'рынка'}")
+        # Файл опоздавшей выгрузки удаляется, когда процесс пула ее закончит
+        future = pending_reports.get(key)
+        if future is not None:
+            future.add_done_callback(remove_export_file)
+        path = None
+    except BrokenProcessPool:
+        logger.error(f"Процесс пула завершился при выгрузке {export_format.upper()} для {symbol or 'рынка'}")
+        path = None
+    if not path:
+        await message.answer(f"❌ Не удалось выгрузить данные в {export_format.upper()}.")
+        return
+    try:
+        filename = f"{symbol or 'market'}_export.{EXPORT_EXTENSIONS[export_format]}"
+        await message.answer_document(FSInputFile(path, filename=filename), caption="✅ Выгрузка готова.")
+    finally:
+        os.remove(path)
+
+# Обработчик команды /alert: подписка на пороговое уведомление
+@dp.message(Command("alert"))
+async def alert_handler(message: Message, command: CommandObject):
+    if not is_user_authorized(message.chat.id):
+        await message.answer("⚠️ Вы не авторизованы.", reply_markup=get_start_keyboard())
+        return
+    args = (command.args or "").split()
+    condition = parse_condition(args[1:]) if len(args) > 1 else None
+    if condition is None:
+        await message.answer(ALERT_USAGE_TEXT)
+        return
+    symbol = MARKET_SYMBOL if args[0].lower() == "market" else args[0].upper()
+    if symbol != MARKET_SYMBOL and latest_snapshot.get(symbol) is None:
+        await message.answer(f"❌ Данные по монете {symbol} не найдены.")
+        return
+    kind, threshold = condition
+    try:
+        if await db.run(count_subscriptions, message.chat.id) >= ALERTS_PER_CHAT:
+            await message.answer(f"❌ Не больше {ALERTS_PER_CHAT} подписок. Удалите лишние: /unalert <номер>.")
+            return
+        sub_id = await db.run(add_subscription, message.chat.id, symbol, kind, threshold, now_ms(), write=True)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения подписки: {e}")
+        await message.answer("❌ Ошибка сохранения подписки.")
+        return
+    await message.answer(f"✅ Подписка №{sub_id}: {describe(symbol, kind, threshold)}")
+
+# Обработчик команды /alerts: список подписок
+@dp.message(Command("alerts"))
+async def alerts_handler(message: Message):
+    if not is_user_authorized(message.chat.id):
+        await message.answer("⚠️ Вы не авторизованы.", reply_markup=get_start_keyboard())
+        return
+    rows = await db.run(chat_subscriptions, message.chat.id)
+    if not rows:
+        await message.answer("Подписок нет.\n" + ALERT_USAGE_TEXT)
+        return
+    lines = [f"№{sub_id}: {describe(symbol, kind, threshold)}" for sub_id, symbol, kind, threshold in rows]
+    await message.answer("Ваши подписки:\n" + "\n".join(lines))
+
+# Обработчик команды /unalert: удаление подписки по номеру или всех подписок
+@dp.message(Command("unalert"))
+async def unalert_handler(message: Message, command: CommandObject):
+    if not is_user_authorized(message.chat.id):
+        await message.answer("⚠️ Вы не авторизованы.", reply_markup=get_start_keyboard())
+        return
+    arg = (command.args or "").strip().lower()
+    if arg != "all" and not arg.isdigit():
+        await message.answer("Формат: /unalert <номер> или /unalert all")
+        return
+    sub_id = None if arg == "all" else int(arg)
+    try:
+        removed = await db.run(remove_subscriptions, message.chat.id, sub_id, write=True)
+    except Exception as e:
+        logger.error(f"Ошибка удаления подписки: {e}")
+        await message.answer("❌ Ошибка удаления подписки.")
+        return
+    await message.answer(f"✅ Удалено подписок: {removed}." if removed else "❌ Подписка не найдена.")
+
+# Обработчик команды /top: рейтинг пар по одному из показателей.
+# Рейтинги готовит сборщик при записи цикла, бот отвечает из памяти.
+@dp.message(Command("top"))
+async def top_handler(message: Message, command: CommandObject):
+    if not is_user_authorized(message.chat.id):
+        await message.answer("⚠️ Вы не авторизованы.", reply_markup=get_start_keyboard())
+        return
+    args = (command.args or "").lower().split()
+    metric = args[0] if args else "imbalance"
+    if metric not in TOP_METRICS or len(args) > 2 or (len(args) == 2 and not args[1].isdigit()):
+        await message.answer(TOP_USAGE_TEXT)
+        return
+    limit = min(int(args[1]), TOP_SIZE) if len(args) == 2 else 10
+    rows = top_movers.get(metric, limit)
+    if not rows:
+        await message.answer("❌ Рейтинг пока не рассчитан.")
+        return
+    value_format = TOP_VALUE_FORMATS.get(metric, "{:+.2f}")
+    lines = [
+        f"{rank}. {symbol}: {value_format.format(value)} (дисбаланс {dizbalance:.2f}%)"
+        for rank, (symbol, value, dizbalance) in enumerate(rows, start=1)
+    ]
+    await message.answer(
+        f"📊 Топ-{len(rows)} по {TOP_TITLES[metric]}\nВремя: {format_time(top_movers.time)}\n" + "\n".join(lines)
+    )
+
 # Обработчик нажатия на кнопку "Весь рынок"
 @dp.callback_query(F.data == "market_summary")
 async def market_summary_handler(callback: CallbackQuery):
-    with connect_to_db() as conn:
-        data = conn.execute("""
-            SELECT time, total_bid_volume, total_ask_volume, total_dizbalance
-            FROM market_summary
-            ORDER BY time DESC
-            LIMIT 1
-        """).fetchone()
+    data = latest_snapshot.get()
     if data:
-        time_str = datetime.strptime(data[0][:19], "%Y-%m-%dT%H:%M:%S").strftime("%d.%m.%Y %H:%M")
+        time_str = format_time(data[0])
         response = (
             "✅ Последний агрегированный отчет:\n"
             f"Время: {time_str}\n"
@@ -425,20 +574,10 @@ async def coin_data_handler(message: Message):
         await message.answer("❌ Тикер должен заканчиваться на 'USDT'.", reply_markup=get_main_keyboard())
         return
 
-    with connect_to_db() as conn:
-        data = conn.execute(
-            """
-            SELECT time, bid_volume, ask_volume, dizbalance
-            FROM market_pressure
-            WHERE symbol = ?
-            ORDER BY time DESC
-            LIMIT 1
-            """,
-            (symbol,)
-        ).fetchone()
+    data = latest_snapshot.get(symbol)
 
     if data:
-        time_str = datetime.strptime(data[0][:19], "%Y-%m-%dT%H:%M:%S").strftime("%d.%m.%Y %H:%M")
+        time_str = format_time(data[0])
         response = (
             f"✅ Данные по монете {symbol}:\n"
             f"Время: {time_str}\n"
@@ -454,29 +593,85 @@ async def coin_data_handler(message: Message):
         )
 
 
+# Функция для получения времени последних данных по монете или по рынку
+def get_latest_time(symbol=None):
+    data = latest_snapshot.get(symbol)
+    return data[0] if data else None
+
+
+# Функция для проверки, примет ли пул новую задачу с ключом key
+def report_pool_busy(key):
+    return key not in pending_reports and len(pending_reports) >= REPORT_QUEUE_LIMIT
+
+
+# Функция для замены пула, в котором аварийно завершился процесс (например, по нехватке памяти).
+# Сломанный пул отклоняет все задачи, поэтому он закрывается и создается новый;
+# одновременные ошибки одного пула заменяют его только один раз.
+def restart_report_pool(broken):
+    global report_pool
+    if report_pool is not broken:
+        return
+    logger.error("Процесс пула отчетов завершился аварийно, пул пересоздается.")
+    broken.shutdown(wait=False, cancel_futures=True)
+    report_pool = create_report_pool()
+
+
+# Функция для выполнения задачи в пуле процессов с ограничением по времени.
+# Одинаковые одновременные задачи (с одним ключом) выполняются один раз.
+# BrokenProcessPool передается вызывающему коду после замены пула.
+async def run_in_report_pool(key, func, *args):
+    pool = report_pool
+    try:
+        future = pending_reports.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(pool, func, *args)
+            pending_reports[key] = future
+            # Задача считается в очереди, пока процесс пула действительно занят ею
+            future.add_done_callback(lambda _: pending_reports.pop(key, None))
+        return await asyncio.wait_for(asyncio.shield(future), REPORT_TIMEOUT)
+    except BrokenProcessPool:
+        restart_report_pool(pool)
+        raise
+
+
 @dp.callback_query()
 async def report_handler(callback: CallbackQuery):
     action, *params = callback.data.split('_')
     symbol = params[1] if len(params) > 1 else None
-    match action:
-        case 'excel':
-            report = create_excel_report(symbol)
-        case 'pdf':
-            report = create_pdf_report(symbol)
-        case 'png':
-            report = create_png_report(symbol)
-        case _:
+    if action not in REPORT_EXTENSIONS:
+        return
+    latest_time = get_latest_time(symbol)
+    report = report_cache.get(ReportCache.make_key(symbol, action, latest_time))
+    if report is None:
+        # PNG и PDF строятся одной задачей, поэтому одновременные запросы
+        # обоих форматов ждут один и тот же график
+        key = ReportCache.make_key(symbol, "chart" if action in CHART_FORMATS else action, latest_time)
+        if report_pool_busy(key):
+            REPORT_REQUESTS.inc(format=action, result="busy")
+            await callback.message.answer(REPORT_POOL_BUSY_TEXT)
             return
+        try:
+            with REPORT_SECONDS.time(format=action):
+                reports = await run_in_report_pool(key, render_report, action, symbol)
+            REPORT_REQUESTS.inc(format=action, result="rendered")
+        except asyncio.TimeoutError:
+            REPORT_REQUESTS.inc(format=action, result="timeout")
+            logger.error(f"Превышено время построения {action.upper()} отчета для {symbol or 'рынка'}")
+            reports = {}
+        except BrokenProcessPool:
+            REPORT_REQUESTS.inc(format=action, result="failed")
+            logger.error(f"Процесс пула завершился при построении {action.upper()} отчета для {symbol or 'рынка'}")
+            reports = {}
+        for report_format, data in reports.items():
+            report_cache.put(ReportCache.make_key(symbol, report_format, latest_time), data)
+        report = reports.get(action)
+    else:
+        REPORT_REQUESTS.inc(format=action, result="cached")
+    logger.info(f"Кэш отчетов: {report_cache.stats()}")
     if report:
         method = callback.message.answer_document if action != 'png' else callback.message.answer_photo
-        await method(FSInputFile(report), caption=f"✅ {action.upper()} отчет сформирован.")
-
-        # Удаляем файл после отправки
-        try:
-            os.remove(report)
-            logger.info(f"Файл {report} успешно удален.")
-        except Exception as e:
-            logger.error(f"Ошибка удаления файла {report}: {e}")
+        filename = f"{symbol or 'market'}_report.{REPORT_EXTENSIONS[action]}"
+        await method(BufferedInputFile(report, filename=filename), caption=f"✅ {action.upper()} отчет сформирован.")
     else:
         await callback.message.answer(f"❌ Не удалось создать {action.upper()} отчет.")
 
@@ -512,6 +707,14 @@ def get_start_keyboard():
 
 # Запуск бота
 if __name__ == "__main__":
-    with connect_to_db() as conn:
+    setup_logging()
+    conn = connect_to_db()
+    if conn:
         create_tables_if_not_exist(conn)
-    dp.run_polling(bot)
\ No newline at end of file
+        conn.close()
+    try:
+        dp.run_polling(bot)
+    finally:
+        report_pool.shutdown(cancel_futures=True)
+        pin_executor.shutdown()
+        db.close()
\ No newline at end of file
@@ -0,0 +1,126 @@
+# Потоковая выгрузка рядов дисбаланса в файлы Excel, CSV и Parquet.
+# Строки читаются из курсора порциями по EXPORT_CHUNK_ROWS и сразу пишутся
+# в файл, поэтому расход памяти не зависит от размера таблицы и периода.
+import csv
+import logging
+import os
+import tempfile
+from itertools import chain
+
+from openpyxl import Workbook
+
+from retention import archive_boundary, archived_chunks
+from rollups import MAX_TIME, RAW, query_series
+from time_utils import DISPLAY_TIMEZONE, to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Строк в одной порции чтения и записи
+EXPORT_CHUNK_ROWS = 5000
+# Лимит строк листа Excel без заголовка
+EXCEL_MAX_ROWS = 1_048_575
+# Формат времени в Excel и CSV
+EXPORT_TIME_FORMAT = "%Y.%m.%d %H:%M"
+
+# Расширения файлов выгрузки
+EXPORT_EXTENSIONS = {"excel": "xlsx", "csv": "csv", "parquet": "parquet"}
+
+
+# Функция для получения заголовков колонок выгрузки по монете или по рынку
+def export_columns(symbol=None):
+    if symbol:
+        return ["Time", "Bid", "Ask", "Dizbalance"]
+    return ["Time", "Total Bid", "Total Ask", "Total Dizbalance"]
+
+
+# Функция для чтения курсора порциями
+def iter_chunks(cursor, size=EXPORT_CHUNK_ROWS):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+# Функция для перевода времени порции в строки часового пояса отображения
+def format_chunk(rows):
+    return [(to_datetime(row[0]).strftime(EXPORT_TIME_FORMAT), *row[1:]) for row in rows]
+
+
+# Функция для записи CSV
+def write_csv(path, columns, chunks):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(format_chunk(rows))
+
+
+# Функция для записи Excel в режиме write_only: openpyxl не хранит
+# лист в памяти, а сразу сериализует добавленные строки.
+# path — путь к файлу или файловый объект (например, io.BytesIO)
+def write_excel(path, columns, chunks):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Dizbalance")
+    sheet.append(columns)
+    written = 0
+    for rows in chunks:
+        rows = rows[:EXCEL_MAX_ROWS - written]
+        for row in format_chunk(rows):
+            sheet.append(row)
+        written += len(rows)
+        if written >= EXCEL_MAX_ROWS:
+            logger.warning(f"Выгрузка Excel обрезана до {EXCEL_MAX_ROWS} строк")
+            break
+    workbook.save(path)
+
+
+# Функция для записи Parquet: каждая порция — отдельная группа строк.
+# Время хранится как timestamp с часовым поясом отображения.
+def write_parquet(path, columns, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [(columns[0], pa.timestamp("ms", tz=DISPLAY_TIMEZONE.zone))]
+        + [(name, pa.float64()) for name in columns[1:]]
+    )
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for rows in chunks:
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema,
+            ))
+
+
+EXPORT_WRITERS = {
+    "excel": write_excel,
+    "csv": write_csv,
+    "parquet": write_parquet,
+}
+
+
+# Функция для выгрузки ряда по монете или по рынку за [since_ms, until_ms) в файл path.
+# Сырые данные раньше границы архива читаются из месячных файлов Parquet (см. retention.py).
+def export_series(conn, path, export_format, symbol=None, since_ms=0, until_ms=None, resolution=RAW):
+    chunks = ()
+    if resolution == RAW:
+        until_ms = MAX_TIME if until_ms is None else until_ms
+        boundary = archive_boundary(conn)
+        if since_ms < boundary:
+            chunks = archived_chunks(conn, symbol, since_ms, min(until_ms, boundary))
+            since_ms = boundary
+    cursor = query_series(conn, symbol, since_ms, resolution, until_ms)
+    EXPORT_WRITERS[export_format](path, export_columns(symbol), chain(chunks, iter_chunks(cursor)))
+
+
+# Функция для выгрузки во временный файл. Файл удаляет вызывающий код.
+def export_to_tempfile(conn, export_format, symbol=None, since_ms=0, until_ms=None, resolution=RAW):
+    fd, path = tempfile.mkstemp(suffix=f".{EXPORT_EXTENSIONS[export_format]}", prefix="export_")
+    os.close(fd)
+    try:
+        export_series(conn, path, export_format, symbol, since_ms, until_ms, resolution)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
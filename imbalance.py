@@ -0,0 +1,117 @@
+# Векторизованный расчет дисбаланса по стаканам всех пар сразу.
+# Стаканы цикла один раз разбираются в плоские массивы NumPy, после чего
+# объемы по каждой паре считаются через np.bincount без циклов на Python.
+import math
+import re
+
+import numpy as np
+
+# Глубина (число уровней с каждой стороны), по которой считается основной dizbalance
+ANALYSIS_DEPTH = 100
+
+# Ценовые диапазоны от середины спреда: колонка -> доля от mid
+BANDS = {
+    "dizbalance_0_5": 0.005,
+    "dizbalance_1": 0.01,
+    "dizbalance_5": 0.05,
+}
+
+# Колонки market_pressure после symbol в порядке записи
+PRESSURE_COLUMNS = (
+    "bid_volume",
+    "ask_volume",
+    "dizbalance",
+    *BANDS,
+    "bid_notional",
+    "ask_notional",
+)
+
+
+# Начало списка уровней в теле ответа /fapi/v1/depth
+_LEVELS_START = re.compile(r'"(bids|asks)"\s*:\s*\[')
+# Символы JSON, которые заменяются пробелами перед разбором чисел
+_LEVEL_SEPARATORS = str.maketrans('[],"', "    ")
+
+
+# Функция для разбора тела ответа /fapi/v1/depth сразу в массивы (цена, объем).
+# Обходит json.loads и float() для каждой строки: числа читает np.fromstring.
+def parse_depth_response(text):
+    book = {"bids": np.empty((0, 2)), "asks": np.empty((0, 2))}
+    for match in _LEVELS_START.finditer(text):
+        start = match.end()
+        end = start if text.startswith("]", start) else text.index("]]", start)
+        levels = text[start:end].translate(_LEVEL_SEPARATORS)
+        book[match.group(1)] = np.fromstring(levels, sep=" ").reshape(-1, 2)
+    return book
+
+
+# Функция для расчета дисбаланса в процентах с защитой от деления на ноль
+def imbalance_percent(bid_volume, ask_volume):
+    total = bid_volume + ask_volume
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, (bid_volume - ask_volume) / np.where(total > 0, total, 1) * 100, 0.0)
+
+
+# Функция для разбора одной стороны всех стаканов в плоские массивы
+def _parse_side(books, key):
+    levels = [np.asarray(book[key], dtype=np.float64).reshape(-1, 2) for book in books]
+    counts = np.fromiter((len(side) for side in levels), dtype=np.intp, count=len(levels))
+    flat = np.concatenate(levels)
+    owner = np.repeat(np.arange(len(levels)), counts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    level = np.arange(len(owner)) - np.repeat(starts, counts)
+    return flat[:, 0], flat[:, 1], owner, starts, level
+
+
+# Функция для расчета всех колонок market_pressure по стаканам цикла.
+# order_books — словарь symbol -> стакан с ключами bids/asks: уровни от спреда
+# вглубь, массивы из parse_depth_response или списки [цена, объем].
+# Возвращает список пар и словарь колонка -> массив значений.
+def analyze_order_books(order_books):
+    symbols = [symbol for symbol, book in order_books.items() if book and len(book["bids"]) and len(book["asks"])]
+    columns = {name: np.zeros(len(symbols)) for name in PRESSURE_COLUMNS}
+    if not symbols:
+        return symbols, columns
+    books = [order_books[symbol] for symbol in symbols]
+    n = len(symbols)
+
+    bid_price, bid_qty, bid_owner, bid_starts, bid_level = _parse_side(books, "bids")
+    ask_price, ask_qty, ask_owner, ask_starts, ask_level = _parse_side(books, "asks")
+    mid = (bid_price[bid_starts] + ask_price[ask_starts]) / 2
+
+    bid_top = bid_level < ANALYSIS_DEPTH
+    ask_top = ask_level < ANALYSIS_DEPTH
+    columns["bid_volume"] = np.bincount(bid_owner, weights=bid_qty * bid_top, minlength=n)
+    columns["ask_volume"] = np.bincount(ask_owner, weights=ask_qty * ask_top, minlength=n)
+    columns["dizbalance"] = imbalance_percent(columns["bid_volume"], columns["ask_volume"])
+    columns["bid_notional"] = np.bincount(bid_owner, weights=bid_price * bid_qty * bid_top, minlength=n)
+    columns["ask_notional"] = np.bincount(ask_owner, weights=ask_price * ask_qty * ask_top, minlength=n)
+
+    # Диапазоны считаются по всей загруженной глубине. Если загруженные уровни
+    # хотя бы одной стороны не доходят до границы диапазона, объем в нем неизвестен,
+    # и значение остается пустым (NaN, в базе — NULL), а не повторяет верхние уровни.
+    bid_distance = (mid[bid_owner] - bid_price) / mid[bid_owner]
+    ask_distance = (ask_price - mid[ask_owner]) / mid[ask_owner]
+    bid_reach = bid_distance[np.append(bid_starts[1:], len(bid_owner)) - 1]
+    ask_reach = ask_distance[np.append(ask_starts[1:], len(ask_owner)) - 1]
+    for name, band in BANDS.items():
+        bid_band = np.bincount(bid_owner, weights=bid_qty * (bid_distance <= band), minlength=n)
+        ask_band = np.bincount(ask_owner, weights=ask_qty * (ask_distance <= band), minlength=n)
+        reached = (bid_reach >= band) & (ask_reach >= band)
+        columns[name] = np.where(reached, imbalance_percent(bid_band, ask_band), np.nan)
+    return symbols, columns
+
+
+# Функция для перевода колонки в список значений: пустые диапазоны (NaN) записываются как NULL
+def _column_values(column):
+    return [None if math.isnan(value) else value for value in column.tolist()]
+
+
+# Функция для преобразования результата в строки для записи и агрегат по рынку
+def pressure_rows(symbols, columns):
+    values = [_column_values(columns[name]) for name in PRESSURE_COLUMNS]
+    pair_rows = list(zip(symbols, *values))
+    total_bid_volume = float(columns["bid_volume"].sum())
+    total_ask_volume = float(columns["ask_volume"].sum())
+    total_dizbalance = float(imbalance_percent(np.float64(total_bid_volume), np.float64(total_ask_volume)))
+    return pair_rows, (total_bid_volume, total_ask_volume, total_dizbalance)
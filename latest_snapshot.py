@@ -0,0 +1,68 @@
+# Последние значения по каждой паре и по рынку в целом.
+# Сборщик обновляет таблицу latest_pressure в той же транзакции, что и данные
+# цикла, поэтому запрос последних данных — чтение по первичному ключу, которое
+# не зависит от объема истории. Бот держит копию таблицы в памяти
+# (LatestSnapshot) и перечитывает ее, только когда появился новый цикл.
+
+# Ключ строки с агрегатом по всему рынку
+MARKET_SYMBOL = "*"
+
+LATEST_UPSERT_SQL = """
+    INSERT INTO latest_pressure (symbol, time, bid_volume, ask_volume, dizbalance)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (symbol) DO UPDATE SET
+        time = excluded.time,
+        bid_volume = excluded.bid_volume,
+        ask_volume = excluded.ask_volume,
+        dizbalance = excluded.dizbalance
+    WHERE excluded.time >= latest_pressure.time
+"""
+
+
+# Функция для обновления последних значений по данным одного цикла.
+# Вызывается внутри транзакции записи цикла.
+def update_latest(conn, cycle_time, pair_rows, summary):
+    conn.executemany(LATEST_UPSERT_SQL, [
+        (symbol, cycle_time, bid_volume, ask_volume, dizbalance)
+        for symbol, bid_volume, ask_volume, dizbalance, *_ in pair_rows
+    ])
+    conn.execute(LATEST_UPSERT_SQL, (MARKET_SYMBOL, cycle_time, *summary))
+
+
+# Функция для чтения последней строки (time, bid_volume, ask_volume, dizbalance)
+# по монете или по рынку (symbol=None)
+def fetch_latest(conn, symbol=None):
+    return conn.execute(
+        "SELECT time, bid_volume, ask_volume, dizbalance FROM latest_pressure WHERE symbol = ?",
+        (symbol or MARKET_SYMBOL,),
+    ).fetchone()
+
+
+# Копия latest_pressure в памяти процесса бота
+class LatestSnapshot:
+    def __init__(self):
+        self.rows = {}
+        self.loaded = False
+
+    def load(self, conn):
+        self.rows = {
+            row[0]: row[1:] for row in conn.execute(
+                "SELECT symbol, time, bid_volume, ask_volume, dizbalance FROM latest_pressure"
+            )
+        }
+        self.loaded = True
+
+    # Перечитывание таблицы, если сборщик записал новый цикл.
+    # Новый цикл всегда обновляет строку рынка, поэтому достаточно сравнить ее время.
+    # Возвращает True, если таблица была перечитана.
+    def refresh(self, conn):
+        latest = fetch_latest(conn)
+        current = self.get()
+        if self.loaded and (latest and latest[0]) == (current and current[0]):
+            return False
+        self.load(conn)
+        return True
+
+    # Последняя строка (time, bid_volume, ask_volume, dizbalance) или None
+    def get(self, symbol=None):
+        return self.rows.get(symbol or MARKET_SYMBOL)
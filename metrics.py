@@ -0,0 +1,238 @@
+# Метрики сборщика и бота в текстовом формате Prometheus.
+# Каждый процесс держит свои счетчики и гистограммы в памяти (REGISTRY)
+# и отдает их локальным HTTP-сервером на aiohttp:
+#   GET /metrics         — все метрики процесса;
+#   POST /profile/start  — включить выборочный профилировщик (?interval=0.005, сек);
+#   POST /profile/stop   — выключить и получить свернутые стеки
+#                          (формат flamegraph.pl и speedscope).
+# Порт 0 отключает сервер.
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+
+from aiohttp import web
+
+# Границы гистограмм по умолчанию, сек
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Период выборки стеков профилировщиком по умолчанию, сек
+PROFILE_INTERVAL = 0.005
+
+REGISTRY = []
+
+
+# Функция для экранирования значения метки
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# Функция для форматирования набора меток {name="value",...}
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+# Общая часть метрик: имя, описание, метки и значения по наборам меток
+class Metric:
+    kind = ""
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    # Метрика без значений не выводится: процесс показывает только свои метрики
+    def render(self):
+        if not self.values:
+            return []
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.values.items()):
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{format_labels(self.labels, key)} {value}"]
+
+
+# Монотонно растущий счетчик
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+# Текущее значение
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+
+# Гистограмма: число наблюдений по границам, сумма и количество
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        counts = self.values.get(key)
+        if counts is None:
+            counts = self.values[key] = [0] * len(self.buckets) + [0, 0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-2] += 1
+        counts[-1] += value
+
+    # Замер длительности блока with (подходит и для блоков с await)
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_value(self, key, counts):
+        lines = [
+            f"{self.name}_bucket{format_labels(self.labels, key, [('le', bound)])} {count}"
+            for bound, count in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_bucket{format_labels(self.labels, key, [('le', '+Inf')])} {counts[-2]}")
+        lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {counts[-1]}")
+        lines.append(f"{self.name}_count{format_labels(self.labels, key)} {counts[-2]}")
+        return lines
+
+
+# Запросы к Binance: общие для циклов сбора и реестра пар
+BINANCE_REQUESTS = Counter("binance_requests_total", "Запросы к Binance", ("endpoint",))
+BINANCE_ERRORS = Counter(
+    "binance_http_errors_total", "Ошибки запросов к Binance: HTTP-статус или тип сетевой ошибки",
+    ("endpoint", "status"),
+)
+BINANCE_REQUEST_WEIGHT = Counter("binance_request_weight_total", "Вес отправленных запросов по таблице Binance",
+                                 ("endpoint",))
+BINANCE_USED_WEIGHT = Gauge("binance_used_weight_1m", "Использованный вес за минуту (X-MBX-USED-WEIGHT-1M)")
+
+
+# Функция для учета ответа Binance: статус и заголовок использованного веса
+def record_binance_response(endpoint, status, headers):
+    if status != 200:
+        BINANCE_ERRORS.inc(endpoint=endpoint, status=status)
+    used_weight = headers.get("X-MBX-USED-WEIGHT-1M")
+    if used_weight is not None and used_weight.isdigit():
+        BINANCE_USED_WEIGHT.set(int(used_weight))
+
+
+# Функция для вывода всех метрик процесса в текстовом формате Prometheus
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Выборочный профилировщик: отдельный поток раз в interval снимает стеки
+# всех остальных потоков через sys._current_frames. Включается на время
+# по запросу и почти не влияет на работу, пока выключен.
+class SamplingProfiler:
+    def __init__(self):
+        self.samples = StackCounter()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.interval = PROFILE_INTERVAL
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self, interval=PROFILE_INTERVAL):
+        if self.running:
+            return False
+        self.samples.clear()
+        self.interval = interval
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+        return True
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self.stop_event.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    # Остановка и результат: строки «стек;через;точку_с_запятой число_выборок»
+    def stop(self):
+        if not self.running:
+            return ""
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+profiler = SamplingProfiler()
+
+# Тип содержимого текстового формата экспозиции Prometheus
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+async def metrics_handler(request):
+    return web.Response(text=render_metrics(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+
+async def profile_start_handler(request):
+    try:
+        interval = float(request.query.get("interval", PROFILE_INTERVAL))
+    except ValueError:
+        return web.Response(status=400, text="interval должен быть числом\n")
+    if not profiler.start(max(interval, 0.001)):
+        return web.Response(status=409, text="Профилировщик уже запущен\n")
+    return web.Response(text=f"Профилировщик запущен, период {profiler.interval} с\n")
+
+
+async def profile_stop_handler(request):
+    if not profiler.running:
+        return web.Response(status=409, text="Профилировщик не запущен\n")
+    return web.Response(text=profiler.stop())
+
+
+# Функция для запуска сервера метрик в текущем цикле событий.
+# Возвращает AppRunner (runner.cleanup() останавливает сервер) или None, если port = 0.
+async def start_metrics_server(port, host="127.0.0.1"):
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_post("/profile/start", profile_start_handler)
+    app.router.add_post("/profile/stop", profile_stop_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
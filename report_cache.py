@@ -0,0 +1,58 @@
+# Кэш готовых отчетов в памяти (LRU с ограничением по размеру).
+# Ключ содержит время последних данных, поэтому новый цикл сбора
+# автоматически делает прежние отчеты неактуальными.
+from collections import OrderedDict
+
+from configs import REPORT_CACHE_MAX_BYTES, REPORT_CACHE_MAX_ITEMS
+
+
+class ReportCache:
+    def __init__(self, max_bytes=REPORT_CACHE_MAX_BYTES, max_items=REPORT_CACHE_MAX_ITEMS):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    # Ключ отчета: монета (None — весь рынок), формат и время последних данных
+    @staticmethod
+    def make_key(symbol, report_format, latest_time):
+        return symbol, report_format, latest_time
+
+    # Получение отчета из кэша с обновлением порядка LRU
+    def get(self, key):
+        data = self.items.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return data
+
+    # Сохранение отчета: устаревшие версии того же отчета удаляются сразу,
+    # при превышении лимитов вытесняются давно не использованные
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        symbol, report_format, _ = key
+        for stale in [k for k in self.items if k[:2] == (symbol, report_format) and k != key]:
+            self._remove(stale)
+        if key in self.items:
+            self._remove(key)
+        self.items[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes or len(self.items) > self.max_items:
+            self._remove(next(iter(self.items)))
+
+    def _remove(self, key):
+        self.size -= len(self.items.pop(key))
+
+    # Статистика для журнала
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "items": len(self.items),
+            "bytes": self.size,
+        }
@@ -0,0 +1,215 @@
+# Построение отчетов (PNG, PDF, Excel) по данным из базы.
+# Модуль не зависит от бота: функции выполняются в отдельных процессах
+# пула (см. disbalancebot.py), чтобы рендеринг matplotlib и pandas
+# не блокировал цикл событий aiogram.
+import io
+import logging
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+from matplotlib.collections import PolyCollection
+from matplotlib.dates import DateFormatter, HourLocator, date2num
+from matplotlib.figure import Figure
+
+from configs import DATABASE_NAME, DB_BUSY_TIMEOUT
+from exports import export_series, export_to_tempfile
+from rollups import CYCLE_MS, DAY_MS, choose_resolution, fetch_series, first_time
+from time_utils import DISPLAY_TIMEZONE, now_ms
+
+logger = logging.getLogger(__name__)
+
+# Окно графиков и предельное число точек/строк в отчетах.
+# Разрешение ряда (15 минут, час или день) подбирается под эти пределы.
+CHART_WINDOW_DAYS = 30
+CHART_MAX_POINTS = 1000
+REPORT_MAX_ROWS = 2000
+
+# Форматы, которые сохраняются из одной фигуры графика
+CHART_FORMATS = ("png", "pdf")
+# Параметры сохранения по форматам: быстрое сжатие PNG вдвое сокращает
+# кодирование ценой примерно трети к размеру файла
+SAVE_OPTIONS = {"png": {"pil_kwargs": {"compress_level": 1}}}
+# Столбцов на графике не больше, чем помещается на ширине оси (около 1700 пикселей)
+CHART_MAX_BARS = 1500
+
+
+# Функция для подключения к базе данных только для чтения,
+# с теми же настройками, что у соединений бота для чтения (db_access.py)
+def connect_to_db():
+    conn = sqlite3.connect(DATABASE_NAME)
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}")
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+# Функция для загрузки ряда для графика за CHART_WINDOW_DAYS дней
+def load_chart_data(symbol=None):
+    window_ms = CHART_WINDOW_DAYS * DAY_MS
+    resolution = choose_resolution(window_ms, CHART_MAX_POINTS)
+    with closing(connect_to_db()) as conn:
+        series = fetch_series(conn, symbol, now_ms() - window_ms, resolution)
+    return [(row[0], row[3]) for row in series], resolution
+
+
+# Функция для прореживания ряда до max_points столбцов: из каждой группы
+# соседних точек остается значение с наибольшим модулем, чтобы не терять всплески
+def decimate(times, values, max_points):
+    step = -(-len(values) // max_points)
+    if step <= 1:
+        return times, values
+    size = len(values) // step * step
+    groups = values[:size].reshape(-1, step)
+    picked = np.abs(groups).argmax(axis=1) + np.arange(0, size, step)
+    if size < len(values):
+        tail = size + np.abs(values[size:]).argmax()
+        picked = np.append(picked, tail)
+    return times[picked], values[picked]
+
+
+# Заготовка фигуры графика: фигура, оси, оформление и одна коллекция
+# прямоугольников для всех столбцов создаются один раз на процесс, а каждый
+# график только подменяет вершины, цвет, пределы осей и заголовок.
+# Фигура общая, поэтому ее нужно сохранить до построения следующего графика.
+class ChartTemplate:
+    def __init__(self):
+        # Фигура создается без pyplot: у нее нет глобального состояния, и ее не нужно закрывать
+        self.fig = Figure(figsize=(20, 8))
+        self.ax = self.fig.add_subplot()
+        self.bars = PolyCollection([], edgecolor="black", linewidth=0.2)
+        self.ax.add_collection(self.bars)
+        self.ax.xaxis.set_major_formatter(DateFormatter("%d.%m"))
+        self.ax.xaxis.set_major_locator(HourLocator(interval=24))
+        self.title = self.ax.set_title("", fontsize=14, pad=20)
+        # Размер фигуры и подписи не меняются, поэтому поля считаются один раз
+        # по типичному графику, а не на каждом построении
+        self.update(np.array([0.0, CHART_WINDOW_DAYS]), np.array([-100.0, 100.0]), 1.0, "#FF6B6B",
+                    f"Дисбаланс рынка за {CHART_WINDOW_DAYS} дней")
+        # Поворот подписей дат задается один раз: новые деления оси
+        # копируют оформление первого деления
+        self.ax.tick_params(axis="x", labelrotation=45)
+        for label in self.ax.get_xticklabels():
+            label.set_horizontalalignment("right")
+        self.fig.tight_layout()
+        # tight_layout оставляет фигуре заглушку движка компоновки, из-за которой
+        # savefig рисует фигуру дважды; поля уже рассчитаны, движок не нужен
+        self.fig.set_layout_engine(None)
+
+    # Функция для замены данных графика: times — даты в днях matplotlib,
+    # width — ширина столбца в днях
+    def update(self, times, values, width, color, title):
+        left, right = times - width / 2, times + width / 2
+        zeros = np.zeros_like(values)
+        verts = np.stack([
+            np.column_stack([left, zeros]),
+            np.column_stack([left, values]),
+            np.column_stack([right, values]),
+            np.column_stack([right, zeros]),
+        ], axis=1)
+        self.bars.set_verts(verts)
+        self.bars.set_facecolor(color)
+        self.title.set_text(title)
+        # Пределы осей по данным с обычными полями matplotlib
+        self.ax.ignore_existing_data_limits = True
+        if len(values):
+            self.ax.update_datalim([(left.min(), min(values.min(), 0)), (right.max(), max(values.max(), 0))])
+        self.ax.autoscale_view()
+
+
+# Заготовка графика процесса пула (создается при построении первого графика)
+_chart_template = None
+
+
+# Функция для получения заготовки графика текущего процесса
+def get_chart_template():
+    global _chart_template
+    if _chart_template is None:
+        _chart_template = ChartTemplate()
+    return _chart_template
+
+
+# Функция для построения графика дисбаланса на общей заготовке (ChartTemplate).
+# Все столбцы рисуются одной коллекцией, плотный ряд прореживается до CHART_MAX_BARS.
+def generate_chart(data, title, color, resolution=0):
+    # Время хранится в миллисекундах UTC: переводим весь столбец разом, без разбора строк
+    times = pd.to_datetime([row[0] for row in data], unit="ms", utc=True).tz_convert(DISPLAY_TIMEZONE).tz_localize(None)
+    times = date2num(times.to_numpy())
+    values = np.array([row[1] for row in data], dtype=float)
+    width = (resolution or CYCLE_MS) / DAY_MS
+    if len(values) > CHART_MAX_BARS:
+        width *= -(-len(values) // CHART_MAX_BARS)
+        times, values = decimate(times, values, CHART_MAX_BARS)
+
+    # Формируем название графика
+    if "USDT" in title:
+        chart_title = f"Дисбаланс {title.strip()} за {CHART_WINDOW_DAYS} дней"
+    else:
+        chart_title = f"Дисбаланс рынка за {CHART_WINDOW_DAYS} дней"
+
+    template = get_chart_template()
+    template.update(times, values, 0.8 * width, color, chart_title)
+    return template.fig
+
+
+# Функция для сохранения одной фигуры в нескольких форматах в памяти
+def save_figure(fig, formats):
+    result = {}
+    for report_format in formats:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=report_format, dpi=100, **SAVE_OPTIONS.get(report_format, {}))
+        result[report_format] = buffer.getvalue()
+    return result
+
+
+# Функция для создания отчетов-графиков (PNG, PDF): данные читаются
+# и график строится один раз, затем сохраняется во всех форматах
+def create_chart_reports(symbol=None, formats=CHART_FORMATS):
+    try:
+        data, resolution = load_chart_data(symbol)
+        fig = generate_chart(
+            data,
+            f" {symbol if symbol else ''} ",
+            "#4ECDC4" if symbol else "#FF6B6B",
+            resolution
+        )
+        return save_figure(fig, formats)
+    except Exception as e:
+        logger.error(f"Ошибка создания отчета {'/'.join(formats).upper()}: {e}")
+        return {}
+
+
+# Функция для создания Excel отчета: вся история в разрешении,
+# при котором отчет укладывается в REPORT_MAX_ROWS строк. Отчет ограничен
+# по размеру, поэтому книга пишется сразу в память, без временного файла.
+def create_excel_report(symbol=None):
+    try:
+        with closing(connect_to_db()) as conn:
+            since = first_time(conn, symbol) or now_ms()
+            resolution = choose_resolution(now_ms() - since, REPORT_MAX_ROWS)
+            buffer = io.BytesIO()
+            export_series(conn, buffer, "excel", symbol, since, resolution=resolution)
+        return buffer.getvalue()
+    except Exception as e:
+        logger.error(f"Ошибка создания Excel отчета: {e}")
+        return None
+
+
+# Функция для выгрузки сырых данных за период во временный файл.
+# Возвращает путь к файлу; файл удаляет бот после отправки.
+def create_export(export_format, symbol=None, since_ms=0, until_ms=None):
+    try:
+        with closing(connect_to_db()) as conn:
+            return export_to_tempfile(conn, export_format, symbol, since_ms, until_ms)
+    except Exception as e:
+        logger.error(f"Ошибка выгрузки {export_format.upper()}: {e}")
+        return None
+
+
+# Функция для построения отчета в процессе пула.
+# Возвращает словарь формат -> байты: запрос графика сразу дает
+# все форматы CHART_FORMATS, чтобы следующий формат взять из кэша.
+def render_report(report_format, symbol=None):
+    if report_format in CHART_FORMATS:
+        return create_chart_reports(symbol)
+    report = create_excel_report(symbol)
+    return {report_format: report} if report else {}
@@ -0,0 +1,231 @@
+# Срок хранения сырых данных и месячные архивы Parquet.
+# Сырые строки market_pressure и market_summary хранятся в базе RETENTION_DAYS дней.
+# Полностью устаревшие календарные месяцы переносятся в сжатые файлы
+# ARCHIVE_DIR/market_pressure_ГГГГ-ММ.parquet и market_summary_ГГГГ-ММ.parquet,
+# после чего строки удаляются из базы, а освободившиеся страницы возвращаются
+# системе через PRAGMA incremental_vacuum. Часовые и дневные агрегаты остаются
+# в базе (часовые — HOURLY_RETENTION_DAYS дней), поэтому графики и отчеты
+# по длинным периодам строятся как раньше, а выгрузки сырых данных
+# дочитывают архивные месяцы из Parquet (см. archived_chunks).
+#
+# Архив покрывает все время раньше archive_boundary: сначала пишутся файлы
+# и строка в archive_months, затем строки удаляются порциями по дню.
+# Строки раньше границы читатели не используют, поэтому сбой между
+# архивированием и удалением не дает дублей — удаление доделает следующий запуск.
+# Запуск вручную: python retention.py [--vacuum]
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from configs import ARCHIVE_DIR, DATABASE_NAME, HOURLY_RETENTION_DAYS, RETENTION_DAYS
+from db_schema import MARKET_PRESSURE_COLUMNS, MARKET_SUMMARY_COLUMNS, enable_wal
+from rollups import DAY_MS, HOUR_MS, MAX_TIME
+from time_utils import DISPLAY_TIMEZONE, format_time, now_ms, to_datetime
+
+# Строк в одной группе строк Parquet
+ARCHIVE_ROW_GROUP = 50_000
+# Режим PRAGMA auto_vacuum, при котором работает incremental_vacuum
+AUTO_VACUUM_INCREMENTAL = 2
+
+ARCHIVE_TABLES = {
+    "market_pressure": MARKET_PRESSURE_COLUMNS,
+    "market_summary": MARKET_SUMMARY_COLUMNS,
+}
+
+
+class RetentionResult:
+    def __init__(self):
+        self.archived = []
+        self.deleted = 0
+        self.freed_pages = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        months = ", ".join(self.archived) or "нет"
+        return (f"архивировано месяцев: {months}, удалено строк {self.deleted}, "
+                f"освобождено страниц {self.freed_pages}, за {self.elapsed:.2f} с")
+
+
+# Функция для получения начала календарного месяца (в часовом поясе отображения),
+# в который попадает отметка времени
+def month_start(ms):
+    moment = to_datetime(ms)
+    return round(DISPLAY_TIMEZONE.localize(datetime(moment.year, moment.month, 1)).timestamp() * 1000)
+
+
+# Функция для получения начала следующего месяца
+def next_month(ms):
+    moment = to_datetime(ms)
+    year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+    return round(DISPLAY_TIMEZONE.localize(datetime(year, month, 1)).timestamp() * 1000)
+
+
+# Функция для получения пути к архиву таблицы за месяц
+def archive_path(table, month, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, f"{table}_{format_time(month, '%Y-%m')}.parquet")
+
+
+# Функция для получения границы архива: все сырые данные раньше нее — в Parquet
+def archive_boundary(conn):
+    return conn.execute("SELECT COALESCE(MAX(month_end), 0) FROM archive_months").fetchone()[0]
+
+
+# Функция для записи строк таблицы за [since_ms, until_ms) в Parquet.
+# Строки market_pressure упорядочены по паре и времени: статистика групп строк
+# позволяет при чтении одной пары пропускать чужие группы.
+# Файл пишется во временный и переименовывается, недописанный архив не появится.
+def write_archive(conn, table, since_ms, until_ms, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = ARCHIVE_TABLES[table]
+    order = "symbol, time" if "symbol" in columns else "time"
+    schema = pa.schema([
+        (name, pa.int64() if name == "time" else pa.string() if name == "symbol" else pa.float64())
+        for name in columns
+    ])
+    cursor = conn.execute(f"""
+        SELECT {", ".join(columns)} FROM {table}
+        WHERE time >= ? AND time < ?
+        ORDER BY {order}
+    """, (since_ms, until_ms))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    written = 0
+    with pq.ParquetWriter(temp_path, schema, compression="zstd") as writer:
+        while rows := cursor.fetchmany(ARCHIVE_ROW_GROUP):
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema,
+            ))
+            written += len(rows)
+    os.replace(temp_path, path)
+    return written
+
+
+# Функция для архивирования одного месяца: сначала файлы по обеим таблицам,
+# затем строка в archive_months, сдвигающая границу архива
+def archive_month(conn, month, archive_dir=ARCHIVE_DIR):
+    month_end = next_month(month)
+    counts = {
+        table: write_archive(conn, table, month, month_end, archive_path(table, month, archive_dir))
+        for table in ARCHIVE_TABLES
+    }
+    with conn:
+        conn.execute("""
+            INSERT INTO archive_months (month_start, month_end, pressure_rows, summary_rows, archived_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (month, month_end, counts["market_pressure"], counts["market_summary"], now_ms()))
+    return month_end
+
+
+# Функция для удаления сырых строк раньше границы архива порциями по дню,
+# чтобы одна транзакция не раздувала WAL и не держала блокировку записи
+def purge_archived(conn, boundary):
+    deleted = 0
+    oldest = conn.execute("SELECT MIN(time) FROM market_summary").fetchone()[0]
+    oldest_pair = conn.execute("SELECT MIN(time) FROM market_pressure").fetchone()[0]
+    oldest = min(value for value in (oldest, oldest_pair, boundary) if value is not None)
+    for since in range(oldest, boundary, DAY_MS):
+        until = min(since + DAY_MS, boundary)
+        with conn:
+            for table in ARCHIVE_TABLES:
+                deleted += conn.execute(
+                    f"DELETE FROM {table} WHERE time >= ? AND time < ?", (since, until)
+                ).rowcount
+    return deleted
+
+
+# Функция для возврата свободных страниц файла базы системе.
+# Работает, только если база в режиме auto_vacuum=INCREMENTAL (см. enable_incremental_vacuum).
+def incremental_vacuum(conn):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return 0
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # executescript выполняет прагму до конца: через execute
+    # модуль sqlite3 освобождает только одну страницу за вызов
+    conn.executescript("PRAGMA incremental_vacuum")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+# Функция для перевода существующей базы в режим auto_vacuum=INCREMENTAL.
+# Нужен полный VACUUM: база переписывается целиком под монопольной блокировкой,
+# поэтому выполняется вручную (python retention.py --vacuum) при остановленных сборщике и боте.
+def enable_incremental_vacuum(conn):
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+# Функция для применения срока хранения.
+# Архивирует полностью устаревшие месяцы (не больше max_months за запуск,
+# чтобы ограничить время работы в цикле сборщика), удаляет перенесенные строки
+# и старые часовые агрегаты, возвращает свободное место.
+def apply_retention(conn, retention_days=RETENTION_DAYS, hourly_retention_days=HOURLY_RETENTION_DAYS,
+                    max_months=None):
+    result = RetentionResult()
+    started = time.monotonic()
+    cutoff = now_ms() - retention_days * DAY_MS
+    boundary = archive_boundary(conn)
+    while max_months is None or len(result.archived) < max_months:
+        oldest = conn.execute("SELECT MIN(time) FROM market_summary WHERE time >= ?", (boundary,)).fetchone()[0]
+        if oldest is None or next_month(oldest) > cutoff:
+            break
+        boundary = archive_month(conn, month_start(oldest))
+        result.archived.append(format_time(oldest, "%Y-%m"))
+    if boundary:
+        result.deleted += purge_archived(conn, boundary)
+    with conn:
+        result.deleted += conn.execute(
+            "DELETE FROM market_pressure_rollup WHERE resolution = ? AND bucket < ?",
+            (HOUR_MS, now_ms() - hourly_retention_days * DAY_MS),
+        ).rowcount
+        result.deleted += conn.execute(
+            "DELETE FROM market_summary_rollup WHERE resolution = ? AND bucket < ?",
+            (HOUR_MS, now_ms() - hourly_retention_days * DAY_MS),
+        ).rowcount
+    if result.deleted:
+        result.freed_pages = incremental_vacuum(conn)
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+# Функция для чтения сырого ряда (time, bid_volume, ask_volume, dizbalance)
+# по монете или по рынку (symbol=None) за [since_ms, until_ms) из архивных месяцев.
+# Отдает строки порциями по месяцу, по возрастанию времени, как iter_chunks в exports.py.
+def archived_chunks(conn, symbol, since_ms, until_ms=None, archive_dir=ARCHIVE_DIR):
+    import pyarrow.parquet as pq
+
+    until_ms = MAX_TIME if until_ms is None else until_ms
+    table = "market_pressure" if symbol else "market_summary"
+    columns = (["time", "bid_volume", "ask_volume", "dizbalance"] if symbol
+               else ["time", "total_bid_volume", "total_ask_volume", "total_dizbalance"])
+    filters = [("time", ">=", since_ms), ("time", "<", until_ms)]
+    if symbol:
+        filters.append(("symbol", "=", symbol))
+    months = conn.execute("""
+        SELECT month_start FROM archive_months
+        WHERE month_end > ? AND month_start < ?
+        ORDER BY month_start
+    """, (since_ms, until_ms)).fetchall()
+    for (month,) in months:
+        data = pq.read_table(archive_path(table, month, archive_dir), columns=columns, filters=filters)
+        data = data.sort_by("time")
+        rows = list(zip(*(data.column(name).to_pylist() for name in columns)))
+        if rows:
+            yield rows
+
+
+# Ручной запуск: архивирование всех устаревших месяцев сразу.
+# --vacuum — перевод существующей базы в режим incremental_vacuum.
+if __name__ == "__main__":
+    conn = sqlite3.connect(DATABASE_NAME)
+    enable_wal(conn)
+    if "--vacuum" in sys.argv:
+        enable_incremental_vacuum(conn)
+        print("База переведена в режим auto_vacuum=INCREMENTAL.")
+    print(f"Срок хранения: {apply_retention(conn)}")
+    print(f"Граница архива: {format_time(archive_boundary(conn)) if archive_boundary(conn) else 'нет'}")
+    conn.close()
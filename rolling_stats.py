@@ -0,0 +1,226 @@
+# Скользящая статистика дисбаланса за 24 часа и 7 дней и рейтинги /top.
+# Для каждой пары и рынка в целом хранятся число замеров, среднее и сумма
+# квадратов отклонений (M2) по методу Уэлфорда: новый замер добавляется,
+# а вышедший из окна вычитается за O(1), без пересчета по market_pressure.
+# Вышедшие из окна замеры читаются одним запросом по первичному ключу (time, symbol),
+# поэтому сырые данные должны храниться дольше самого длинного окна (RETENTION_DAYS).
+# Статистика обновляется в транзакции записи цикла (таблицы rolling_stats
+# и rolling_windows) и переживает перезапуск сборщика. Там же по куче
+# выбираются top_size пар по каждому показателю рейтинга (таблица top_movers),
+# бот держит рейтинги в памяти (TopMovers) и отвечает на /top без запросов к истории.
+import heapq
+import math
+
+from latest_snapshot import MARKET_SYMBOL
+from rollups import DAY_MS
+
+# Окна статистики: название -> длительность, мс
+WINDOWS = {"24h": DAY_MS, "7d": 7 * DAY_MS}
+# Показатели рейтинга: текущий дисбаланс, изменение с прошлого цикла, z-score по окнам
+TOP_METRICS = ("imbalance", "change", *(f"z{name}" for name in WINDOWS))
+# Меньше замеров в окне — z-score не считается
+MIN_SAMPLES = 20
+
+STATS_UPSERT_SQL = """
+    INSERT INTO rolling_stats (symbol, window_ms, samples, mean, m2) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (symbol, window_ms) DO UPDATE SET
+        samples = excluded.samples,
+        mean = excluded.mean,
+        m2 = excluded.m2
+"""
+WINDOW_UPSERT_SQL = """
+    INSERT INTO rolling_windows (window_ms, origin, last_time) VALUES (?, ?, ?)
+    ON CONFLICT (window_ms) DO UPDATE SET origin = excluded.origin, last_time = excluded.last_time
+"""
+
+
+# Функция для добавления замера в статистику [samples, mean, m2]
+def add_sample(stats, value):
+    samples, mean, m2 = stats
+    samples += 1
+    delta = value - mean
+    mean += delta / samples
+    m2 += delta * (value - mean)
+    stats[:] = [samples, mean, m2]
+
+
+# Функция для удаления вышедшего из окна замера из статистики [samples, mean, m2]
+def remove_sample(stats, value):
+    samples, mean, m2 = stats
+    if samples <= 1:
+        stats[:] = [0, 0.0, 0.0]
+        return
+    samples -= 1
+    delta = value - mean
+    mean -= delta / samples
+    # Накопленная ошибка округления не должна делать дисперсию отрицательной
+    m2 = max(m2 - delta * (value - mean), 0.0)
+    stats[:] = [samples, mean, m2]
+
+
+# Функция для z-score значения относительно статистики (None, если замеров мало)
+def zscore(stats, value):
+    samples, mean, m2 = stats
+    if samples < MIN_SAMPLES or m2 <= 0:
+        return None
+    return (value - mean) / math.sqrt(m2 / (samples - 1))
+
+
+# Функция для заполнения статистики по уже накопленным данным:
+# окна заканчиваются последним циклом в market_summary
+def backfill_rolling_stats(conn):
+    end = conn.execute("SELECT MAX(time) FROM market_summary").fetchone()[0]
+    conn.execute("DELETE FROM rolling_stats")
+    conn.execute("DELETE FROM rolling_windows")
+    if end is None:
+        return
+    for window_ms in WINDOWS.values():
+        since = end - window_ms
+        conn.execute("""
+            INSERT INTO rolling_stats (symbol, window_ms, samples, mean, m2)
+            SELECT p.symbol, ?, COUNT(*), a.mean, SUM((p.dizbalance - a.mean) * (p.dizbalance - a.mean))
+            FROM market_pressure p
+            JOIN (
+                SELECT symbol, AVG(dizbalance) AS mean
+                FROM market_pressure
+                WHERE time > ? AND time <= ?
+                GROUP BY symbol
+            ) a USING (symbol)
+            WHERE p.time > ? AND p.time <= ?
+            GROUP BY p.symbol
+        """, (window_ms, since, end, since, end))
+        conn.execute("""
+            INSERT INTO rolling_stats (symbol, window_ms, samples, mean, m2)
+            SELECT ?, ?, COUNT(*), a.mean, SUM((s.total_dizbalance - a.mean) * (s.total_dizbalance - a.mean))
+            FROM market_summary s, (
+                SELECT AVG(total_dizbalance) AS mean FROM market_summary WHERE time > ? AND time <= ?
+            ) a
+            WHERE s.time > ? AND s.time <= ?
+        """, (MARKET_SYMBOL, window_ms, since, end, since, end))
+        conn.execute(WINDOW_UPSERT_SQL, (window_ms, since, end))
+
+
+# Статистика в памяти сборщика, зеркало таблиц rolling_stats и rolling_windows
+class RollingStats:
+    def __init__(self, top_size):
+        self.top_size = top_size
+        # window_ms -> {symbol: [samples, mean, m2]}
+        self.stats = {}
+        # window_ms -> (origin, last_time): статистика покрывает замеры с time > origin
+        self.windows = {}
+        # Последнее значение по паре для изменения с прошлого цикла
+        self.last = {}
+        # z-score последнего цикла: window_ms -> {symbol: z}
+        self.zscores = {}
+        self.loaded = False
+
+    def load(self, conn):
+        self.stats = {window_ms: {} for window_ms in WINDOWS.values()}
+        for symbol, window_ms, samples, mean, m2 in conn.execute(
+            "SELECT symbol, window_ms, samples, mean, m2 FROM rolling_stats"
+        ):
+            if window_ms in self.stats:
+                self.stats[window_ms][symbol] = [samples, mean, m2]
+        self.windows = {
+            window_ms: (origin, last_time)
+            for window_ms, origin, last_time in conn.execute("SELECT window_ms, origin, last_time FROM rolling_windows")
+        }
+        self.last = dict(conn.execute("SELECT symbol, dizbalance FROM latest_pressure"))
+        self.loaded = True
+
+    # Сброс после неудачной транзакции: следующий цикл перечитает статистику из базы
+    def reset(self):
+        self.loaded = False
+
+    # Функция для вычитания замеров, вышедших из окна к моменту cycle_time.
+    # Возвращает пары, статистика которых изменилась.
+    def _evict(self, conn, window_ms, cycle_time):
+        origin, last_time = self.windows.get(window_ms, (cycle_time - 1, cycle_time - 1))
+        since = max(last_time - window_ms, origin)
+        until = cycle_time - window_ms
+        evicted = set()
+        if until > since:
+            stats = self.stats[window_ms]
+            rows = conn.execute(
+                "SELECT symbol, dizbalance FROM market_pressure WHERE time > ? AND time <= ?", (since, until)
+            ).fetchall()
+            rows += [
+                (MARKET_SYMBOL, value) for (value,) in conn.execute(
+                    "SELECT total_dizbalance FROM market_summary WHERE time > ? AND time <= ?", (since, until)
+                )
+            ]
+            for symbol, value in rows:
+                if symbol in stats:
+                    remove_sample(stats[symbol], value)
+                    evicted.add(symbol)
+        self.windows[window_ms] = (origin, cycle_time)
+        return evicted
+
+    # Функция для обновления статистики и рейтингов по данным одного цикла.
+    # Вызывается внутри транзакции записи цикла.
+    def update(self, conn, cycle_time, pair_rows, summary):
+        if not self.loaded:
+            self.load(conn)
+        values = {symbol: dizbalance for symbol, _, _, dizbalance, *_ in pair_rows}
+        values[MARKET_SYMBOL] = summary[2]
+        self.zscores = {}
+        for window_ms in WINDOWS.values():
+            evicted = self._evict(conn, window_ms, cycle_time)
+            stats = self.stats[window_ms]
+            # z-score считается относительно окна без текущего замера
+            zscores = self.zscores[window_ms] = {}
+            for symbol, value in values.items():
+                symbol_stats = stats.setdefault(symbol, [0, 0.0, 0.0])
+                z = zscore(symbol_stats, value)
+                if z is not None:
+                    zscores[symbol] = z
+                add_sample(symbol_stats, value)
+            # Сохраняются и пары, пропустившие цикл, но потерявшие замеры из окна
+            conn.executemany(STATS_UPSERT_SQL, [
+                (symbol, window_ms, *stats[symbol]) for symbol in evicted | values.keys()
+            ])
+            conn.execute(WINDOW_UPSERT_SQL, (window_ms, *self.windows[window_ms]))
+        changes = {symbol: value - self.last[symbol] for symbol, value in values.items() if symbol in self.last}
+        self.last.update(values)
+        self._save_top(conn, cycle_time, values, changes)
+
+    # Функция для выбора top_size пар по модулю каждого показателя (heapq.nlargest)
+    def _save_top(self, conn, cycle_time, values, changes):
+        metrics = {"imbalance": values, "change": changes}
+        for name, window_ms in WINDOWS.items():
+            metrics[f"z{name}"] = self.zscores[window_ms]
+        rows = []
+        for metric, metric_values in metrics.items():
+            top = heapq.nlargest(
+                self.top_size,
+                ((abs(value), symbol, value) for symbol, value in metric_values.items() if symbol != MARKET_SYMBOL),
+            )
+            rows.extend(
+                (metric, rank, symbol, value, values[symbol], cycle_time)
+                for rank, (_, symbol, value) in enumerate(top, start=1)
+            )
+        conn.execute("DELETE FROM top_movers")
+        conn.executemany(
+            "INSERT INTO top_movers (metric, rank, symbol, value, dizbalance, time) VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+
+
+# Копия top_movers в памяти процесса бота
+class TopMovers:
+    def __init__(self):
+        # metric -> [(symbol, value, dizbalance), ...] по убыванию модуля value
+        self.rankings = {}
+        self.time = None
+
+    def load(self, conn):
+        rankings = {metric: [] for metric in TOP_METRICS}
+        self.time = None
+        for metric, symbol, value, dizbalance, time in conn.execute(
+            "SELECT metric, symbol, value, dizbalance, time FROM top_movers ORDER BY metric, rank"
+        ):
+            rankings.setdefault(metric, []).append((symbol, value, dizbalance))
+            self.time = time
+        self.rankings = rankings
+
+    def get(self, metric, limit):
+        return self.rankings.get(metric, [])[:limit]
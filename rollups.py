@@ -0,0 +1,170 @@
+# Предварительно агрегированные ряды дисбаланса (часовые и дневные).
+# Сборщик обновляет агрегаты в той же транзакции, что и сырые данные цикла,
+# а графики и отчеты выбирают самое подробное разрешение, которое укладывается
+# в нужное число точек, и читают сотни строк вместо десятков тысяч.
+from time_utils import to_datetime
+
+# Разрешения рядов в миллисекундах. 0 — сырые данные циклов (15 минут).
+RAW = 0
+CYCLE_MS = 15 * 60 * 1000
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+ROLLUP_RESOLUTIONS = (HOUR_MS, DAY_MS)
+# Верхняя граница времени для запросов без конца интервала
+MAX_TIME = 2 ** 63 - 1
+
+# Обновление агрегата одной строкой: сумма и число замеров для среднего,
+# минимум, максимум и последнее значение в интервале
+_UPSERT_TEMPLATE = """
+    INSERT INTO {table} (resolution, {key}bucket, samples, dizbalance_sum, dizbalance_min,
+                         dizbalance_max, dizbalance_last, last_time, bid_volume_sum, ask_volume_sum)
+    VALUES (?, {key_placeholder}?, 1, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (resolution, {key}bucket) DO UPDATE SET
+        samples = samples + 1,
+        dizbalance_sum = dizbalance_sum + excluded.dizbalance_sum,
+        dizbalance_min = MIN(dizbalance_min, excluded.dizbalance_min),
+        dizbalance_max = MAX(dizbalance_max, excluded.dizbalance_max),
+        dizbalance_last = CASE WHEN excluded.last_time >= last_time
+                               THEN excluded.dizbalance_last ELSE dizbalance_last END,
+        last_time = MAX(last_time, excluded.last_time),
+        bid_volume_sum = bid_volume_sum + excluded.bid_volume_sum,
+        ask_volume_sum = ask_volume_sum + excluded.ask_volume_sum
+"""
+PRESSURE_UPSERT_SQL = _UPSERT_TEMPLATE.format(table="market_pressure_rollup", key="symbol, ", key_placeholder="?, ")
+SUMMARY_UPSERT_SQL = _UPSERT_TEMPLATE.format(table="market_summary_rollup", key="", key_placeholder="")
+
+
+# Смещение часового пояса отображения в миллисекундах:
+# дневные интервалы начинаются в полночь по времени пользователя
+def display_offset_ms(ms):
+    return int(to_datetime(ms).utcoffset().total_seconds() * 1000)
+
+
+# Функция для получения начала интервала, в который попадает отметка времени
+def bucket_start(ms, resolution):
+    offset = display_offset_ms(ms)
+    return (ms + offset) // resolution * resolution - offset
+
+
+# Функция для обновления агрегатов по данным одного цикла.
+# Вызывается внутри транзакции записи цикла.
+def update_rollups(conn, cycle_time, pair_rows, summary):
+    total_bid_volume, total_ask_volume, total_dizbalance = summary
+    for resolution in ROLLUP_RESOLUTIONS:
+        bucket = bucket_start(cycle_time, resolution)
+        conn.executemany(PRESSURE_UPSERT_SQL, [
+            (resolution, symbol, bucket, dizbalance, dizbalance, dizbalance, dizbalance,
+             cycle_time, bid_volume, ask_volume)
+            for symbol, bid_volume, ask_volume, dizbalance, *_ in pair_rows
+        ])
+        conn.execute(SUMMARY_UPSERT_SQL, (
+            resolution, bucket, total_dizbalance, total_dizbalance, total_dizbalance,
+            total_dizbalance, cycle_time, total_bid_volume, total_ask_volume,
+        ))
+
+
+# Функция для пересчета агрегатов по уже накопленным сырым данным
+def backfill_rollups(conn, offset_ms):
+    for resolution in ROLLUP_RESOLUTIONS:
+        bucket = f"((time + {offset_ms}) / {resolution}) * {resolution} - {offset_ms}"
+        conn.execute(f"""
+            INSERT OR REPLACE INTO market_pressure_rollup
+            SELECT {resolution}, symbol, {bucket} AS bucket, COUNT(*), SUM(dizbalance),
+                   MIN(dizbalance), MAX(dizbalance), NULL, MAX(time), SUM(bid_volume), SUM(ask_volume)
+            FROM market_pressure
+            GROUP BY symbol, bucket
+        """)
+        conn.execute(f"""
+            INSERT OR REPLACE INTO market_summary_rollup
+            SELECT {resolution}, {bucket} AS bucket, COUNT(*), SUM(total_dizbalance),
+                   MIN(total_dizbalance), MAX(total_dizbalance), NULL, MAX(time),
+                   SUM(total_bid_volume), SUM(total_ask_volume)
+            FROM market_summary
+            GROUP BY bucket
+        """)
+    conn.execute("""
+        UPDATE market_pressure_rollup SET dizbalance_last = (
+            SELECT dizbalance FROM market_pressure
+            WHERE market_pressure.symbol = market_pressure_rollup.symbol
+              AND market_pressure.time = market_pressure_rollup.last_time
+        )
+    """)
+    conn.execute("""
+        UPDATE market_summary_rollup SET dizbalance_last = (
+            SELECT total_dizbalance FROM market_summary
+            WHERE market_summary.time = market_summary_rollup.last_time
+        )
+    """)
+
+
+# Функция для выбора разрешения: самое подробное из тех,
+# при котором окно укладывается в max_points точек
+def choose_resolution(window_ms, max_points):
+    for resolution in (RAW, *ROLLUP_RESOLUTIONS):
+        if window_ms // (resolution or CYCLE_MS) <= max_points:
+            return resolution
+    return ROLLUP_RESOLUTIONS[-1]
+
+
+# Функция для получения времени первой записи по монете или по рынку.
+# Сырые данные старше срока хранения перенесены в архив (см. retention.py),
+# а дневные агрегаты хранятся всегда, поэтому учитывается и первый дневной интервал.
+def first_time(conn, symbol):
+    if symbol:
+        return conn.execute("""
+            SELECT MIN(first) FROM (
+                SELECT MIN(time) AS first FROM market_pressure WHERE symbol = ?
+                UNION ALL
+                SELECT MIN(bucket) FROM market_pressure_rollup WHERE resolution = ? AND symbol = ?
+            )
+        """, (symbol, DAY_MS, symbol)).fetchone()[0]
+    return conn.execute("""
+        SELECT MIN(first) FROM (
+            SELECT MIN(time) AS first FROM market_summary
+            UNION ALL
+            SELECT MIN(bucket) FROM market_summary_rollup WHERE resolution = ?
+        )
+    """, (DAY_MS,)).fetchone()[0]
+
+
+# Функция для чтения ряда (time, bid_volume, ask_volume, dizbalance) по монете
+# или по рынку (symbol=None) в интервале [since_ms, until_ms) в выбранном разрешении.
+# Для агрегатов время — начало интервала, значения — средние за интервал.
+# Возвращает курсор: строки можно читать порциями через fetchmany.
+def query_series(conn, symbol, since_ms, resolution, until_ms=None):
+    until_ms = MAX_TIME if until_ms is None else until_ms
+    if resolution == RAW:
+        if symbol:
+            return conn.execute("""
+                SELECT time, bid_volume, ask_volume, dizbalance
+                FROM market_pressure
+                WHERE symbol = ? AND time >= ? AND time < ?
+                ORDER BY time
+            """, (symbol, since_ms, until_ms))
+        return conn.execute("""
+            SELECT time, total_bid_volume, total_ask_volume, total_dizbalance
+            FROM market_summary
+            WHERE time >= ? AND time < ?
+            ORDER BY time
+        """, (since_ms, until_ms))
+    columns = """
+        bucket, bid_volume_sum / samples, ask_volume_sum / samples, dizbalance_sum / samples
+    """
+    if symbol:
+        return conn.execute(f"""
+            SELECT {columns}
+            FROM market_pressure_rollup
+            WHERE resolution = ? AND symbol = ? AND bucket >= ? AND bucket < ?
+            ORDER BY bucket
+        """, (resolution, symbol, bucket_start(since_ms, resolution), until_ms))
+    return conn.execute(f"""
+        SELECT {columns}
+        FROM market_summary_rollup
+        WHERE resolution = ? AND bucket >= ? AND bucket < ?
+        ORDER BY bucket
+    """, (resolution, bucket_start(since_ms, resolution), until_ms))
+
+
+# Функция для чтения всего ряда списком (см. query_series)
+def fetch_series(conn, symbol, since_ms, resolution, until_ms=None):
+    return query_series(conn, symbol, since_ms, resolution, until_ms).fetchall()
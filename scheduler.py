@@ -0,0 +1,86 @@
+# Планировщик циклов сбора, выровненных по границам интервала (:00/:15/:30/:45).
+# Цикл получает время начала своего слота, поэтому снимки разных дней
+# совпадают по времени до миллисекунды. Циклы не перекрываются: следующий
+# слот начинается только после завершения (или прерывания по сроку) предыдущего,
+# а слот, занятый другим процессом, не запускается повторно.
+# Каждый слот записывается в журнал collector_cycles: начало, конец, статус,
+# в том числе пропущенные слоты.
+import asyncio
+
+from configs import COLLECT_DEADLINE, COLLECT_GRACE
+from rollups import CYCLE_MS
+from time_utils import format_time, now_ms
+
+# Статусы слотов в журнале
+STATUS_RUNNING = "running"
+STATUS_OK = "ok"
+STATUS_TIMEOUT = "timeout"
+STATUS_ERROR = "error"
+STATUS_SKIPPED = "skipped"
+
+
+# Функция для получения ближайшей границы интервала не раньше ms
+def next_slot(ms, interval_ms=CYCLE_MS):
+    return -(-ms // interval_ms) * interval_ms
+
+
+# Функция для записи начала цикла. Возвращает False, если слот уже занят.
+def claim_slot(conn, slot_time):
+    with conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO collector_cycles (slot_time, started_at, status) VALUES (?, ?, ?)",
+            (slot_time, now_ms(), STATUS_RUNNING),
+        )
+    return cursor.rowcount == 1
+
+
+# Функция для записи окончания цикла
+def finish_slot(conn, slot_time, status):
+    with conn:
+        conn.execute(
+            "UPDATE collector_cycles SET finished_at = ?, status = ? WHERE slot_time = ?",
+            (now_ms(), status, slot_time),
+        )
+
+
+# Функция для записи пропущенных слотов
+def record_skipped(conn, slot_times):
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO collector_cycles (slot_time, status) VALUES (?, ?)",
+            [(slot_time, STATUS_SKIPPED) for slot_time in slot_times],
+        )
+
+
+# Функция для выполнения одного слота с ограничением по времени
+async def run_slot(conn, job, slot_time, deadline):
+    if not claim_slot(conn, slot_time):
+        print(f"Слот {format_time(slot_time)} уже выполняется или выполнен другим процессом.")
+        return
+    try:
+        await asyncio.wait_for(job(slot_time), deadline)
+        status = STATUS_OK
+    except asyncio.TimeoutError:
+        print(f"Цикл {format_time(slot_time)} прерван: превышен срок {deadline:.0f} с.")
+        status = STATUS_TIMEOUT
+    except Exception as e:
+        print(f"Ошибка в цикле {format_time(slot_time)}: {e}")
+        status = STATUS_ERROR
+    finish_slot(conn, slot_time, status)
+
+
+# Функция для бесконечного запуска job(slot_time) на границах интервала.
+# Если цикл закончился позже начала следующего слота более чем на grace,
+# этот слот и все прошедшие пропускаются и записываются в журнал.
+async def run_aligned(conn, job, interval_ms=CYCLE_MS, deadline=COLLECT_DEADLINE, grace=COLLECT_GRACE):
+    slot_time = next_slot(now_ms(), interval_ms)
+    while True:
+        await asyncio.sleep(max(0, slot_time - now_ms()) / 1000)
+        await run_slot(conn, job, slot_time, deadline)
+        following = slot_time + interval_ms
+        now = now_ms()
+        slot_time = following if now <= following + grace * 1000 else next_slot(now, interval_ms)
+        skipped = list(range(following, slot_time, interval_ms))
+        if skipped:
+            record_skipped(conn, skipped)
+            print(f"Пропущено слотов: {len(skipped)} ({', '.join(format_time(slot) for slot in skipped)}).")
@@ -0,0 +1,230 @@
+# Потоковый режим сбора данных: локальные стаканы по diff-depth потокам Binance.
+# Стакан каждой пары синхронизируется по процедуре «снимок + updateId»,
+# дисбаланс можно посчитать в любой момент без REST-запросов,
+# а запись в базу выполняется с периодом STREAM_WRITE_INTERVAL.
+# Запуск: python stream_collector.py
+import asyncio
+import heapq
+import json
+
+import aiohttp
+
+from collecting_data import (
+    broadcaster,
+    connect_to_db,
+    create_tables_if_not_exist,
+    fetch_order_book,
+    run_retention,
+    save_cycle_data,
+    send_alerts,
+    symbol_registry,
+)
+from configs import (
+    BINANCE_STREAM_URL,
+    DEPTH_CONCURRENCY,
+    DEPTH_TIMEOUT,
+    METRICS_HOST,
+    STREAM_METRICS_PORT,
+    STREAM_WRITE_INTERVAL,
+)
+from imbalance import ANALYSIS_DEPTH, analyze_order_books, pressure_rows
+from metrics import start_metrics_server
+from scheduler import run_aligned
+
+# Binance допускает не более 200 потоков на одно соединение
+STREAMS_PER_CONNECTION = 200
+# Глубина REST-снимка для инициализации локального стакана
+SNAPSHOT_LIMIT = 1000
+
+
+# Локальный стакан одной пары
+class LocalOrderBook:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = {}
+        self.asks = {}
+        self.last_update_id = None
+        self.buffer = []
+        self.snapshot_requested = False
+        self.awaiting_first_event = False
+
+    @property
+    def synced(self):
+        return self.last_update_id is not None
+
+    # Сброс стакана: события снова буферизуются до следующего снимка
+    def reset(self):
+        self.bids.clear()
+        self.asks.clear()
+        self.last_update_id = None
+        self.snapshot_requested = False
+
+    # Обработка события из потока. Возвращает True, если нужен новый снимок.
+    def on_event(self, event):
+        if not self.synced:
+            self.buffer.append(event)
+            if self.snapshot_requested:
+                return False
+            self.snapshot_requested = True
+            return True
+        if not self._process(event):
+            print(f"Разрыв последовательности обновлений для {self.symbol}, пересинхронизация.")
+            self.reset()
+            return self.on_event(event)
+        return False
+
+    # Применение REST-снимка и накопленных событий. Возвращает False при разрыве.
+    def apply_snapshot(self, snapshot):
+        self.bids = {float(price): float(qty) for price, qty in snapshot["bids"]}
+        self.asks = {float(price): float(qty) for price, qty in snapshot["asks"]}
+        self.last_update_id = snapshot["lastUpdateId"]
+        self.awaiting_first_event = True
+        buffered, self.buffer = self.buffer, []
+        for event in buffered:
+            if not self._process(event):
+                self.reset()
+                return False
+        return True
+
+    # Проверка updateId и применение одного события к стакану
+    def _process(self, event):
+        if event["u"] < self.last_update_id:
+            return True
+        if self.awaiting_first_event:
+            # Первое событие должно перекрывать снимок или следовать сразу за ним
+            if not (event["U"] <= self.last_update_id <= event["u"] or event["pu"] == self.last_update_id):
+                return False
+            self.awaiting_first_event = False
+        elif event["pu"] != self.last_update_id:
+            return False
+        self._apply_levels(self.bids, event["b"])
+        self._apply_levels(self.asks, event["a"])
+        self.last_update_id = event["u"]
+        return True
+
+    @staticmethod
+    def _apply_levels(side, levels):
+        for price, qty in levels:
+            price, qty = float(price), float(qty)
+            if qty == 0:
+                side.pop(price, None)
+            else:
+                side[price] = qty
+
+    # Расчет объемов и дисбаланса по лучшим depth уровням каждой стороны
+    def imbalance(self, depth=ANALYSIS_DEPTH):
+        bid_volume = sum(qty for _, qty in heapq.nlargest(depth, self.bids.items()))
+        ask_volume = sum(qty for _, qty in heapq.nsmallest(depth, self.asks.items()))
+        if bid_volume + ask_volume == 0:
+            return bid_volume, ask_volume, 0
+        dizbalance = (bid_volume - ask_volume) / (bid_volume + ask_volume) * 100
+        return bid_volume, ask_volume, dizbalance
+
+
+# Функция для загрузки снимка и синхронизации локального стакана
+async def sync_order_book(session, semaphore, book):
+    snapshot = await fetch_order_book(session, semaphore, book.symbol, SNAPSHOT_LIMIT)
+    if snapshot is None:
+        book.snapshot_requested = False
+        return
+    if not book.apply_snapshot(snapshot):
+        print(f"Снимок {book.symbol} не совпал с потоком, будет запрошен повторно.")
+
+
+# Функция для чтения одного комбинированного потока с переподключением
+async def read_stream(session, semaphore, books, symbols):
+    streams = "/".join(f"{symbol.lower()}@depth@100ms" for symbol in symbols)
+    url = f"{BINANCE_STREAM_URL}/stream?streams={streams}"
+    pending = set()
+    while True:
+        try:
+            async with session.ws_connect(url, heartbeat=60) as ws:
+                print(f"Подключен поток на {len(symbols)} пар.")
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    event = json.loads(message.data)["data"]
+                    book = books.get(event["s"])
+                    if book and book.on_event(event):
+                        task = asyncio.create_task(sync_order_book(session, semaphore, book))
+                        pending.add(task)
+                        task.add_done_callback(pending.discard)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Ошибка потока: {e!r}")
+        # После обрыва соединения все стаканы этого потока синхронизируются заново
+        for symbol in symbols:
+            books[symbol].reset()
+            books[symbol].buffer.clear()
+        await asyncio.sleep(1)
+
+
+# Функция для расчета дисбаланса по всем синхронизированным стаканам
+def snapshot_imbalance(books):
+    order_books = {
+        symbol: {
+            "bids": sorted(book.bids.items(), reverse=True),
+            "asks": sorted(book.asks.items()),
+        }
+        for symbol, book in books.items() if book.synced
+    }
+    return pressure_rows(*analyze_order_books(order_books))
+
+
+# Функция для периодической записи состояния локальных стаканов в базу
+# на границах интервала (см. scheduler.py)
+async def write_periodically(conn, books, interval):
+    async def write_snapshot(cycle_time):
+        pair_rows, summary = snapshot_imbalance(books)
+        if pair_rows:
+            if save_cycle_data(conn, cycle_time, pair_rows, summary):
+                await send_alerts(conn, pair_rows, summary)
+        else:
+            print("Нет синхронизированных стаканов, запись пропущена.")
+        run_retention(conn)
+
+    await run_aligned(conn, write_snapshot, interval * 1000)
+
+
+# Функция для запуска потокового режима
+async def run_stream(symbols, write_interval=STREAM_WRITE_INTERVAL):
+    conn = connect_to_db()
+    if not conn:
+        return
+    create_tables_if_not_exist(conn)
+    books = {symbol: LocalOrderBook(symbol) for symbol in symbols}
+    metrics_runner = await start_metrics_server(STREAM_METRICS_PORT, METRICS_HOST)
+    semaphore = asyncio.Semaphore(DEPTH_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=DEPTH_CONCURRENCY, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=DEPTH_TIMEOUT)
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            chunks = [
+                symbols[i:i + STREAMS_PER_CONNECTION]
+                for i in range(0, len(symbols), STREAMS_PER_CONNECTION)
+            ]
+            await asyncio.gather(
+                write_periodically(conn, books, write_interval),
+                *(read_stream(session, semaphore, books, chunk) for chunk in chunks),
+            )
+    finally:
+        await broadcaster.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        conn.close()
+
+
+if __name__ == "__main__":
+    conn = connect_to_db()
+    symbols = []
+    if conn:
+        # Реестр пар читает таблицы, которые создают миграции
+        create_tables_if_not_exist(conn)
+        symbols = asyncio.run(symbol_registry.get_symbols(conn))
+        conn.close()
+    if not symbols:
+        raise SystemExit("Не удалось получить список пар.")
+    print(f"Потоковый режим: {len(symbols)} пар, запись каждые {STREAM_WRITE_INTERVAL} с.")
+    try:
+        asyncio.run(run_stream(symbols))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,101 @@
+# Реестр фьючерсных пар: список из /fapi/v1/exchangeInfo хранится в SQLite
+# и обновляется не чаще одного раза в SYMBOLS_TTL секунд. Циклы сбора читают
+# список из памяти, а ошибка exchangeInfo не прерывает цикл — используется
+# последний сохраненный список. Запрос exchangeInfo выполняется в потоке,
+# чтобы не останавливать цикл событий сборщика на время ответа Binance.
+import asyncio
+import time
+
+import requests
+
+from configs import BINANCE_API_URL, DEPTH_TIMEOUT, SYMBOLS_TTL
+from metrics import BINANCE_ERRORS, BINANCE_REQUEST_WEIGHT, BINANCE_REQUESTS, record_binance_response
+
+# Условия отбора пар для сбора данных
+QUOTE_ASSET = "USDT"
+ACTIVE_STATUS = "TRADING"
+CONTRACT_TYPE = "PERPETUAL"
+
+EXCHANGE_INFO_ENDPOINT = "/fapi/v1/exchangeInfo"
+# Вес запроса exchangeInfo
+EXCHANGE_INFO_WEIGHT = 1
+
+
+# Функция для загрузки всех USDT-контрактов из exchangeInfo
+def fetch_exchange_symbols():
+    BINANCE_REQUESTS.inc(endpoint=EXCHANGE_INFO_ENDPOINT)
+    BINANCE_REQUEST_WEIGHT.inc(EXCHANGE_INFO_WEIGHT, endpoint=EXCHANGE_INFO_ENDPOINT)
+    try:
+        response = requests.get(f"{BINANCE_API_URL}{EXCHANGE_INFO_ENDPOINT}", timeout=DEPTH_TIMEOUT)
+    except requests.RequestException as e:
+        BINANCE_ERRORS.inc(endpoint=EXCHANGE_INFO_ENDPOINT, status=type(e).__name__)
+        raise
+    record_binance_response(EXCHANGE_INFO_ENDPOINT, response.status_code, response.headers)
+    response.raise_for_status()
+    return [
+        (item["symbol"], item.get("status", ""), item.get("contractType", ""))
+        for item in response.json()["symbols"]
+        if item["quoteAsset"] == QUOTE_ASSET
+    ]
+
+
+# Реестр пар с кэшем в памяти
+class SymbolRegistry:
+    def __init__(self, ttl=SYMBOLS_TTL):
+        self.ttl = ttl
+        self.symbols = []
+        self.refreshed_at = 0.0
+        self.loaded = False
+
+    # Загрузка сохраненного списка и времени последнего обновления
+    # Таблицы symbols и registry_meta создаются миграциями db_schema
+    def _load(self, conn):
+        self.symbols = [
+            row[0] for row in conn.execute(
+                "SELECT symbol FROM symbols WHERE status = ? AND contract_type = ? ORDER BY symbol",
+                (ACTIVE_STATUS, CONTRACT_TYPE),
+            )
+        ]
+        row = conn.execute("SELECT value FROM registry_meta WHERE key = 'refreshed_at'").fetchone()
+        self.refreshed_at = float(row[0]) if row else 0.0
+        self.loaded = True
+
+    # Обновление реестра из exchangeInfo с журналом добавленных и удаленных пар
+    async def refresh(self, conn):
+        contracts = await asyncio.to_thread(fetch_exchange_symbols)
+        now = time.time()
+        active = sorted(
+            symbol for symbol, status, contract_type in contracts
+            if status == ACTIVE_STATUS and contract_type == CONTRACT_TYPE
+        )
+        added = set(active) - set(self.symbols)
+        removed = set(self.symbols) - set(active)
+        with conn:
+            conn.execute("DELETE FROM symbols")
+            conn.executemany(
+                "INSERT INTO symbols (symbol, status, contract_type, updated_at) VALUES (?, ?, ?, ?)",
+                [(symbol, status, contract_type, now) for symbol, status, contract_type in contracts],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO registry_meta (key, value) VALUES ('refreshed_at', ?)",
+                (str(now),),
+            )
+        if self.symbols and added:
+            print(f"Новые пары: {', '.join(sorted(added))}")
+        if removed:
+            print(f"Пары исключены (делистинг или остановка торгов): {', '.join(sorted(removed))}")
+        self.symbols = active
+        self.refreshed_at = now
+        print(f"Реестр пар обновлен: {len(active)} активных из {len(contracts)} USDT-контрактов.")
+
+    # Функция для получения актуального списка пар.
+    # Устаревший реестр обновляется, при ошибке возвращается последний известный список.
+    async def get_symbols(self, conn):
+        if not self.loaded:
+            self._load(conn)
+        if time.time() - self.refreshed_at >= self.ttl:
+            try:
+                await self.refresh(conn)
+            except (requests.RequestException, KeyError, ValueError) as e:
+                print(f"Ошибка обновления списка пар, используется сохраненный список: {e}")
+        return list(self.symbols)
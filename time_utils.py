@@ -0,0 +1,41 @@
+# Отметки времени хранятся в базе целым числом миллисекунд UTC.
+# В часовой пояс DISPLAY_TIMEZONE время переводится только при выводе.
+import time
+from datetime import datetime
+
+import pytz
+
+DISPLAY_TIMEZONE = pytz.timezone("Europe/Moscow")
+
+
+# Функция для получения текущего времени в миллисекундах UTC
+def now_ms():
+    return time.time_ns() // 1_000_000
+
+
+# Функция для перевода миллисекунд UTC в datetime часового пояса отображения
+def to_datetime(ms):
+    return datetime.fromtimestamp(ms / 1000, DISPLAY_TIMEZONE)
+
+
+# Функция для форматирования отметки времени при выводе пользователю
+def format_time(ms, fmt="%d.%m.%Y %H:%M"):
+    return to_datetime(ms).strftime(fmt)
+
+
+# Функция для перевода прежней ISO-строки (с часовым поясом или без) в миллисекунды UTC.
+# Строки без часового пояса записывались по московскому времени.
+def iso_to_epoch_ms(value):
+    if value is None or isinstance(value, int):
+        return value
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = DISPLAY_TIMEZONE.localize(moment)
+    return round(moment.timestamp() * 1000)
+
+
+# Функция для перевода даты, введенной пользователем (по умолчанию ДД.ММ.ГГГГ),
+# в миллисекунды UTC начала этого дня в часовом поясе отображения
+def parse_date(text, fmt="%d.%m.%Y"):
+    moment = DISPLAY_TIMEZONE.localize(datetime.strptime(text, fmt))
+    return round(moment.timestamp() * 1000)
@@ -0,0 +1,67 @@
+# Реестр авторизованных пользователей в памяти процесса.
+# Загружается из таблицы users при старте, изменения пишутся сразу и в память,
+# и в базу (write-through). Бот и сборщик работают в разных процессах, поэтому
+# каждое изменение увеличивает счетчик users_version в registry_meta: по нему
+# другой процесс одним коротким запросом узнает, что список пора перечитать.
+# Методы принимают соединение sqlite3 и вызываются там, где им можно
+# пользоваться (в сборщике напрямую, в боте — в потоках db_access).
+
+USERS_VERSION_KEY = "users_version"
+
+_BUMP_VERSION_SQL = f"""
+    INSERT INTO registry_meta (key, value) VALUES ('{USERS_VERSION_KEY}', '1')
+    ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+"""
+
+
+class UserRegistry:
+    def __init__(self):
+        self.chat_ids = set()
+        self.version = None
+        self.loaded = False
+
+    # Функция для чтения номера версии списка пользователей
+    @staticmethod
+    def _read_version(conn):
+        row = conn.execute(
+            "SELECT value FROM registry_meta WHERE key = ?", (USERS_VERSION_KEY,)
+        ).fetchone()
+        return row[0] if row else None
+
+    # Загрузка всего списка пользователей
+    def load(self, conn):
+        self.version = self._read_version(conn)
+        self.chat_ids = {row[0] for row in conn.execute("SELECT chat_id FROM users")}
+        self.loaded = True
+
+    # Перечитывание списка, если его изменил другой процесс.
+    # Возвращает True, если список был перечитан.
+    def refresh(self, conn):
+        if self.loaded and self._read_version(conn) == self.version:
+            return False
+        self.load(conn)
+        return True
+
+    # Проверка авторизации без обращения к базе
+    def is_authorized(self, chat_id):
+        return chat_id in self.chat_ids
+
+    # Запись изменения в базу в одной транзакции с новой версией списка.
+    # Если список успел изменить другой процесс, он перечитывается целиком.
+    def _write(self, conn, sql, chat_ids):
+        with conn:
+            stale = not self.loaded or self._read_version(conn) != self.version
+            conn.executemany(sql, [(chat_id,) for chat_id in chat_ids])
+            conn.execute(_BUMP_VERSION_SQL)
+            if stale:
+                self.load(conn)
+            else:
+                self.version = self._read_version(conn)
+
+    def add(self, conn, chat_id):
+        self._write(conn, "INSERT OR IGNORE INTO users (chat_id) VALUES (?)", [chat_id])
+        self.chat_ids.add(chat_id)
+
+    def remove(self, conn, chat_ids):
+        self._write(conn, "DELETE FROM users WHERE chat_id = ?", chat_ids)
+        self.chat_ids.difference_update(chat_ids)
@@ -0,0 +1,77 @@
+# Контроль веса запросов к Binance.
+# Binance ограничивает суммарный вес запросов с одного IP за минуту
+# (BINANCE_WEIGHT_LIMIT, окно сбрасывается в начале каждой минуты), вес запроса
+# стакана зависит от limit. Перед запросом governor резервирует его вес и,
+# если бюджет минуты (BINANCE_WEIGHT_SHARE от лимита) исчерпан, ждет начала
+# следующей минуты. Оценка сверяется с заголовком X-MBX-USED-WEIGHT-1M каждого
+# ответа, поэтому учитываются и запросы других процессов с того же IP.
+# Ответ 429 приостанавливает все запросы на Retry-After секунд, 418 (IP заблокирован)
+# — на Retry-After или BAN_PAUSE.
+import asyncio
+import time
+
+from configs import BINANCE_WEIGHT_LIMIT, BINANCE_WEIGHT_SHARE
+from metrics import Counter
+
+# Окно лимита веса, сек
+WEIGHT_WINDOW = 60
+# Пауза после 429 и 418, если Binance не прислал Retry-After, сек
+RATE_LIMIT_PAUSE = 60
+BAN_PAUSE = 120
+RATE_LIMIT_STATUSES = (429, 418)
+
+GOVERNOR_WAIT_SECONDS = Counter("binance_governor_wait_seconds_total",
+                                "Ожидание бюджета веса и пауз после 429/418", ("reason",))
+BINANCE_BACKOFFS = Counter("binance_backoffs_total", "Паузы после ответов 429 и 418", ("status",))
+
+
+class WeightGovernor:
+    def __init__(self, limit=BINANCE_WEIGHT_LIMIT, share=BINANCE_WEIGHT_SHARE, window=WEIGHT_WINDOW):
+        self.budget = int(limit * share)
+        self.window_seconds = window
+        self.used = 0
+        self.window = None
+        self.paused_until = 0.0
+
+    # Сброс оценки в начале новой минуты
+    def _roll_window(self, now):
+        window = int(now // self.window_seconds)
+        if window != self.window:
+            self.window = window
+            self.used = 0
+
+    # Ожидание, пока запрос весом weight укладывается в бюджет, и резервирование веса
+    async def acquire(self, weight):
+        while True:
+            now = time.time()
+            if now < self.paused_until:
+                delay = self.paused_until - now
+                GOVERNOR_WAIT_SECONDS.inc(delay, reason="backoff")
+                await asyncio.sleep(delay)
+                continue
+            self._roll_window(now)
+            if self.used + weight <= self.budget:
+                self.used += weight
+                return
+            delay = (self.window + 1) * self.window_seconds - now
+            GOVERNOR_WAIT_SECONDS.inc(delay, reason="budget")
+            await asyncio.sleep(delay)
+
+    # Учет ответа: использованный вес из заголовка и паузы после 429/418.
+    # Возвращает True, если запрос стоит повторить после паузы.
+    def update(self, status, headers):
+        used_weight = headers.get("X-MBX-USED-WEIGHT-1M")
+        if used_weight is not None and used_weight.isdigit():
+            self._roll_window(time.time())
+            self.used = max(self.used, int(used_weight))
+        if status not in RATE_LIMIT_STATUSES:
+            return False
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None and retry_after.isdigit():
+            pause = int(retry_after)
+        else:
+            pause = BAN_PAUSE if status == 418 else RATE_LIMIT_PAUSE
+        self.paused_until = max(self.paused_until, time.time() + pause)
+        BINANCE_BACKOFFS.inc(status=status)
+        print(f"Binance ответил {status}: запросы приостановлены на {pause} с.")
+        return True